@@ -14,7 +14,9 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
+import asyncio
 import time
+import weakref
 from typing import Any
 import httpx
 import time
@@ -24,6 +26,7 @@ from rllm.rewards import RewardFunction
 
 from examples.agents.websearcher.rewards.reward_config import WebSearcherRewardStage
 from examples.agents.websearcher.websearcher_env import WebSearcherEnvironment
+from examples.rllm.utils.tracing import get_tracer, SPAN_TOOL_HTTP
 from agentic_rl.base.log.loggers import Loggers
 
 logger = Loggers(__name__)
@@ -36,6 +39,11 @@ class LangGraphWebSearchEnv(WebSearcherEnvironment):
     for web search functionality.
     """
 
+    DEFAULT_MAX_CONNECTIONS = 1024
+    DEFAULT_MAX_KEEPALIVE_CONNECTIONS = 256
+    # Shared async HTTP client per event loop, an httpx.AsyncClient cannot be used across loops
+    _async_clients = weakref.WeakKeyDictionary()
+
     def __init__(
         self,
         task: dict | None = None,
@@ -71,16 +79,25 @@ class LangGraphWebSearchEnv(WebSearcherEnvironment):
         timeout: float = 300.0,
         tokenizer: Any = None,
         max_tool_length: int = 8192,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        max_keepalive_connections: int = DEFAULT_MAX_KEEPALIVE_CONNECTIONS,
+        delay: float = 1.0,
     ):
         """
         Create a LangChain StructuredTool for retrieval server.
 
+        The tool has both a blocking function and a coroutine. Async invocations, e.g. by
+        ToolNode.ainvoke, use the coroutine, which sends requests through an httpx.AsyncClient
+        shared by all tools on the same event loop instead of occupying a worker thread.
+
         Args:
             server_url: URL of the dense retrieval server (default: http://127.0.0.1:8000)
             max_retries: Maximum number of retry attempts.
             delay: Delay between retries in seconds.
             timeout: Request timeout in seconds (default: 30.0)
             name: Name of langchain tool
+            max_connections: Maximum number of concurrent connections of the shared async client.
+            max_keepalive_connections: Maximum number of idle connections kept by the shared async client.
 
         Returns:
             A LangChain StructuredTool instance that can be used with LangGraph agents
@@ -99,42 +116,22 @@ class LangGraphWebSearchEnv(WebSearcherEnvironment):
 
         def _retrieve_from_server(query: List[str]) -> str:
             def _retry_request():
-                response = None
+                payload = {"queries": query, "topk": 3, "return_scores": True}
                 for attempt in range(max_retries):
                     try:
-                        payload = {"queries": query, "topk": 3, "return_scores": True}
-                        response = client.post(f"{server_url}/retrieve", json=payload)
-
-                        response = response.json()
+                        response = client.post(f"{server_url}/retrieve", json=payload).json()
                         if response:
-                            break
-
+                            return response
                         logger.warning(f"Empty response from {server_url}, retrying...")
-
-                    except httpx.TimeoutException:
-                        logger.error(
-                            f"Error: Request timeout after {timeout} seconds. Please check if the retrieval server is running."
-                        )
-                    except httpx.ConnectError:
-                        logger.error(
-                            f"Error: Could not connect to retrieval server at {server_url}. Please ensure the server is running."
-                        )
-                    except httpx.RequestError as e:
-                        logger.error(
-                            f"Error: Request is not correct: {str(e)}. Please check the the request for the server"
-                        )
                     except Exception as e:
-                        logger.error(f"Error: Unexpected error - {str(e)}")
-
-                    if attempt == max_retries - 1:
-                        raise Exception(f"Failed after {max_retries} attempts")
+                        LangGraphWebSearchEnv._log_retrieve_error(e, server_url, timeout)
+                    time.sleep(LangGraphWebSearchEnv._retry_delay(attempt, max_retries, delay))
+                return None
 
-                    time.sleep(1)
-                return response
-                
             def _local_search():
                 try:
-                    response = _retry_request()
+                    with get_tracer().span(SPAN_TOOL_HTTP, queries=len(query)):
+                        response = _retry_request()
                     content = LangGraphWebSearchEnv._format_results(
                         query, response["result"]
                     )
@@ -156,15 +153,125 @@ class LangGraphWebSearchEnv(WebSearcherEnvironment):
             except Exception as e:
                 return f"execute search tool failed: {e}"
 
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+        )
+
+        async def _aretrieve_from_server(query: List[str]) -> str:
+            async_client = LangGraphWebSearchEnv._get_async_client(timeout, limits)
+
+            async def _retry_request():
+                payload = {"queries": query, "topk": 3, "return_scores": True}
+                for attempt in range(max_retries):
+                    try:
+                        response = (await async_client.post(f"{server_url}/retrieve", json=payload)).json()
+                        if response:
+                            return response
+                        logger.warning(f"Empty response from {server_url}, retrying...")
+                    except Exception as e:
+                        LangGraphWebSearchEnv._log_retrieve_error(e, server_url, timeout)
+                    await asyncio.sleep(LangGraphWebSearchEnv._retry_delay(attempt, max_retries, delay))
+                return None
+
+            try:
+                with get_tracer().span(SPAN_TOOL_HTTP, queries=len(query)):
+                    response = await _retry_request()
+                content = LangGraphWebSearchEnv._format_results(query, response["result"])
+                output_dict = {"tool_output": content, "query": query}
+            except Exception as e:
+                logger.error(f"Local search failed: {e}", exc_info=True)
+                output_dict = {
+                    "tool_output": "",
+                    "query": query,
+                    "error_output": f"ERROR: Local search failed: {str(e)}",
+                }
+
+            try:
+                return LangGraphWebSearchEnv._format_tool_result(
+                    tokenizer, max_tool_length, output_dict
+                )
+            except Exception as e:
+                return f"execute search tool failed: {e}"
+
         # Convert to LangChain StructuredTool
         langchain_tool = StructuredTool.from_function(
             func=_retrieve_from_server,
+            coroutine=_aretrieve_from_server,
             name="search",
             description="Search for information using a dense retrieval server with Wikipedia corpus",
         )
 
         return langchain_tool
 
+    @staticmethod
+    def _retry_delay(attempt: int, max_retries: int, delay: float) -> float:
+        """Returns the wait before the next retrieval attempt, shared by the blocking and async search tool.
+
+        Args:
+            attempt: Index of the attempt that just failed, starting at 0.
+            max_retries: Maximum number of attempts.
+            delay: Delay between retries in seconds.
+
+        Returns:
+            Seconds to wait before the next attempt.
+
+        Raises:
+            Exception: If the failed attempt was the last one.
+        """
+        if attempt >= max_retries - 1:
+            raise Exception(f"Failed after {max_retries} attempts")
+        return delay
+
+    @staticmethod
+    def _log_retrieve_error(error: Exception, server_url: str, timeout: float) -> None:
+        """Logs a failed retrieval request.
+
+        Args:
+            error: Exception raised by the request.
+            server_url: URL of the retrieval server.
+            timeout: Request timeout in seconds.
+        """
+        if isinstance(error, httpx.TimeoutException):
+            logger.error(
+                f"Error: Request timeout after {timeout} seconds. Please check if the retrieval server is running."
+            )
+        elif isinstance(error, httpx.ConnectError):
+            logger.error(
+                f"Error: Could not connect to retrieval server at {server_url}. Please ensure the server is running."
+            )
+        elif isinstance(error, httpx.RequestError):
+            logger.error(
+                f"Error: Request is not correct: {str(error)}. Please check the the request for the server"
+            )
+        else:
+            logger.error(f"Error: Unexpected error - {str(error)}")
+
+    @classmethod
+    def _get_async_client(cls, timeout: float, limits: httpx.Limits) -> httpx.AsyncClient:
+        """Returns the async HTTP client shared by all search tools on the running event loop.
+
+        Args:
+            timeout: Request timeout in seconds, used when the client is created.
+            limits: Connection limits, used when the client is created.
+
+        Returns:
+            The shared httpx.AsyncClient.
+        """
+        loop = asyncio.get_running_loop()
+        client = cls._async_clients.get(loop)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(timeout=timeout, limits=limits)
+            cls._async_clients[loop] = client
+        return client
+
+    @classmethod
+    async def close_async_client(cls) -> None:
+        """Closes the shared async HTTP client of the running event loop, if any."""
+        client = cls._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None and not client.is_closed:
+            await client.aclose()
+
     @staticmethod
     def _format_tool_result(tokenizer, max_tool_length, tool_output_dict):
         """Format tool output dictionary to string with token length control.
@@ -265,11 +372,11 @@ class LangGraphWebSearchEnv(WebSearcherEnvironment):
             )
         return {}, self.format_reward, done, self._build_info(action, format_metadata)
 
-    def calculate_tool_reward(self, content: str, tool_calls: list[dict[Any, Any]]):
+    def calculate_tool_reward(self, content: str | dict[str, str], tool_calls: list[dict[Any, Any]]):
         """Calculates reward for tool execution results.
 
         Args:
-            content: Tool execution content.
+            content: Tool execution content, or a mapping of tool call IDs to the content of each call.
             tool_calls: List of tool call dictionaries.
 
         Returns:
@@ -295,7 +402,8 @@ class LangGraphWebSearchEnv(WebSearcherEnvironment):
         """Executes tool calls in parallel and formats their outputs.
 
         Args:
-            content: Tool execution content to be processed.
+            content: Tool execution content to be processed, or a mapping of tool call IDs
+                to the content of each call.
             tool_calls: List of tool call dictionaries to execute.
 
         Returns:
@@ -305,7 +413,8 @@ class LangGraphWebSearchEnv(WebSearcherEnvironment):
         tool_outputs: dict[str, str] = {}
         for _, tool_call in enumerate(tool_calls):
             tool_name = tool_call["name"]
-            obs = {"tool_result": content, "tool_name": tool_name}
+            tool_content = content.get(tool_call["id"], "") if isinstance(content, dict) else content
+            obs = {"tool_result": tool_content, "tool_name": tool_name}
             output_str = self._format_tool_output(obs)
             tool_outputs[tool_call["id"]] = output_str
 
@@ -15,19 +15,33 @@ limitations under the License.
 """
 
 import os
+import copy
+import json
 import torch
 import faiss
 import warnings
 import argparse
+import threading
 import numpy as np
 from tqdm import tqdm
 from typing import cast
+from itertools import islice
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from utils.function import load_corpus, load_model, pooling
+from utils.index_presets import INDEX_PRESETS, benchmark_index, resolve_preset, sample_rows
 
 
 class IndexBuilder:
+    # number of embeddings converted to float32 and added to the index at once
+    ADD_BATCH_SIZE = 100000
+    # maximum number of embeddings sampled to train an index given by a raw faiss_type
+    TRAIN_SAMPLE_SIZE = 1000000
+    # number of batches read and length-sorted together when bucketing passages
+    SORT_WINDOW_BATCHES = 64
+
     def __init__(
             self, 
             retrieval_method: str,
@@ -40,7 +54,15 @@ class IndexBuilder:
             pooling_method: str = "mean",
             faiss_type: str = None,
             embedding_path: str = None,
-            save_embedding: bool = False
+            save_embedding: bool = False,
+            streaming: bool = False,
+            shard_size: int = 1000000,
+            length_bucketing: bool = True,
+            tokenizer_workers: int = 4,
+            prefetch_batches: int = 4,
+            index_preset: str = None,
+            benchmark: bool = False,
+            benchmark_topk: int = 10
     ):
         if retrieval_method not in ["e5"]:
             raise ValueError(f"retrieval_method {retrieval_method} is not supported")
@@ -60,12 +82,39 @@ class IndexBuilder:
         if faiss_type is not None and not isinstance(faiss_type, str):
             raise ValueError(f"faiss_type {faiss_type} must be a string")
         
+        if index_preset is not None and index_preset not in INDEX_PRESETS:
+            raise ValueError(f"Invalid index_preset: {index_preset}. Supported presets are {INDEX_PRESETS}.")
+        
+        if faiss_type is not None and index_preset is not None:
+            raise ValueError("faiss_type and index_preset are mutually exclusive")
+        
+        if not isinstance(benchmark, bool):
+            raise ValueError(f"benchmark {benchmark} must be a boolean")
+        
+        if not isinstance(benchmark_topk, int) or benchmark_topk <= 0:
+            raise ValueError(f"benchmark_topk {benchmark_topk} must be a positive integer")
+        
         if embedding_path is not None and not isinstance(embedding_path, str):
             raise ValueError(f"embedding_path {embedding_path} must be a string")
         
         if not isinstance(save_embedding, bool):
             raise ValueError(f"save_embedding {save_embedding} must be a boolean")
         
+        if not isinstance(streaming, bool):
+            raise ValueError(f"streaming {streaming} must be a boolean")
+        
+        if not isinstance(shard_size, int) or shard_size <= 0:
+            raise ValueError(f"shard_size {shard_size} must be a positive integer")
+        
+        if not isinstance(length_bucketing, bool):
+            raise ValueError(f"length_bucketing {length_bucketing} must be a boolean")
+        
+        if not isinstance(tokenizer_workers, int) or tokenizer_workers <= 0:
+            raise ValueError(f"tokenizer_workers {tokenizer_workers} must be a positive integer")
+        
+        if not isinstance(prefetch_batches, int) or prefetch_batches < 0:
+            raise ValueError(f"prefetch_batches {prefetch_batches} must be a non-negative integer")
+        
         if not isinstance(save_dir, str):
             raise ValueError(f"save_dir {save_dir} must be a string")
         
@@ -93,10 +142,21 @@ class IndexBuilder:
         self.faiss_type = faiss_type if faiss_type is not None else "Flat"
         self.embedding_path = embedding_path
         self.save_embedding = save_embedding
+        self.streaming = streaming
+        self.shard_size = shard_size
+        self.length_bucketing = length_bucketing
+        self.tokenizer_workers = tokenizer_workers
+        self.prefetch_batches = prefetch_batches
+        self.index_preset = index_preset
+        self.benchmark = benchmark
+        self.benchmark_topk = benchmark_topk
 
         self.gpu_num = torch.npu.device_count()
-        self.index_save_path = os.path.join(self.save_dir, f"{self.retrieval_method}_{self.faiss_type}.index")
+        index_name = self.index_preset if self.index_preset is not None else self.faiss_type
+        self.index_save_path = os.path.join(self.save_dir, f"{self.retrieval_method}_{index_name}.index")
         self.embedding_save_path = os.path.join(self.save_dir, f"emb_{self.retrieval_method}.memmap")
+        self.shard_dir = os.path.join(self.save_dir, f"emb_{self.retrieval_method}_shards")
+        self.manifest_path = os.path.join(self.shard_dir, "manifest.json")
         self.corpus = load_corpus(self.corpus_path)
 
         self.encoder, self.tokenizer = load_model(model_path=self.model_path,
@@ -135,27 +195,65 @@ class IndexBuilder:
         if os.path.exists(self.index_save_path):
             print(f"Index file {self.index_save_path} already exists, skip building index.")
             return
-        
-        if self.embedding_path is not None:
+
+        if self.streaming:
+            chunks = [np.load(path, mmap_mode="r") for path in self._encode_shards()]
+            del self.corpus
+        elif self.embedding_path is not None:
             hidden_size = self.encoder.config.hidden_size
             corpus_size = len(self.corpus)
-            all_embeddings = IndexBuilder._load_embedding(self.embedding_path, corpus_size, hidden_size)
+            chunks = [IndexBuilder._load_embedding(self.embedding_path, corpus_size, hidden_size)]
         else:
             all_embeddings = self._encode_all()
             if self.save_embedding:
                 self._save_embedding(all_embeddings)
             del self.corpus
+            chunks = [all_embeddings]
 
-        print(f"Build index file {self.index_save_path}")
-        dim = all_embeddings.shape[-1]
-        faiss_index = faiss.index_factory(dim, self.faiss_type, faiss.METRIC_INNER_PRODUCT)
+        self._build_index(chunks)
+
+    def _build_index(self, chunks):
+        """Train the FAISS index on a random sample, add all embeddings and save it.
+
+        Args:
+            chunks (list): Embedding arrays (in-memory or memory-mapped) in corpus order.
+        """
+        dim = chunks[0].shape[-1]
+        corpus_size = sum(chunk.shape[0] for chunk in chunks)
+        if self.index_preset is not None:
+            preset = resolve_preset(self.index_preset, corpus_size, dim)
+            factory, train_size, search_params = preset["factory"], preset["train_size"], preset["search_params"]
+        else:
+            factory, train_size, search_params = self.faiss_type, self.TRAIN_SAMPLE_SIZE, ""
+
+        print(f"Build index file {self.index_save_path} ({factory})")
+        faiss_index = faiss.index_factory(dim, factory, faiss.METRIC_INNER_PRODUCT)
         if not faiss_index.is_trained:
-            faiss_index.train(all_embeddings)
-        faiss_index.add(all_embeddings)
-        
+            train_data = sample_rows(chunks, train_size)
+            print(f"Train index on {train_data.shape[0]} sampled embeddings")
+            faiss_index.train(train_data)
+            del train_data
+        for chunk in tqdm(chunks, desc="Adding embeddings to index:"):
+            for start_idx in range(0, chunk.shape[0], self.ADD_BATCH_SIZE):
+                faiss_index.add(np.ascontiguousarray(chunk[start_idx:start_idx + self.ADD_BATCH_SIZE],
+                                                     dtype=np.float32))
+
+        if self.benchmark:
+            report = benchmark_index(faiss_index, chunks, topk=self.benchmark_topk)
+            for row in report:
+                print(f"{row['search_params']:>16}  recall@{self.benchmark_topk}: {row['recall']:.4f}  "
+                      f"qps: {row['qps']:.1f}")
+            with open(f"{self.index_save_path}.benchmark.json", "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+
+        if search_params:
+            faiss.ParameterSpace().set_index_parameters(faiss_index, search_params)
         faiss.write_index(faiss_index, self.index_save_path)
+        # search parameters are not always serialized with the index, DenseRetriever applies them at load time
+        with open(f"{self.index_save_path}.params.json", "w", encoding="utf-8") as f:
+            json.dump({"factory": factory, "search_params": search_params}, f)
         print(f"Index file {self.index_save_path} built successfully.")
-    
+
     def _save_embedding(self, embeddings: np.ndarray):
         """Save embeddings to a memory-mapped file.
 
@@ -177,58 +275,194 @@ class IndexBuilder:
         else:
             memmap[:] = embeddings
 
-    def _encode_all(self):
-        if self.gpu_num > 1:
+    def _setup_encoder(self):
+        """Wrap the encoder for multi-npu inference and scale the batch size accordingly."""
+        if self.gpu_num > 1 and not isinstance(self.encoder, torch.nn.DataParallel):
             print(f"Use multi npu: {self.gpu_num}")
             self.encoder = torch.nn.DataParallel(self.encoder)
             self.batch_size = self.batch_size * self.gpu_num
 
-        all_embeddings = []
+    def _encode_all(self):
+        hidden_size = self.encoder.config.hidden_size
+        self._setup_encoder()
 
-        for start_idx in tqdm(range(0, len(self.corpus), self.batch_size), desc="Inference Embeddings:"):
-            batch_data = self.corpus[start_idx:start_idx + self.batch_size]['contents']
+        all_embeddings = np.empty((len(self.corpus), hidden_size), dtype=np.float32)
+        self._encode_range(0, len(self.corpus), all_embeddings, desc="Inference Embeddings:")
 
-            if self.retrieval_method == "e5":
-                batch_data = [f"passage: {doc}" for doc in batch_data]
-            
-            inputs = self.tokenizer(
-                batch_data,
-                padding=True,
-                truncation=True,
-                return_tensors="pt",
-                max_length=self.max_length,
-            ).to('npu')
-
-            inputs = {k: v.npu() for k, v in inputs.items()}
-
-            if "T5" in type(self.encoder).__name__:
-                decoder_input_ids = torch.zeros(
-                    (inputs['input_ids'].shape[0], 1), dtype=torch.long
-                ).to(inputs['input_ids'].device)
-                output = self.encoder(
-                    **inputs,
-                    decoder_input_ids=decoder_input_ids,
-                    return_dict=True
-                )
-                embeddings = output.last_hidden_state[:, 0, :]
+        return all_embeddings
+
+    def _iter_batches(self, start: int, end: int):
+        """Yield batches of passages in [start, end), bucketed by length.
+
+        Passages are read one window of SORT_WINDOW_BATCHES batches at a time and,
+        when length bucketing is enabled, sorted by length inside the window so that
+        each batch pads to similar lengths.
 
+        Yields:
+            tuple: (positions relative to ``start`` as np.ndarray, list of passages)
+        """
+        window_size = self.batch_size * self.SORT_WINDOW_BATCHES
+        for window_start in range(start, end, window_size):
+            window_end = min(window_start + window_size, end)
+            texts = self.corpus[window_start:window_end]['contents']
+            if self.length_bucketing:
+                order = np.argsort(np.fromiter((len(t) for t in texts), dtype=np.int64, count=len(texts)),
+                                   kind="stable")
             else:
-                output = self.encoder(**inputs, return_dict=True)
-                embeddings = pooling(output.pooler_output,
-                                     output.last_hidden_state,
-                                     inputs['attention_mask'],
-                                     self.pooling_method)
-                if "dpr" not in self.retrieval_method:
-                    embeddings = torch.nn.functional.normalize(embeddings, dim=-1)
-                
-            embeddings = cast(torch.Tensor, embeddings)
-            embeddings = embeddings.detach().cpu().numpy()
-            all_embeddings.append(embeddings)
+                order = np.arange(len(texts))
+            for batch_start in range(0, len(order), self.batch_size):
+                batch_order = order[batch_start:batch_start + self.batch_size]
+                yield batch_order + (window_start - start), [texts[i] for i in batch_order]
+
+    def _encode_range(self, start: int, end: int, out, desc: str):
+        """Encode passages [start, end) into ``out`` in their original order.
+
+        Tokenization runs on a background worker pool which keeps up to
+        ``prefetch_batches`` batches ready while the encoder processes the
+        current one. Each worker uses its own copy of the tokenizer: a fast
+        tokenizer cannot be called from several threads at once ("Already borrowed").
+
+        Args:
+            start (int): Index of the first passage.
+            end (int): Index after the last passage.
+            out: Array-like of shape (end - start, hidden_size) receiving the embeddings.
+            desc (str): Progress bar description.
+        """
+        batches = self._iter_batches(start, end)
+        pending = deque()
+        worker_state = threading.local()
+
+        def tokenize(texts):
+            if not hasattr(worker_state, "tokenizer"):
+                worker_state.tokenizer = copy.deepcopy(self.tokenizer)
+            return self._tokenize(worker_state.tokenizer, texts)
+
+        with ThreadPoolExecutor(max_workers=self.tokenizer_workers) as pool, \
+                tqdm(total=end - start, desc=desc, unit="passages") as pbar:
+            for positions, texts in islice(batches, self.prefetch_batches + 1):
+                pending.append((positions, pool.submit(tokenize, texts)))
+            while pending:
+                positions, future = pending.popleft()
+                next_batch = next(batches, None)
+                if next_batch is not None:
+                    pending.append((next_batch[0], pool.submit(tokenize, next_batch[1])))
+                out[positions] = self._forward(future.result())
+                pbar.update(len(positions))
+
+    def _tokenize(self, tokenizer, batch_data):
+        """Tokenize a list of passages into padded CPU tensors."""
+        if self.retrieval_method == "e5":
+            batch_data = [f"passage: {doc}" for doc in batch_data]
         
-        all_embeddings = np.concatenate(all_embeddings, axis=0)
-        all_embeddings = all_embeddings.astype(np.float32)
+        return tokenizer(
+            batch_data,
+            padding=True,
+            truncation=True,
+            return_tensors="pt",
+            max_length=self.max_length,
+        )
 
-        return all_embeddings
+    def _forward(self, inputs):
+        """Run the encoder on tokenized inputs and return a [batch_size, hidden_size] numpy array."""
+        inputs = {k: v.npu() for k, v in inputs.items()}
+
+        if "T5" in type(self.encoder).__name__:
+            decoder_input_ids = torch.zeros(
+                (inputs['input_ids'].shape[0], 1), dtype=torch.long
+            ).to(inputs['input_ids'].device)
+            output = self.encoder(
+                **inputs,
+                decoder_input_ids=decoder_input_ids,
+                return_dict=True
+            )
+            embeddings = output.last_hidden_state[:, 0, :]
+
+        else:
+            output = self.encoder(**inputs, return_dict=True)
+            embeddings = pooling(output.pooler_output,
+                                 output.last_hidden_state,
+                                 inputs['attention_mask'],
+                                 self.pooling_method)
+            if "dpr" not in self.retrieval_method:
+                embeddings = torch.nn.functional.normalize(embeddings, dim=-1)
+            
+        embeddings = cast(torch.Tensor, embeddings)
+        return embeddings.detach().cpu().numpy()
+
+    def _load_manifest(self, corpus_size: int, hidden_size: int):
+        """Load the shard progress manifest, or start a new one if it does not match this run.
+
+        Args:
+            corpus_size (int): Number of passages in the corpus.
+            hidden_size (int): Dimensionality of each embedding.
+
+        Returns:
+            dict: Manifest with the shard layout and the list of completed shards.
+        """
+        manifest = {
+            "corpus_path": os.path.abspath(self.corpus_path),
+            "corpus_size": corpus_size,
+            "hidden_size": hidden_size,
+            "shard_size": self.shard_size,
+            "dtype": "float16",
+            "completed": [],
+        }
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            layout_keys = ("corpus_path", "corpus_size", "hidden_size", "shard_size", "dtype")
+            if all(saved.get(k) == manifest[k] for k in layout_keys):
+                return saved
+            warnings.warn(f"Shard manifest {self.manifest_path} does not match this run, re-encoding.", UserWarning)
+        return manifest
+
+    def _save_manifest(self, manifest: dict):
+        """Atomically write the shard progress manifest."""
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _shard_path(self, shard_id: int):
+        return os.path.join(self.shard_dir, f"shard_{shard_id:05d}.npy")
+
+    def _encode_shards(self):
+        """Encode the corpus shard by shard into float16 .npy files, resuming completed shards.
+
+        Returns:
+            list: Paths of all shard files in corpus order.
+        """
+        hidden_size = self.encoder.config.hidden_size
+        corpus_size = len(self.corpus)
+        os.makedirs(self.shard_dir, exist_ok=True)
+        manifest = self._load_manifest(corpus_size, hidden_size)
+        completed = set(manifest["completed"])
+        num_shards = (corpus_size + self.shard_size - 1) // self.shard_size
+        if completed:
+            print(f"Resume encoding: {len(completed)}/{num_shards} shards already completed")
+
+        self._setup_encoder()
+        for shard_id in range(num_shards):
+            if shard_id in completed:
+                continue
+            shard_start = shard_id * self.shard_size
+            shard_end = min(shard_start + self.shard_size, corpus_size)
+            # write to a temporary memmap first, a shard only becomes visible once complete
+            tmp_path = self._shard_path(shard_id) + ".tmp"
+            shard = np.lib.format.open_memmap(
+                tmp_path, mode="w+", dtype=np.float16, shape=(shard_end - shard_start, hidden_size)
+            )
+            self._encode_range(shard_start, shard_end, shard,
+                               desc=f"Inference Embeddings shard {shard_id + 1}/{num_shards}:")
+            shard.flush()
+            del shard
+            os.replace(tmp_path, self._shard_path(shard_id))
+
+            manifest["completed"] = sorted(completed | {shard_id})
+            completed.add(shard_id)
+            self._save_manifest(manifest)
+
+        return [self._shard_path(shard_id) for shard_id in range(num_shards)]
     
 
 MODEL2POOLING = {
@@ -251,8 +485,20 @@ def main():
     parser.add_argument("--use_fp16", action=STORE_TRUE, default=False, help="Use FP16 for model.")
     parser.add_argument("--pooling_method", type=str, default=None, help="Pooling method.")
     parser.add_argument("--faiss_type", type=str, default=None, help="FAISS index type.")
+    parser.add_argument("--index_preset", type=str, default=None, choices=INDEX_PRESETS,
+                        help="Named index preset with parameters derived from corpus size (instead of --faiss_type).")
+    parser.add_argument("--benchmark", action=STORE_TRUE, default=False,
+                        help="Report recall@k against exact search and queries/sec after building.")
+    parser.add_argument("--benchmark_topk", type=int, default=10, help="k used for the recall benchmark.")
     parser.add_argument("--embedding_path", type=str, default=None, help="Path to the pre-computed embeddings.")
     parser.add_argument("--save_embedding", action=STORE_TRUE, default=False, help="Whether to save the embeddings.")
+    parser.add_argument("--streaming", action=STORE_TRUE, default=False,
+                        help="Encode in resumable float16 shards and add them to the index incrementally.")
+    parser.add_argument("--shard_size", type=int, default=1000000, help="Number of passages per embedding shard.")
+    parser.add_argument("--no_length_bucketing", action=STORE_TRUE, default=False,
+                        help="Encode passages in corpus order instead of length-sorted batches.")
+    parser.add_argument("--tokenizer_workers", type=int, default=4, help="Number of background tokenizer threads.")
+    parser.add_argument("--prefetch_batches", type=int, default=4, help="Number of batches tokenized ahead.")
     
     args = parser.parse_args()
 
@@ -280,6 +526,14 @@ def main():
         faiss_type=args.faiss_type,
         embedding_path=args.embedding_path,
         save_embedding=args.save_embedding,
+        streaming=args.streaming,
+        shard_size=args.shard_size,
+        length_bucketing=not args.no_length_bucketing,
+        tokenizer_workers=args.tokenizer_workers,
+        prefetch_batches=args.prefetch_batches,
+        index_preset=args.index_preset,
+        benchmark=args.benchmark,
+        benchmark_topk=args.benchmark_topk,
     )
     index_builder.build_dense_index()
 
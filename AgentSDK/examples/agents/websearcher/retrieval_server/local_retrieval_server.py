@@ -32,10 +32,12 @@ from aiohttp import web
 from examples.agents.websearcher.retrieval_server.utils.config import RetrieverConfig, QueryRequest
 from examples.agents.websearcher.retrieval_server.utils.output_manager import OutputLogger, OutputQueueHandler
 from examples.agents.websearcher.retrieval_server.utils.retriever import DenseRetriever
+from examples.agents.websearcher.retrieval_server.utils.scheduler import MicroBatchScheduler
 
 
 config: RetrieverConfig = None
 retriever: DenseRetriever = None
+scheduler: MicroBatchScheduler = None
 
 def start_backend_server(args, port: int, status_queue: multiprocessing.Queue, output_queue: multiprocessing.Queue, idx=0):
     """Starts a backend server instance with given configuration.
@@ -51,7 +53,7 @@ def start_backend_server(args, port: int, status_queue: multiprocessing.Queue, o
             idx: Instance index for logging identification (default: 0).
     """
     idx += 1
-    global config, retriever
+    global config, retriever, scheduler
     pid = os.getpid()
     with OutputQueueHandler(output_queue, port, pid):
         # 1) Build a config (could also parse from arguments).
@@ -66,13 +68,26 @@ def start_backend_server(args, port: int, status_queue: multiprocessing.Queue, o
             retrieval_query_max_length=256,
             retrieval_use_fp16=True,
             retrieval_batch_size=512,
+            retrieval_index_mmap=args.index_mmap,
+            retrieval_cache_size=args.cache_size,
+            retrieval_cache_max_mb=args.cache_max_mb,
+            retrieval_cache_normalize=not args.cache_exact_match,
+            retrieval_result_cache=args.result_cache,
+            retrieval_search_params=args.search_params,
         )
 
         # 2) Instantiate a global retriever so it is loaded once and reused.
         retriever = DenseRetriever(config, port)
         print(f"idx: {idx}; PORT{port}: Retriver is ready.")
 
-        # 3) Launch the server.
+        # 3) Coalesce queries of concurrent requests into shared search batches.
+        scheduler = MicroBatchScheduler(
+            retriever.batch_search,
+            max_batch_size=args.max_batch_size,
+            max_wait_ms=args.max_wait_ms,
+        )
+
+        # 4) Launch the server.
         status_queue.put((port, "success"))
         print(f"idx: {idx}; PORT{port}: Server init finish!")
         uvicorn.run(app, host="127.0.0.1", port=port)
@@ -121,47 +136,75 @@ def get_available_ports(count: int, args, start_range: int = 20000, end_range: i
     return available_ports
 
 class LoadBalancer:
-    """HTTP load balancer with health checking and round-robin routing."""
-    def __init__(self, backend_ports: List[int], proxy_port: int = 8000):
+    """HTTP load balancer with health checking and least-outstanding-requests routing."""
+    # Headers that describe a single connection hop and must not be forwarded as-is.
+    HOP_BY_HOP_HEADERS = {
+        "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+        "te", "trailers", "transfer-encoding", "upgrade", "content-length", "host",
+    }
+
+    def __init__(self, backend_ports: List[int], proxy_port: int = 8000, pool_size: int = 100):
         """Initialize the load balancer.
         
         Args:
             backend_ports: List of backend service ports
             proxy_port: Port to listen for incoming requests (default: 8000)
+            pool_size: Maximum number of pooled keep-alive connections per backend (default: 100)
         """
         self.backend_ports = backend_ports
         self.proxy_port = proxy_port
+        self.pool_size = pool_size
         self.backends = [f"http://127.0.0.1:{port}" for port in backend_ports]
         self.healthy_backends = self.backends.copy()
+        self.outstanding = {backend: 0 for backend in self.backends}
         self.current_index = 0
         self.health_check_interval = 60
+        self.session = None
 
     def run(self):
         """Start the load balancer service.
         
-        Sets up web server and health check coroutine.
+        Sets up web server, the pooled client session and health check coroutine.
         """
         application = web.Application()
         application.router.add_route('*', '/{path:.*}', self.proxy_request)
-
-        loop = asyncio.get_event_loop()
-        loop.create_task(self.health_check())
+        application.on_startup.append(self._on_startup)
+        application.on_cleanup.append(self._on_cleanup)
 
         web.run_app(application, host="127.0.0.1", port=self.proxy_port)
 
+    async def _on_startup(self, application: web.Application):
+        """Create the long-lived client session and start health checking."""
+        connector = aiohttp.TCPConnector(
+            limit=self.pool_size * len(self.backends),
+            limit_per_host=self.pool_size,
+            keepalive_timeout=self.health_check_interval,
+        )
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=6000),
+            auto_decompress=False,
+        )
+        application["health_check"] = asyncio.get_running_loop().create_task(self.health_check())
+
+    async def _on_cleanup(self, application: web.Application):
+        """Stop health checking and close pooled connections."""
+        application["health_check"].cancel()
+        await self.session.close()
+
     async def health_check(self):
         """Periodically check backend health status.
         
         Runs in background coroutine, updates healthy_backends list.
         """
         while True:
-            async with aiohttp.ClientSession() as session:
-                new_healthy = await self._check_all_backends(session)
-            self.healthy_backends = new_healthy
+            self.healthy_backends = await self._check_all_backends(self.session)
             await asyncio.sleep(self.health_check_interval)
 
     def get_next_backend(self) -> str:        
-        """Select next available backend using round-robin algorithm.
+        """Select the healthy backend with the fewest in-flight requests.
+
+        Ties are broken round-robin so that idle backends are used evenly.
         
         Returns:
             URL of the selected backend
@@ -171,12 +214,18 @@ class LoadBalancer:
         """        
         if not self.healthy_backends:
             raise HTTPException(status_code=503, detail="No healthy backends available")
-        backend = self.healthy_backends[self.current_index]
-        self.current_index = (self.current_index + 1) % len(self.healthy_backends)
+        count = len(self.healthy_backends)
+        start = self.current_index % count
+        candidates = self.healthy_backends[start:] + self.healthy_backends[:start]
+        backend = min(candidates, key=lambda b: self.outstanding[b])
+        self.current_index = (start + 1) % count
         return backend
 
-    async def proxy_request(self, request: web.Request) -> web.Response:
+    async def proxy_request(self, request: web.Request) -> web.StreamResponse:
         """Proxy incoming request to a backend service.
+
+        The request is sent over a pooled keep-alive connection and the backend
+        response is streamed back chunk by chunk instead of being buffered.
         
         Args:
             request: Incoming HTTP request
@@ -186,27 +235,41 @@ class LoadBalancer:
         """
         try:
             backend = self.get_next_backend()
-            path = request.path_qs
-            url = f"{backend}{path}"
-
-            async with aiohttp.ClientSession() as session:
-                async with session.request(
-                        method=request.method,
-                        url=url,
-                        headers=request.headers,
-                        data=await request.read(),
-                        timeout=6000
-                ) as resp:
-                    return web.Response(
-                        body=await resp.read(),
-                        status=resp.status,
-                        headers=resp.headers
-                    )
+        except HTTPException as e:
+            return web.Response(text=e.detail, status=e.status_code)
+
+        url = f"{backend}{request.path_qs}"
+        headers = {k: v for k, v in request.headers.items() if k.lower() not in self.HOP_BY_HOP_HEADERS}
+        response = None
+        self.outstanding[backend] += 1
+        try:
+            async with self.session.request(
+                    method=request.method,
+                    url=url,
+                    headers=headers,
+                    data=await request.read(),
+            ) as resp:
+                response = web.StreamResponse(
+                    status=resp.status,
+                    headers={k: v for k, v in resp.headers.items() if k.lower() not in self.HOP_BY_HOP_HEADERS}
+                )
+                if resp.content_length is not None:
+                    response.content_length = resp.content_length
+                await response.prepare(request)
+                async for chunk in resp.content.iter_any():
+                    await response.write(chunk)
+                await response.write_eof()
+                return response
         except Exception as e:
+            if response is not None and response.prepared:
+                # Headers are already sent, the client sees a truncated body.
+                raise
             return web.Response(text=str(e), status=500)
+        finally:
+            self.outstanding[backend] -= 1
 
     async def _check_all_backends(self, session):
-        """Check health status of all backends.
+        """Check health status of all backends concurrently.
         
         Args:
             session: Aiohttp session for making requests
@@ -214,11 +277,10 @@ class LoadBalancer:
         Returns:
             List of healthy backend URLs
         """
-        healthy = []
-        for backend in self.backends:
-            if await self._is_backend_healthy(session, backend):
-                healthy.append(backend)
-        return healthy
+        statuses = await asyncio.gather(
+            *(self._is_backend_healthy(session, backend) for backend in self.backends)
+        )
+        return [backend for backend, healthy in zip(self.backends, statuses) if healthy]
 
     async def _is_backend_healthy(self, session, backend):
         """Check if a single backend is healthy.
@@ -231,7 +293,7 @@ class LoadBalancer:
             bool: True if backend is healthy
         """
         try:
-            async with session.get(f"{backend}/health", timeout=6000) as resp:
+            async with session.get(f"{backend}/health", timeout=aiohttp.ClientTimeout(total=60)) as resp:
                 return resp.status == 200
         except Exception as e:
             print(f"An unexpected error occurred: {e}")
@@ -240,6 +302,18 @@ class LoadBalancer:
 
 app = FastAPI()
 
+@app.get("/health")
+async def health_endpoint():
+    """Liveness probe used by the load balancer health check."""
+    return {"status": "ok"}
+
+
+@app.get("/stats")
+async def stats_endpoint():
+    """Report hit/miss counters of the query embedding and result caches."""
+    return {"port": retriever.port, **retriever.stats()}
+
+
 @app.post("/retrieve")
 async def retrieve_endpoint(request: QueryRequest):
     """Endpoint that accepts queries and performs retrieval.
@@ -261,12 +335,9 @@ async def retrieve_endpoint(request: QueryRequest):
     if not isinstance(request.topk, int) or request.topk <= 0:
         request.topk = config.retrieval_topk
     print(f"retrieve input: {request}")
-    # Perform batch retrieval
+    # Perform batch retrieval, merged with queries of concurrent requests
     try:
-        results, scores = retriever.batch_search(
-            query_list=request.queries,
-            num=request.topk
-        )
+        results, scores = await scheduler.submit(request.queries, request.topk)
     except Exception as e:
         raise HTTPException(status_code=500) from e
         
@@ -294,6 +365,25 @@ if __name__ == "__main__":
     parser.add_argument("--retriever_model", type=str, required=True, help="Path of the retriever model.")
     parser.add_argument("--port", type=int, default=5005)
     parser.add_argument('--backend_count', type=int, default=3, help="Number of backend proxy load balancing threads")
+    parser.add_argument("--index_mmap", action="store_true", default=False,
+                        help="Memory-map the FAISS index read-only and share it across backend processes.")
+    parser.add_argument("--backend_start_interval", type=float, default=100,
+                        help="Seconds to wait between backend launches, can be lowered with --index_mmap.")
+    parser.add_argument("--search_params", type=str, default=None,
+                        help="FAISS search parameters, e.g. 'nprobe=64' or 'efSearch=128'. "
+                             "Defaults to the parameters saved with the index.")
+    parser.add_argument("--cache_size", type=int, default=100000,
+                        help="Maximum number of cached query embeddings per backend, 0 disables the cache.")
+    parser.add_argument("--cache_max_mb", type=float, default=1024,
+                        help="Memory limit in MB of each query cache per backend.")
+    parser.add_argument("--cache_exact_match", action="store_true", default=False,
+                        help="Key the query caches on the exact query string instead of its normalized form.")
+    parser.add_argument("--result_cache", action="store_true", default=False,
+                        help="Also cache whole top-k results per (query, topk).")
+    parser.add_argument("--max_batch_size", type=int, default=256,
+                        help="Maximum number of queries merged into one search batch per backend.")
+    parser.add_argument("--max_wait_ms", type=float, default=5.0,
+                        help="Maximum time in milliseconds a query waits for others to join its batch.")
 
     args = parser.parse_args()
     
@@ -319,7 +409,7 @@ if __name__ == "__main__":
         process.start()
         backend_processes.append(process)
         print(f"Starting backend service: 127.0.0.1:{port}")
-        time.sleep(100)
+        time.sleep(args.backend_start_interval)
 
     progress_bar = tqdm(total=len(backend_ports), desc="Initialization progress")
     completed_count = 0
@@ -0,0 +1,65 @@
+"""
+Copyright 2026 Huawei Technologies Co., Ltd
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import faiss
+import numpy as np
+import pytest
+
+from examples.agents.websearcher.retrieval_server.utils.index_presets import (
+    benchmark_index,
+    current_search_params,
+    read_index,
+    search_param_sweep,
+)
+
+
+def _build_index(factory: str, num_vectors: int = 2000, dim: int = 16):
+    vectors = np.random.default_rng(0).standard_normal((num_vectors, dim)).astype(np.float32)
+    index = faiss.index_factory(dim, factory, faiss.METRIC_INNER_PRODUCT)
+    index.train(vectors)
+    index.add(vectors)
+    return index, vectors
+
+
+@pytest.mark.parametrize("factory", ["Flat", "HNSW8,Flat", "IVF16,Flat", "IVF16,PQ4"])
+@pytest.mark.parametrize("mmap", [False, True])
+def test_read_index(tmp_path, factory, mmap):
+    index, vectors = _build_index(factory)
+    index_path = str(tmp_path / "index.faiss")
+    faiss.write_index(index, index_path)
+
+    loaded = read_index(index_path, mmap=mmap)
+
+    assert loaded.ntotal == index.ntotal
+    if faiss.try_extract_index_ivf(index) is not None:
+        faiss.extract_index_ivf(index).nprobe = faiss.extract_index_ivf(loaded).nprobe = 16
+    np.testing.assert_array_equal(loaded.search(vectors[:10], 5)[1], index.search(vectors[:10], 5)[1])
+
+
+def test_read_index_missing_file(tmp_path):
+    with pytest.raises(RuntimeError, match="Failed to load index"):
+        read_index(str(tmp_path / "missing.faiss"), mmap=True)
+
+
+@pytest.mark.parametrize("factory, params", [("IVF16,Flat", "nprobe=3"), ("HNSW8,Flat", "efSearch=20")])
+def test_benchmark_index_restores_search_params(factory, params):
+    index, vectors = _build_index(factory)
+    faiss.ParameterSpace().set_index_parameters(index, params)
+
+    report = benchmark_index(index, [vectors], topk=5, num_queries=50)
+
+    assert [row["search_params"] for row in report[1:]] == search_param_sweep(index)
+    assert current_search_params(index) == params
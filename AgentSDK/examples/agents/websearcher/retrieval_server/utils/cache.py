@@ -0,0 +1,103 @@
+"""
+Copyright 2026 Huawei Technologies Co., Ltd
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import sys
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a query string for cache lookup.
+
+    Leading/trailing whitespace is removed, inner whitespace runs are collapsed
+    and the text is lower-cased, so trivially different spellings of the same
+    query share one cache entry.
+    """
+    return " ".join(query.split()).lower()
+
+
+class LRUCache:
+    """Thread-safe LRU cache bounded by entry count and approximate memory.
+
+    Attributes:
+        max_entries: Maximum number of cached entries, 0 disables the cache.
+        max_bytes: Maximum approximate size of cached values in bytes, None for no limit.
+        hits: Number of successful lookups.
+        misses: Number of failed lookups.
+    """
+    def __init__(self, max_entries: int, max_bytes: int = None, sizeof: Callable = sys.getsizeof):
+        if not isinstance(max_entries, int) or max_entries < 0:
+            raise ValueError(f"max_entries {max_entries} must be a non-negative integer")
+        if max_bytes is not None and max_bytes <= 0:
+            raise ValueError(f"max_bytes {max_bytes} must be positive or None")
+
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.hits = 0
+        self.misses = 0
+        self.current_bytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key: Hashable, default=None):
+        """Return the cached value for key and mark it as recently used."""
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key][0]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value):
+        """Insert or refresh a value, evicting least recently used entries as needed."""
+        if not self.enabled:
+            return
+        size = self.sizeof(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self.current_bytes -= self._data.pop(key)[1]
+            self._data[key] = (value, size)
+            self.current_bytes += size
+            while len(self._data) > self.max_entries or (
+                    self.max_bytes is not None and self.current_bytes > self.max_bytes):
+                _, (_, evicted_size) = self._data.popitem(last=False)
+                self.current_bytes -= evicted_size
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and current occupancy."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -35,6 +35,17 @@ class RetrieverConfig:
         retrieval_query_max_length (int): Max query length, defaults to 256.
         retrieval_use_fp16 (bool): Whether to use FP16 precision, defaults to False.
         retrieval_batch_size (int): Batch size for processing, defaults to 128.
+        retrieval_index_mmap (bool): Whether to memory-map the FAISS index read-only so that
+            backend processes share its pages, defaults to False.
+        retrieval_cache_size (int): Maximum number of cached query embeddings (and top-k results
+            when enabled), 0 disables caching, defaults to 0.
+        retrieval_cache_max_mb (float): Memory limit in MB of each cache, defaults to None (no limit).
+        retrieval_cache_normalize (bool): Whether cache keys use the normalized query string
+            instead of the exact one, defaults to True.
+        retrieval_result_cache (bool): Whether to also cache whole top-k results per (query, k),
+            defaults to False.
+        retrieval_search_params (str): FAISS search parameters such as "nprobe=64" or "efSearch=128",
+            defaults to None (use the parameters saved with the index, if any).
     """
     def __init__(
         self, 
@@ -46,11 +57,36 @@ class RetrieverConfig:
         retrieval_pooling_method: str = "mean",
         retrieval_query_max_length: int = 256,
         retrieval_use_fp16: bool = False,
-        retrieval_batch_size: int = 128
+        retrieval_batch_size: int = 128,
+        retrieval_index_mmap: bool = False,
+        retrieval_cache_size: int = 0,
+        retrieval_cache_max_mb: Optional[float] = None,
+        retrieval_cache_normalize: bool = True,
+        retrieval_result_cache: bool = False,
+        retrieval_search_params: Optional[str] = None
     ):
         if not isinstance(retrieval_use_fp16, bool):
             raise TypeError("retrieval_use_fp16 must be a boolean")
 
+        if not isinstance(retrieval_index_mmap, bool):
+            raise TypeError("retrieval_index_mmap must be a boolean")
+
+        if not isinstance(retrieval_cache_size, int) or retrieval_cache_size < 0:
+            raise TypeError("retrieval_cache_size must be a non-negative integer")
+
+        if retrieval_cache_max_mb is not None and (
+                not isinstance(retrieval_cache_max_mb, (int, float)) or retrieval_cache_max_mb <= 0):
+            raise TypeError("retrieval_cache_max_mb must be a positive number or None")
+
+        if not isinstance(retrieval_cache_normalize, bool):
+            raise TypeError("retrieval_cache_normalize must be a boolean")
+
+        if not isinstance(retrieval_result_cache, bool):
+            raise TypeError("retrieval_result_cache must be a boolean")
+
+        if retrieval_search_params is not None and not isinstance(retrieval_search_params, str):
+            raise TypeError("retrieval_search_params must be a string or None")
+
         if not isinstance(retrieval_topk, int) or not 1 <= retrieval_topk <= 1024:
             raise TypeError("retrieval_topk must be an integer between 1 and 1024")
 
@@ -85,6 +121,12 @@ class RetrieverConfig:
         self.retrieval_query_max_length = retrieval_query_max_length
         self.retrieval_use_fp16 = retrieval_use_fp16
         self.retrieval_batch_size = retrieval_batch_size
+        self.retrieval_index_mmap = retrieval_index_mmap
+        self.retrieval_cache_size = retrieval_cache_size
+        self.retrieval_cache_max_mb = retrieval_cache_max_mb
+        self.retrieval_cache_normalize = retrieval_cache_normalize
+        self.retrieval_result_cache = retrieval_result_cache
+        self.retrieval_search_params = retrieval_search_params
 
 class QueryRequest(BaseModel):
     queries: List[str]
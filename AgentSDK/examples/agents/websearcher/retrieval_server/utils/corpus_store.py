@@ -0,0 +1,115 @@
+"""
+Copyright 2026 Huawei Technologies Co., Ltd
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import json
+import mmap
+import time
+import warnings
+import numpy as np
+
+
+class JsonlCorpusStore:
+    """Read-only, memory-mapped document store over a JSON Lines corpus.
+
+    The corpus file itself is used as the contiguous UTF-8 blob: it is mapped
+    into memory once and an int64 offsets array marks where every document
+    starts. Pages of the mapping are shared by all processes that open the
+    same file, so backends do not hold private copies of the corpus.
+
+    The offsets array is cached next to the corpus as ``<corpus>.offsets.npy``
+    and rebuilt when the corpus file is newer than the cache.
+
+    Attributes:
+        corpus_path: Path to the JSON Lines corpus file.
+        offsets: int64 array of shape (num_docs + 1,) with document byte offsets.
+    """
+    SCAN_CHUNK_SIZE = 64 * 1024 * 1024
+
+    def __init__(self, corpus_path: str):
+        self.corpus_path = corpus_path
+        self.offsets_path = f"{corpus_path}.offsets.npy"
+
+        with open(corpus_path, "rb") as f:
+            self._blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.offsets = self._load_offsets()
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx: int):
+        return self.take([idx])[0]
+
+    def take(self, doc_idxs):
+        """Fetch documents for a batch of indices.
+
+        Byte ranges for all indices are gathered with a single vectorized
+        lookup; only the selected documents are decoded.
+
+        Args:
+            doc_idxs: Sequence or array of document indices. Negative indices
+                (FAISS pads missing results with -1) yield None.
+
+        Returns:
+            list: Decoded documents aligned with ``doc_idxs``.
+        """
+        doc_idxs = np.asarray(doc_idxs, dtype=np.int64).reshape(-1)
+        valid = (doc_idxs >= 0) & (doc_idxs < len(self))
+        safe_idxs = np.where(valid, doc_idxs, 0)
+        starts = self.offsets[safe_idxs].tolist()
+        ends = self.offsets[safe_idxs + 1].tolist()
+
+        return [
+            json.loads(self._blob[start:end]) if is_valid else None
+            for start, end, is_valid in zip(starts, ends, valid.tolist())
+        ]
+
+    def _load_offsets(self) -> np.ndarray:
+        """Load cached document offsets or scan the corpus to build them."""
+        if (os.path.exists(self.offsets_path)
+                and os.path.getmtime(self.offsets_path) >= os.path.getmtime(self.corpus_path)):
+            return np.load(self.offsets_path, mmap_mode="r")
+
+        print(f"begin build corpus offsets for {self.corpus_path}")
+        time_start = time.time()
+        offsets = self._scan_offsets()
+        print(f"build corpus offsets time : {time.time() - time_start:.3f}, docs: {len(offsets) - 1}")
+        # Write atomically so that backends starting concurrently never read a partial cache.
+        tmp_path = f"{self.offsets_path}.{os.getpid()}.tmp.npy"
+        try:
+            np.save(tmp_path, offsets)
+            os.replace(tmp_path, self.offsets_path)
+        except OSError as e:
+            warnings.warn(f"Failed to cache corpus offsets to {self.offsets_path}: {e}", UserWarning)
+        return offsets
+
+    def _scan_offsets(self) -> np.ndarray:
+        """Find the byte offset of every non-empty line in the corpus."""
+        size = len(self._blob)
+        newlines = []
+        for chunk_start in range(0, size, self.SCAN_CHUNK_SIZE):
+            chunk = np.frombuffer(self._blob, dtype=np.uint8,
+                                  count=min(self.SCAN_CHUNK_SIZE, size - chunk_start), offset=chunk_start)
+            newlines.append(np.flatnonzero(chunk == ord("\n")) + chunk_start)
+        newlines = np.concatenate(newlines) if newlines else np.empty(0, dtype=np.int64)
+
+        # Every line starts right after a newline. Empty lines (e.g. a trailing newline at
+        # EOF) are dropped; a document then spans up to the next start, and the extra
+        # whitespace is ignored by the JSON decoder.
+        starts = np.concatenate(([0], newlines + 1)).astype(np.int64)
+        ends = np.concatenate((newlines, [size])).astype(np.int64)
+        starts = starts[ends > starts]
+        return np.append(starts, size).astype(np.int64)
@@ -14,6 +14,7 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
+import os
 import datasets
 from transformers import AutoTokenizer, AutoModel
 
@@ -38,14 +39,30 @@ def load_docs(corpus, doc_idxs):
     """Retrieve documents by indices from the corpus.
     
     Args:
-        corpus: The loaded dataset corpus
-        doc_idxs: List of document indices to retrieve
+        corpus: The loaded corpus store (e.g. JsonlCorpusStore)
+        doc_idxs: List or array of document indices to retrieve
         
     Returns:
         list: List of retrieved documents
     """
-    results = [corpus[int(idx)] for idx in doc_idxs]
-    return results
+    return corpus.take(doc_idxs)
+
+def get_resident_memory_mb():
+    """Return the resident and shared memory of the current process in MB.
+    
+    Shared pages (e.g. a memory-mapped index or corpus) are counted in the
+    resident size of every process that maps them, so both values are reported.
+        
+    Returns:
+        tuple: (resident_mb, shared_mb), or (None, None) if /proc is unavailable
+    """
+    try:
+        with open("/proc/self/statm", encoding="utf-8") as f:
+            _, resident, shared = (int(v) for v in f.read().split()[:3])
+    except (OSError, ValueError):
+        return None, None
+    page_mb = os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    return resident * page_mb, shared * page_mb
 
 def load_model(model_path: str, use_fp16: bool = False):
     """Load pre-trained model and tokenizer.
@@ -0,0 +1,205 @@
+"""
+Copyright 2026 Huawei Technologies Co., Ltd
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import math
+import time
+import faiss
+import numpy as np
+
+INDEX_PRESETS = ["flat", "ivf_flat", "ivf_pq", "hnsw", "opq_ivf_pq"]
+
+# Search parameters swept by the benchmark, per kind of index.
+NPROBE_SWEEP = [1, 4, 16, 32, 64, 128, 256, 512]
+EF_SEARCH_SWEEP = [16, 32, 64, 128, 256, 512]
+
+HNSW_M = 32
+HNSW_EF_SEARCH = 128
+
+
+def index_io_flags(mmap: bool) -> int:
+    """Return faiss read flags, mapping the index file read-only when mmap is set.
+
+    Mapped indexes share their pages through the OS page cache across all
+    processes opening the same file. IO_FLAG_MMAP_IFC maps the codes of every
+    index type, IVF inverted lists included; older faiss releases only provide
+    IO_FLAG_MMAP, which maps IVF inverted lists only. The two flags must not be
+    combined, IVF indexes then fail to load.
+    """
+    if not mmap:
+        return 0
+    read_only = getattr(faiss, "IO_FLAG_READ_ONLY", 0)
+    if hasattr(faiss, "IO_FLAG_MMAP_IFC"):
+        return faiss.IO_FLAG_MMAP_IFC | read_only
+    return faiss.IO_FLAG_MMAP | read_only
+
+
+def read_index(index_path: str, mmap: bool = False):
+    """Read a faiss index, memory-mapped when mmap is set (see index_io_flags)."""
+    try:
+        return faiss.read_index(index_path, index_io_flags(mmap))
+    except RuntimeError as e:
+        raise RuntimeError(f"Failed to load index from {index_path}") from e
+
+
+def _num_lists(corpus_size: int) -> int:
+    """Number of IVF lists: ~4 * sqrt(N) rounded to a power of two, with >= 39 points per list."""
+    nlist = 2 ** round(math.log2(max(1.0, 4 * math.sqrt(corpus_size))))
+    return max(1, min(nlist, corpus_size // 39))
+
+
+def _num_subquantizers(dim: int) -> int:
+    """Number of PQ sub-quantizers: ~dim / 8 (one byte per 8 dims), must divide dim."""
+    for m in range(max(1, dim // 8), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def resolve_preset(preset: str, corpus_size: int, dim: int) -> dict:
+    """Pick FAISS index parameters for a named preset from the corpus size.
+
+    Args:
+        preset: One of INDEX_PRESETS.
+        corpus_size: Number of vectors to index.
+        dim: Dimensionality of each vector.
+
+    Returns:
+        dict: with keys
+            - factory: FAISS index_factory string
+            - train_size: number of vectors to sample for training (0 if untrained)
+            - search_params: FAISS ParameterSpace string applied at load time, may be empty
+    """
+    if preset not in INDEX_PRESETS:
+        raise ValueError(f"Invalid index preset: {preset}. Must be one of {INDEX_PRESETS}")
+
+    nlist = _num_lists(corpus_size)
+    m = _num_subquantizers(dim)
+    nprobe = min(nlist, max(16, nlist // 128))
+    # 64 points per centroid are enough for k-means; PQ codebooks need at least 256 * 39 points.
+    ivf_train_size = min(corpus_size, max(64 * nlist, 256 * 39))
+
+    if preset == "flat":
+        return {"factory": "Flat", "train_size": 0, "search_params": ""}
+    if preset == "hnsw":
+        return {"factory": f"HNSW{HNSW_M},Flat", "train_size": 0, "search_params": f"efSearch={HNSW_EF_SEARCH}"}
+    if preset == "ivf_flat":
+        factory = f"IVF{nlist},Flat"
+    elif preset == "ivf_pq":
+        factory = f"IVF{nlist},PQ{m}"
+    else:
+        factory = f"OPQ{m},IVF{nlist},PQ{m}"
+    return {"factory": factory, "train_size": ivf_train_size, "search_params": f"nprobe={nprobe}"}
+
+
+def search_param_sweep(index) -> list:
+    """Return the search parameter strings worth benchmarking for an index."""
+    if faiss.try_extract_index_ivf(index) is not None:
+        nlist = faiss.extract_index_ivf(index).nlist
+        return [f"nprobe={v}" for v in NPROBE_SWEEP if v <= nlist]
+    if "HNSW" in type(index).__name__:
+        return [f"efSearch={v}" for v in EF_SEARCH_SWEEP]
+    return [""]
+
+
+def current_search_params(index) -> str:
+    """Return the search parameter string currently set on an index, in the format of search_param_sweep."""
+    if faiss.try_extract_index_ivf(index) is not None:
+        return f"nprobe={faiss.extract_index_ivf(index).nprobe}"
+    if "HNSW" in type(index).__name__:
+        return f"efSearch={index.hnsw.efSearch}"
+    return ""
+
+
+def sample_rows(chunks, sample_size: int, seed: int = 0) -> np.ndarray:
+    """Draw a uniform random sample of rows across a list of (memory-mapped) arrays.
+
+    Args:
+        chunks (list): Arrays of shape (n_i, dim), e.g. float16 embedding shards.
+        sample_size (int): Maximum number of rows to draw.
+        seed (int): Random seed.
+
+    Returns:
+        np.ndarray: float32 array of sampled rows.
+    """
+    sizes = np.array([chunk.shape[0] for chunk in chunks])
+    total = int(sizes.sum())
+    picked = np.sort(np.random.default_rng(seed).choice(total, size=min(sample_size, total), replace=False))
+    bounds = np.concatenate(([0], np.cumsum(sizes)))
+    samples = []
+    for chunk_id, chunk in enumerate(chunks):
+        lo, hi = np.searchsorted(picked, bounds[chunk_id:chunk_id + 2])
+        if hi > lo:
+            samples.append(chunk[picked[lo:hi] - bounds[chunk_id]])
+    return np.ascontiguousarray(np.concatenate(samples), dtype=np.float32)
+
+
+def exact_search(chunks, queries: np.ndarray, topk: int, block_size: int = 100000):
+    """Exact inner-product top-k over a list of arrays, processed block by block.
+
+    Returns:
+        np.ndarray: [num_queries, topk] int64 array of global row ids.
+    """
+    best_scores = np.full((queries.shape[0], 0), -np.inf, dtype=np.float32)
+    best_ids = np.empty((queries.shape[0], 0), dtype=np.int64)
+    offset = 0
+    for chunk in chunks:
+        for start in range(0, chunk.shape[0], block_size):
+            block = np.asarray(chunk[start:start + block_size], dtype=np.float32)
+            scores = np.concatenate([best_scores, queries @ block.T], axis=1)
+            ids = np.concatenate([best_ids, np.broadcast_to(
+                np.arange(offset + start, offset + start + block.shape[0]), (queries.shape[0], block.shape[0]))], axis=1)
+            keep = np.argpartition(-scores, min(topk, scores.shape[1]) - 1, axis=1)[:, :topk]
+            best_scores = np.take_along_axis(scores, keep, axis=1)
+            best_ids = np.take_along_axis(ids, keep, axis=1)
+        offset += chunk.shape[0]
+    return best_ids
+
+
+def benchmark_index(index, chunks, topk: int = 10, num_queries: int = 1000, seed: int = 1) -> list:
+    """Measure recall@k against exact search and queries/sec for a built index.
+
+    Query vectors are sampled from the indexed vectors themselves. Every search
+    parameter value from search_param_sweep is evaluated, then the index
+    parameters are restored to their values before the sweep.
+
+    Returns:
+        list: dicts with keys "search_params", "recall", "qps", the first entry
+        being the exact (Flat) baseline.
+    """
+    queries = sample_rows(chunks, num_queries, seed=seed)
+    time_start = time.time()
+    ground_truth = exact_search(chunks, queries, topk)
+    report = [{"search_params": "exact", "recall": 1.0, "qps": len(queries) / (time.time() - time_start)}]
+
+    parameter_space = faiss.ParameterSpace()
+    saved_params = current_search_params(index)
+    try:
+        for params in search_param_sweep(index):
+            if params:
+                parameter_space.set_index_parameters(index, params)
+            time_start = time.time()
+            _, ids = index.search(queries, topk)
+            elapsed = time.time() - time_start
+            hits = sum(len(np.intersect1d(found, expected)) for found, expected in zip(ids, ground_truth))
+            report.append({
+                "search_params": params or "default",
+                "recall": hits / ground_truth.size,
+                "qps": len(queries) / elapsed,
+            })
+    finally:
+        if saved_params:
+            parameter_space.set_index_parameters(index, saved_params)
+    return report
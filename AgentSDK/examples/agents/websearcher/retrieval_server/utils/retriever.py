@@ -14,7 +14,10 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
+import os
 import time
+import json
+import warnings
 import faiss
 import torch
 import numpy as np
@@ -22,27 +25,46 @@ import numpy as np
 from typing import List
 from tqdm import tqdm
 
-from examples.agents.websearcher.retrieval_server.utils.function import load_corpus, load_docs, load_model, pooling
+from examples.agents.websearcher.retrieval_server.utils.function import get_resident_memory_mb, load_docs, load_model, pooling
+from examples.agents.websearcher.retrieval_server.utils.corpus_store import JsonlCorpusStore
+from examples.agents.websearcher.retrieval_server.utils.cache import LRUCache, normalize_query
+from examples.agents.websearcher.retrieval_server.utils.index_presets import read_index
 
 class Encoder:
     """Text encoder for converting natural language to vector representations.
     
     Supports multiple model architectures with consistent output format.
+    Query embeddings are kept in a bounded LRU cache keyed on the (optionally
+    normalized) query string, so repeated queries skip tokenization and the
+    forward pass.
     """
-    def __init__(self, model_name, model_path, pooling_method, max_length, use_fp16):
+    def __init__(self, model_name, model_path, pooling_method, max_length, use_fp16,
+                 cache_size=0, cache_max_mb=None, cache_normalize=True):
         """Initialize the text encoder."""
         self.model_name = model_name
         self.model_path = model_path
         self.pooling_method = pooling_method
         self.max_length = max_length
         self.use_fp16 = use_fp16
+        self.cache_normalize = cache_normalize
+        self.cache = LRUCache(
+            max_entries=cache_size,
+            max_bytes=int(cache_max_mb * 1024 * 1024) if cache_max_mb else None,
+            sizeof=lambda emb: emb.nbytes,
+        )
 
         self.model, self.tokenizer = load_model(model_path=model_path, use_fp16=use_fp16)
         self.model.eval()
 
-    @torch.no_grad()
+    def cache_key(self, query: str) -> str:
+        """Return the cache key of a query: exact string or its normalized form."""
+        return normalize_query(query) if self.cache_normalize else query
+
     def encode(self, query_list: List[str]):
         """Encode text queries into fixed-dimension vectors.
+
+        Cached embeddings are reused; only distinct uncached queries are
+        sent through the model.
         
         Args:
             query_list: List of text queries to encode
@@ -50,10 +72,34 @@ class Encoder:
         Returns:
             np.ndarray: [batch_size, embedding_dim] array of float32 vectors
         """
-        # processing query for different encoders
         if not isinstance(query_list, list):
             raise ValueError("Query must be a list")
+        if not self.cache.enabled:
+            return self._encode(query_list)
+
+        keys = [self.cache_key(query) for query in query_list]
+        embeddings = [self.cache.get(key) for key in keys]
+        # deduplicate misses so that a query repeated within the batch is encoded once
+        missing = {}
+        for key, query, emb in zip(keys, query_list, embeddings):
+            if emb is None and key not in missing:
+                missing[key] = query
+
+        if missing:
+            missing_emb = self._encode(list(missing.values()))
+            computed = {}
+            for key, emb in zip(missing, missing_emb):
+                # copy the row so the cache does not pin the whole batch array
+                computed[key] = emb.copy()
+                self.cache.put(key, computed[key])
+            embeddings = [emb if emb is not None else computed[key] for key, emb in zip(keys, embeddings)]
 
+        return np.stack(embeddings).astype(np.float32, order="C", copy=False)
+
+    @torch.no_grad()
+    def _encode(self, query_list: List[str]):
+        """Run tokenization and the model forward pass for a list of queries."""
+        # processing query for different encoders
         if "e5" in self.model_name.lower():
             query_list = [f"query: {query}" for query in query_list]
         else:
@@ -130,27 +176,66 @@ class DenseRetriever(BaseRetriever):
         """Initialize the dense retriever."""
         super().__init__(config_param)
         
-        try:
-            print(f'begin load faiss index from {self.index_path}')
-            time_start = time.time()
-            self.index = faiss.read_index(self.index_path)
-            time_end = time.time()
-            print(f"load faiss index time : {time_end-time_start:.3f}")
-        except faiss.FaissException as e:
-            raise RuntimeError(f"Failed to load index from {self.index_path}") from e
-
-        self.corpus = load_corpus(self.corpus_path)
+        self.index_mmap = config_param.retrieval_index_mmap
+        print(f'begin load faiss index from {self.index_path} (mmap: {self.index_mmap})')
+        time_start = time.time()
+        self.index = read_index(self.index_path, self.index_mmap)
+        self.index_load_time = time.time() - time_start
+        print(f"load faiss index time : {self.index_load_time:.3f}")
+        if (self.index_mmap and not hasattr(faiss, "IO_FLAG_MMAP_IFC")
+                and faiss.try_extract_index_ivf(self.index) is None):
+            warnings.warn(f"--index_mmap has no effect on the {type(self.index).__name__} index: this faiss only "
+                          "memory-maps IVF inverted lists (IO_FLAG_MMAP_IFC is missing), so every backend loads "
+                          "its own copy of the index.", UserWarning)
+
+        self.search_params = self._load_search_params(config_param.retrieval_search_params)
+        if self.search_params:
+            print(f"set faiss search parameters : {self.search_params}")
+            faiss.ParameterSpace().set_index_parameters(self.index, self.search_params)
+
+        time_start = time.time()
+        self.corpus = JsonlCorpusStore(self.corpus_path)
+        self.corpus_load_time = time.time() - time_start
+        print(f"load corpus time : {self.corpus_load_time:.3f}")
         self.encoder = Encoder(
             model_name = self.retrieval_method,
             model_path = config_param.retrieval_model_path,
             pooling_method = config_param.retrieval_pooling_method,
             max_length = config_param.retrieval_query_max_length,
-            use_fp16 = config_param.retrieval_use_fp16
+            use_fp16 = config_param.retrieval_use_fp16,
+            cache_size = config_param.retrieval_cache_size,
+            cache_max_mb = config_param.retrieval_cache_max_mb,
+            cache_normalize = config_param.retrieval_cache_normalize
+        )
+        # Optional cache of whole top-k results per (query, k), bounded like the embedding cache.
+        self.result_cache = LRUCache(
+            max_entries=config_param.retrieval_cache_size if config_param.retrieval_result_cache else 0,
+            max_bytes=(int(config_param.retrieval_cache_max_mb * 1024 * 1024)
+                       if config_param.retrieval_cache_max_mb else None),
+            sizeof=lambda result: len(json.dumps(result)),
         )
         self.topk = config_param.retrieval_topk
         self.batch_size = config_param.retrieval_batch_size
         self.port = retriever_port
 
+        resident_mb, shared_mb = get_resident_memory_mb()
+        if resident_mb is not None:
+            print(f"PORT {self.port} resident memory: {resident_mb:.1f} MB (shared: {shared_mb:.1f} MB)")
+
+    def _load_search_params(self, search_params):
+        """Return the FAISS search parameters (e.g. "nprobe=64") to apply to the index.
+
+        Explicitly configured parameters take precedence over the ones saved by
+        IndexBuilder next to the index file (``<index>.params.json``).
+        """
+        if search_params is not None:
+            return search_params
+        params_path = f"{self.index_path}.params.json"
+        if not os.path.exists(params_path):
+            return ""
+        with open(params_path, "r", encoding="utf-8") as f:
+            return json.load(f).get("search_params", "")
+
     def _batch_search(self, query_list: List[str], num: int = None):
         """Perform batch query search with progress tracking.
         
@@ -168,7 +253,30 @@ class DenseRetriever(BaseRetriever):
                 raise ValueError("num must be positive")
 
         num = num or self.topk
-        
+        if not self.result_cache.enabled:
+            return self._search(query_list, num)
+
+        keys = [(self.encoder.cache_key(query), num) for query in query_list]
+        cached = [self.result_cache.get(key) for key in keys]
+        missing = {}
+        for key, query, item in zip(keys, query_list, cached):
+            if item is None and key not in missing:
+                missing[key] = query
+
+        if missing:
+            missing_results, missing_scores = self._search(list(missing.values()), num)
+            computed = {}
+            for key, result, score in zip(missing, missing_results, missing_scores):
+                computed[key] = (result, score)
+                self.result_cache.put(key, computed[key])
+            cached = [item if item is not None else computed[key] for key, item in zip(keys, cached)]
+
+        results = [result for result, _ in cached]
+        scores = [score for _, score in cached]
+        return results, scores
+
+    def _search(self, query_list: List[str], num: int):
+        """Encode queries and search the index in batches of self.batch_size."""
         results = []
         scores = []
         pbar = tqdm(
@@ -180,16 +288,20 @@ class DenseRetriever(BaseRetriever):
             query_batch = query_list[start_idx:start_idx + self.batch_size]
             batch_emb = self.encoder.encode(query_batch)
             batch_scores, batch_idxs = self.index.search(batch_emb, k=num)
-            batch_scores = batch_scores.tolist()
-            batch_idxs = batch_idxs.tolist()
-
-            # load_docs is not vectorized, but is a python list approach
-            flat_idxs = sum(batch_idxs, [])
-            batch_results = load_docs(self.corpus, flat_idxs)
-            # chunk them back
-            batch_results = [batch_results[i*num : (i+1)*num] for i in range(len(batch_idxs))]
-            
-            results.extend(batch_results)
-            scores.extend(batch_scores)
+
+            # fetch all top-k docs of the batch with a single lookup, then chunk them back
+            batch_docs = load_docs(self.corpus, batch_idxs.reshape(-1))
+            for i, (query_scores, query_idxs) in enumerate(zip(batch_scores.tolist(), batch_idxs.tolist())):
+                # FAISS pads queries with fewer than num hits with id -1, drop them with their scores
+                hits = [j for j, idx in enumerate(query_idxs) if idx >= 0]
+                results.append([batch_docs[i * num + j] for j in hits])
+                scores.append([query_scores[j] for j in hits])
             
-        return results, scores
\ No newline at end of file
+        return results, scores
+
+    def stats(self):
+        """Return hit/miss counters of the embedding and result caches."""
+        return {
+            "embedding_cache": self.encoder.cache.stats(),
+            "result_cache": self.result_cache.stats(),
+        }
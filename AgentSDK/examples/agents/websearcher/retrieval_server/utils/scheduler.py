@@ -0,0 +1,117 @@
+"""
+Copyright 2026 Huawei Technologies Co., Ltd
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Tuple
+
+
+class MicroBatchScheduler:
+    """Coalesces queries from concurrent requests into a single retrieval call.
+
+    Requests are queued and collected until either ``max_batch_size`` queries
+    are pending or ``max_wait_ms`` has elapsed since the first query of the
+    window arrived. The collected queries are searched with one call to
+    ``search_fn`` (one encoder forward pass and one FAISS search per batch) and
+    the results are fanned back out to the waiting requests.
+
+    Attributes:
+        search_fn: Blocking callable ``(query_list, num) -> (results, scores)``.
+        max_batch_size: Maximum number of queries merged into one search call.
+        max_wait_ms: Maximum time a query waits for others to join its batch.
+    """
+    def __init__(self, search_fn: Callable, max_batch_size: int = 256, max_wait_ms: float = 5.0):
+        if not isinstance(max_batch_size, int) or max_batch_size <= 0:
+            raise ValueError(f"max_batch_size {max_batch_size} must be a positive integer")
+        if max_wait_ms < 0:
+            raise ValueError(f"max_wait_ms {max_wait_ms} must be non-negative")
+
+        self.search_fn = search_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+
+        self._queue = None
+        self._worker = None
+        # The search itself is blocking (NPU forward + FAISS), run it off the event loop
+        # on a single thread so that batches are executed one after another.
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    async def submit(self, queries: List[str], num: int) -> Tuple[list, list]:
+        """Queue queries for retrieval and wait for their results.
+
+        Args:
+            queries: List of query strings from one request.
+            num: Number of results to return per query.
+
+        Returns:
+            tuple: (list of results, list of scores) aligned with ``queries``.
+        """
+        if not queries:
+            return [], []
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((queries, num, future))
+        return await future
+
+    def _ensure_worker(self):
+        """Start the batching coroutine on the running event loop if needed."""
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def _collect(self) -> list:
+        """Wait for the first pending request, then gather more until the window closes."""
+        pending = [await self._queue.get()]
+        pending_count = len(pending[0][0])
+        deadline = time.monotonic() + self.max_wait_ms / 1000
+        while pending_count < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout=timeout)
+            except asyncio.TimeoutError:
+                break
+            pending.append(item)
+            pending_count += len(item[0])
+        return pending
+
+    async def _run(self):
+        """Main loop: collect a batch, search it once and dispatch the results."""
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = await self._collect()
+            query_list = [query for queries, _, _ in pending for query in queries]
+            # Search with the largest requested topk and truncate per request afterwards.
+            num = max(item_num for _, item_num, _ in pending)
+            try:
+                results, scores = await loop.run_in_executor(self._executor, self.search_fn, query_list, num)
+            except Exception as e:
+                for _, _, future in pending:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            offset = 0
+            for queries, item_num, future in pending:
+                end = offset + len(queries)
+                if not future.done():
+                    future.set_result((
+                        [result[:item_num] for result in results[offset:end]],
+                        [score[:item_num] for score in scores[offset:end]],
+                    ))
+                offset = end
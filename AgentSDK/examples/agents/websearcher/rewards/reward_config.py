@@ -75,4 +75,7 @@ class WebSearcherRewardFnConfig:
     res_incorrect: float = -2.0
 
     # Final result empty or format incorrect (no \boxed{} wrapping)
-    res_null: float = -3.0
\ No newline at end of file
+    res_null: float = -3.0
+
+    # Print the answer, ground truth and reward of every scored response
+    debug: bool = False
\ No newline at end of file
@@ -16,13 +16,15 @@ limitations under the License.
 
 import ast
 import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from typing import Any
 
 from rllm.rewards.reward_fn import RewardOutput
 
 from examples.agents.websearcher.websearcher_tool_parser import WebSearcherKeyword
 from examples.agents.websearcher.rewards.reward_config import WebSearcherRewardStage, WebSearcherRewardFnConfig, WebSearcherResultDocs
-from examples.agents.websearcher.rewards.utils import f1_score
+from examples.agents.websearcher.rewards.utils import f1_score_tokens, ground_truth_tokens, response_tokens
 
 
 def websearcher_reward_fn(eval_data: Any, stage: WebSearcherRewardStage, task_info=None):
@@ -31,9 +33,64 @@ def websearcher_reward_fn(eval_data: Any, stage: WebSearcherRewardStage, task_in
     return reward_fn(eval_data, stage, task_info)
 
 
+def _score_one(config: WebSearcherRewardFnConfig, stage: WebSearcherRewardStage, item: tuple):
+    """Score one (eval_data, task_info) pair, module level so that it can run in a worker process."""
+    eval_data, task_info = item
+    return WebSearcherRewardFn(config)(eval_data, stage, task_info)
+
+
 class WebSearcherRewardFn:
+    # Minimum number of items per worker process task in score_batch
+    BATCH_CHUNK_SIZE = 16
+
     def __init__(self, config: WebSearcherRewardFnConfig):
         self.config = config
+        self._executor = None
+        self._num_workers = 0
+
+    def score_batch(
+            self,
+            eval_data_list: list,
+            task_info_list: list,
+            stage: WebSearcherRewardStage = WebSearcherRewardStage.DONE,
+            num_workers: int = 0
+    ) -> list:
+        """
+        Score a whole rollout batch at once.
+
+        Args:
+            eval_data_list: Eval data of every rollout, e.g. the final responses for the DONE stage.
+            task_info_list: Task info of every rollout, aligned with eval_data_list.
+            stage: Reward stage shared by the whole batch.
+            num_workers: Number of worker processes, 0 or 1 scores in the calling process. The pool
+                is created on first use and kept for later batches.
+
+        Returns:
+            list: RewardOutput of every rollout, in input order.
+        """
+        if len(eval_data_list) != len(task_info_list):
+            raise ValueError(f"eval_data_list and task_info_list must have the same length, "
+                             f"but got {len(eval_data_list)} and {len(task_info_list)}")
+        if not isinstance(num_workers, int) or num_workers < 0:
+            raise ValueError(f"num_workers must be a non-negative integer, but got {num_workers}")
+
+        items = list(zip(eval_data_list, task_info_list))
+        if num_workers <= 1 or len(items) <= self.BATCH_CHUNK_SIZE:
+            return [self(eval_data, stage, task_info) for eval_data, task_info in items]
+
+        if self._executor is None or self._num_workers != num_workers:
+            self.close()
+            self._executor = ProcessPoolExecutor(max_workers=num_workers)
+            self._num_workers = num_workers
+        chunk_size = max(self.BATCH_CHUNK_SIZE, len(items) // (num_workers * 4))
+        return list(self._executor.map(partial(_score_one, self.config, stage), items, chunksize=chunk_size))
+
+    def close(self):
+        """Shut down the worker processes of score_batch, if any."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+            self._num_workers = 0
     
     def __call__(self, eval_data: dict | str, stage: WebSearcherRewardStage, task_info: dict):
         if not isinstance(eval_data, (dict, str)):
@@ -247,19 +304,22 @@ class WebSearcherRewardFn:
         per_answer_true = CORRECT_REWARD / len(ground_truth)
         per_answer_false = ERROR_REWARD / len(model_response)
         reward = 0
+        # Every response and ground truth is tokenized once, ground truth tokens are cached across calls
+        gt_tokens = [ground_truth_tokens(gt) for gt in ground_truth]
         for response in model_response:
+            pred_tokens = response_tokens(response)
             best_f1_score = 0.0
-            best_match = ""
-            
-            for gt in ground_truth:
-                f1 = f1_score(response, gt)
+            best_match = -1
+
+            for gt_idx, tokens in enumerate(gt_tokens):
+                f1 = f1_score_tokens(pred_tokens, tokens)
                 if f1 > best_f1_score:
                     best_f1_score = f1
-                    best_match = gt
+                    best_match = gt_idx
             
             if best_f1_score > 0.0:
                 reward += best_f1_score * per_answer_true
-                ground_truth.remove(best_match)
+                del gt_tokens[best_match]
             else:
                 reward += per_answer_false
         
@@ -345,5 +405,6 @@ class WebSearcherRewardFn:
         answer = WebSearcherRewardFn._extract_answer(eval_data)
         ground_truth = task_info.get("ground_truth", "") if task_info else ""
         reward, obs = WebSearcherRewardFn._verify_result(ground_truth, answer)
-        print(f"answer: {answer}\nground_truth: {ground_truth}\nreward: {reward}")
+        if self.config.debug:
+            print(f"answer: {answer}\nground_truth: {ground_truth}\nreward: {reward}")
         return float(reward), obs
\ No newline at end of file
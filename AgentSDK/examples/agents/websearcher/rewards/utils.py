@@ -14,8 +14,26 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
+from functools import lru_cache
+
 import regex
 
+# Tokens extracted in priority order: number+unit combos, English words, standalone numbers
+# and Chinese characters.
+TOKEN_PATTERN = regex.compile(r"""
+    \d+\.?\d*[a-zA-Z%℃°\u4e00-\u9fff]+      # number+unit
+    |
+    [a-zA-Z][a-zA-Z0-9_\-]*                  # English words
+    |
+    \d+\.?\d*                                # standalone numbers
+    |
+    \p{Han}                                  # Chinese characters
+""", regex.VERBOSE)
+
+# Maximum number of cached ground truth token sets
+GROUND_TRUTH_CACHE_SIZE = 65536
+
+
 def bool_mapping(s: str):
     """
     Maps the string respresentations of boolean values to natural language equivalents.
@@ -46,36 +64,46 @@ def parse_text(text: str):
     Returns:
         Set of tokens.
     """
-    pattern = r"""
-        \d+\.?\d*[a-zA-Z%℃°\u4e00-\u9fff]+      # number+unit
-        |
-        [a-zA-Z][a-zA-Z0-9_\-]*                  # English words
-        |
-        \d+\.?\d*                                # standalone numbers
-        |
-        \p{Han}                                  # Chinese characters
-    """
-    
-    tokens = regex.findall(pattern, text, regex.VERBOSE)
-    return set(tokens)
+    return set(TOKEN_PATTERN.findall(text))
 
-def f1_score(model_response: str, ground_truth: str):
+def response_tokens(model_response: str):
     """
-    Calculate F1 score between model response and ground truth.
+    Token set of a model response, after boolean mapping.
 
     Args:
         model_response (str): Model's output string.
+
+    Returns:
+        Set of tokens.
+    """
+    return parse_text(bool_mapping(model_response))
+
+@lru_cache(maxsize=GROUND_TRUTH_CACHE_SIZE)
+def ground_truth_tokens(ground_truth: str):
+    """
+    Token set of a ground truth answer, after boolean mapping.
+
+    Ground truths repeat for every rollout of the same task, so the result is cached.
+
+    Args:
         ground_truth (str): Ground truth string.
 
     Returns:
-        float: F1 score between 0 and 1.
+        Frozen set of tokens.
     """
-    model_response = bool_mapping(model_response)
-    ground_truth = bool_mapping(ground_truth)
+    return frozenset(parse_text(bool_mapping(ground_truth)))
 
-    pred_tokens = parse_text(model_response)
-    gt_tokens = parse_text(ground_truth)
+def f1_score_tokens(pred_tokens, gt_tokens):
+    """
+    Calculate F1 score between two token sets.
+
+    Args:
+        pred_tokens: Tokens of the model response.
+        gt_tokens: Tokens of the ground truth.
 
+    Returns:
+        float: F1 score between 0 and 1.
+    """
     if not gt_tokens or not pred_tokens:
         return 0
 
@@ -86,7 +114,23 @@ def f1_score(model_response: str, ground_truth: str):
     f1 = 0
     if precision + recall > 0:
         f1 = 2 * (precision * recall) / (precision + recall)
-    print(f"Grount Truth : {ground_truth}")
-    print(f"Model Response : {model_response}")
-    print(f"F1_score : {f1:.2f}")
+    return f1
+
+def f1_score(model_response: str, ground_truth: str, verbose: bool = False):
+    """
+    Calculate F1 score between model response and ground truth.
+
+    Args:
+        model_response (str): Model's output string.
+        ground_truth (str): Ground truth string.
+        verbose (bool): Whether to print the compared strings and the score.
+
+    Returns:
+        float: F1 score between 0 and 1.
+    """
+    f1 = f1_score_tokens(response_tokens(model_response), ground_truth_tokens(ground_truth))
+    if verbose:
+        print(f"Grount Truth : {bool_mapping(ground_truth)}")
+        print(f"Model Response : {bool_mapping(model_response)}")
+        print(f"F1_score : {f1:.2f}")
     return f1
\ No newline at end of file
@@ -14,9 +14,12 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
+import asyncio
 import random
 import traceback
 import time
+import weakref
+import aiohttp
 import requests
 from typing import Any
 
@@ -24,12 +27,25 @@ from rllm.environments.base.base_env import BaseEnv
 from rllm.rewards import RewardFunction, zero_reward
 
 from examples.agents.websearcher.rewards.reward_config import WebSearcherRewardStage
+from examples.rllm.utils.tracing import get_tracer, SPAN_REWARD, SPAN_TOOL_HTTP
 
 
 class WebSearcherEnvironment(BaseEnv):
     """
     Environment for the WebSearcher agent to perform web searches and interact with web content.
+
+    Besides the blocking step/reset, the environment offers async_step/async_reset, which issue
+    search requests through an aiohttp session shared by all environments on the same event loop.
     """
+    # Maximum number of concurrent connections of the shared async HTTP session
+    ASYNC_HTTP_POOL_SIZE = 1024
+    # Shared async HTTP session per event loop, a session cannot be used across loops
+    _async_sessions = weakref.WeakKeyDictionary()
+    # Tool name -> (blocking handler, async handler) method names
+    TOOL_HANDLERS = {
+        "search": ("_execute_search_tool", "_async_execute_search_tool"),
+    }
+
     def __init__(
             self,
             task: dict | None = None,
@@ -71,6 +87,7 @@ class WebSearcherEnvironment(BaseEnv):
 
         if self.search_mode == "local":
             self.search_function = self._local_search
+            self.async_search_function = self._async_local_search
         else:
             raise ValueError(f"search tool currently only supports local mode, got unsupported search_mode: {self.search_mode}")
 
@@ -111,6 +128,100 @@ class WebSearcherEnvironment(BaseEnv):
             done (bool): Whether the episode has ended.
             info (dict): Additional information about the step.
         """
+        step_result, format_reward = self._begin_step(action)
+        if step_result is not None:
+            return step_result
+
+        tool_output = self._execute_tool_call(action)
+        return self._finish_step(action, tool_output, format_reward)
+
+    async def async_step(self, action: dict) -> tuple[dict, float, bool, dict]:
+        """
+        Asynchronous version of step, the tool call does not block the event loop.
+
+        Args:
+            action (dict): The action taken by the agent, see step.
+
+        Returns:
+            tuple: (observation, reward, done, info), see step.
+        """
+        step_result, format_reward = self._begin_step(action)
+        if step_result is not None:
+            return step_result
+
+        tool_output = await self._async_execute_tool_call(action)
+        return self._finish_step(action, tool_output, format_reward)
+
+    def reset(self) -> dict:
+        """
+        Reset the environment to its initial state.
+
+        Returns:
+            task (dict): The initial task configuration.
+            initial_observation (dict): The initial observation of the environment.
+        """
+        self.step_count = 0
+        return self.task, {}
+
+    def set_task(self, task: dict | None, max_steps: int | None = None) -> None:
+        """
+        Assign a new task, so that the environment instance can be reused for another episode.
+
+        Args:
+            task (dict | None): The new task configuration.
+            max_steps (int | None): The new maximum number of steps, unchanged if None.
+        """
+        if task is not None and not isinstance(task, dict):
+            raise TypeError("task must be a dictionary or None.")
+        if max_steps is not None and (not isinstance(max_steps, int) or max_steps <= 0):
+            raise ValueError("max_steps must be a positive integer.")
+
+        self.task = task
+        if max_steps is not None:
+            self.max_steps = max_steps
+        self.step_count = 0
+
+    async def async_reset(self) -> dict:
+        """
+        Asynchronous version of reset.
+
+        Returns:
+            tuple: (task, initial_observation), see reset.
+        """
+        return self.reset()
+
+    @classmethod
+    async def close_async_session(cls) -> None:
+        """Close the shared async HTTP session of the running event loop, if any."""
+        session = cls._async_sessions.pop(asyncio.get_running_loop(), None)
+        if session is not None and not session.closed:
+            await session.close()
+
+    @classmethod
+    def _get_async_session(cls) -> aiohttp.ClientSession:
+        """Return the async HTTP session shared by all environments on the running event loop."""
+        loop = asyncio.get_running_loop()
+        session = cls._async_sessions.get(loop)
+        if session is None or session.closed:
+            session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=cls.ASYNC_HTTP_POOL_SIZE),
+                timeout=aiohttp.ClientTimeout(total=6000),
+            )
+            cls._async_sessions[loop] = session
+        return session
+
+    def _begin_step(self, action: dict) -> tuple[tuple | None, float]:
+        """
+        Validate the action and handle the steps that need no tool call.
+
+        Args:
+            action (dict): The action taken by the agent.
+
+        Returns:
+            step_result (tuple | None): The complete step result when the episode ends or the tool call
+                format is invalid, None when the tool call has to be executed.
+            format_reward (float): The reward for the tool call format.
+        """
         if not action or not isinstance(action, dict):
             raise TypeError("action must be a non-empty dictionary.")
 
@@ -122,28 +233,19 @@ class WebSearcherEnvironment(BaseEnv):
         if done:
             llm_response = action.get("function").get("arguments").get("response", "")
             reward, metadata = self._calculate_reward(llm_response, WebSearcherRewardStage.DONE)
-            return {}, reward, done, self._build_info(action, metadata)
+            return ({}, reward, done, self._build_info(action, metadata)), 0.0
 
         format_reward, format_metadata = self._calculate_reward(action, WebSearcherRewardStage.TOOLS_FORMAT)
         if format_reward < 0:
             next_obs = {"tool_output": {action['id']: format_metadata["reward_obs"]}}
-            return next_obs, format_reward, done, self._build_info(action, format_metadata)
-        
-        tool_output = self._execute_tool_call(action)
+            return (next_obs, format_reward, done, self._build_info(action, format_metadata)), format_reward
+        return None, format_reward
+
+    def _finish_step(self, action: dict, tool_output: dict, format_reward: float) -> tuple[dict, float, bool, dict]:
+        """Build the step result from the output of an executed tool call."""
         next_obs = {"tool_output": tool_output}
         exec_reward, exec_metadata = self._calculate_reward(next_obs, WebSearcherRewardStage.TOOLS_RETURN)
-        return next_obs, exec_reward + format_reward, done, self._build_info(action, exec_metadata)
-
-    def reset(self) -> dict:
-        """
-        Reset the environment to its initial state.
-
-        Returns:
-            task (dict): The initial task configuration.
-            initial_observation (dict): The initial observation of the environment.
-        """
-        self.step_count = 0
-        return self.task, {}
+        return next_obs, exec_reward + format_reward, False, self._build_info(action, exec_metadata)
     
     def _execute_tool_call(self, action: dict) -> dict:
         """
@@ -158,27 +260,58 @@ class WebSearcherEnvironment(BaseEnv):
             tool_output (dict): The output from executing the tool call, keyed by tool call ID, value being 
                                 a string representation of the tool output.
         """
-        tool_output: dict[str, str] = {}
-        TOOL_HANDLERS = {
-            "search": "_execute_search_tool"
-        }
-
         try:
             tool_name = action["function"]["name"]
-            tool_args = action["function"]["arguments"]
+            result, success = self._get_tool_handler(tool_name)(action["function"]["arguments"])
+            obs = self._tool_observation(tool_name, result, success)
+        except Exception as e:
+            obs = self._tool_error_observation(action, e)
+        return {action['id']: self._format_tool_output(obs)}
+
+    async def _async_execute_tool_call(self, action: dict) -> dict:
+        """
+        Asynchronous version of _execute_tool_call.
+
+        Args:
+            action (dict): A dictionary containing the tool call invocation details to execute.
 
-            handler = getattr(self, TOOL_HANDLERS.get(tool_name, "_default_handler"))
-            result, success = handler(tool_args)
-            obs = {"tool_result": result, "tool_name": tool_name} if success else {"": result.strip(), "tool_name": tool_name}
-        except ValueError:
-            obs = {"": action["function"]}
+        Returns:
+            tool_output (dict): The output from executing the tool call, keyed by tool call ID.
+        """
+        try:
+            tool_name = action["function"]["name"]
+            result, success = await self._get_tool_handler(tool_name, is_async=True)(action["function"]["arguments"])
+            obs = self._tool_observation(tool_name, result, success)
         except Exception as e:
-            traceback.print_exc()
-            obs = {"": f"Error executing tool {tool_name}: {str(e)}"}
+            obs = self._tool_error_observation(action, e)
+        return {action['id']: self._format_tool_output(obs)}
 
-        output_str = self._format_tool_output(obs)
-        tool_output[action['id']] = output_str
-        return tool_output
+    def _get_tool_handler(self, tool_name: str, is_async: bool = False):
+        """
+        Return the handler of a tool, the coroutine function one when is_async is set.
+
+        Unsupported tools get _default_handler, which raises as soon as it is called.
+        """
+        handler_names = self.TOOL_HANDLERS.get(tool_name)
+        if handler_names is None:
+            return self._default_handler
+        return getattr(self, handler_names[is_async])
+
+    @staticmethod
+    def _tool_observation(tool_name: str, result: str, success: bool) -> dict:
+        """Build the observation of an executed tool call."""
+        if success:
+            return {"tool_result": result, "tool_name": tool_name}
+        return {"": result.strip(), "tool_name": tool_name}
+
+    @staticmethod
+    def _tool_error_observation(action: dict, error: Exception) -> dict:
+        """Build the observation of a tool call that raised, must be called while handling the error."""
+        if isinstance(error, ValueError):
+            return {"": action["function"]}
+        traceback.print_exc()
+        tool_name = (action.get("function") or {}).get("name", "")
+        return {"": f"Error executing tool {tool_name}: {str(error)}"}
     
     def _execute_search_tool(self, tool_args: dict) -> tuple[str, bool]:
         """
@@ -193,14 +326,40 @@ class WebSearcherEnvironment(BaseEnv):
             success (bool): Whether the search was successful.
         """
         try:
-            query = tool_args['query']
-            if not isinstance(query, list) or not query:
-                raise ValueError("Invalid search query provided: query is not a list or query is empty")
-            search_result = self.search_function(query)
-            result = self._format_tool_output(search_result)
-            return result, True
+            search_result = self.search_function(self._get_search_query(tool_args))
+            return self._format_tool_output(search_result), True
         except Exception as e:
             return f"Search tool execution failed: {str(e)}", False
+
+    async def _async_execute_search_tool(self, tool_args: dict) -> tuple[str, bool]:
+        """
+        Asynchronous version of _execute_search_tool.
+
+        Args:
+            tool_args (dict): The search tool arguments, see _execute_search_tool.
+
+        Returns:
+            result (str): The search results as a string.
+            success (bool): Whether the search was successful.
+        """
+        try:
+            search_result = await self.async_search_function(self._get_search_query(tool_args))
+            return self._format_tool_output(search_result), True
+        except Exception as e:
+            return f"Search tool execution failed: {str(e)}", False
+
+    @staticmethod
+    def _get_search_query(tool_args: dict) -> list[str]:
+        """
+        Return the validated query list of a search tool call.
+
+        Raises:
+            ValueError: If the query is not a non-empty list.
+        """
+        query = tool_args['query']
+        if not isinstance(query, list) or not query:
+            raise ValueError("Invalid search query provided: query is not a list or query is empty")
+        return query
         
     def _local_search(self, queries: list[str]) -> dict:
         """
@@ -213,21 +372,52 @@ class WebSearcherEnvironment(BaseEnv):
             dict: The search results returned from the local search service.
         """
         try:
-            payload = {
-                "queries": queries,
-                "topk": 3,
-                "return_scores": True
-            }
-            response = self._retry_request(f"{self.search_url}retrieve", payload)
-            content = self._format_search_response(queries, response["result"])
-            return {"tool_output": content, "query": queries}
+            with get_tracer().span(SPAN_TOOL_HTTP, queries=len(queries)):
+                response = self._retry_request(f"{self.search_url}retrieve", self._search_payload(queries))
+            return self._search_output(queries, response)
         except Exception as e:
-            print(f"Local search failed: {str(e)}")
-            return {
-                "tool_output": "",
-                "query": queries,
-                "error_output": f"ERROR: Local search failed: {str(e)}"
-            }
+            return self._search_error_output(queries, e)
+
+    async def _async_local_search(self, queries: list[str]) -> dict:
+        """
+        Asynchronous version of _local_search, using the shared async HTTP session.
+
+        Args:
+            queries (list[str]): A list of search query strings.
+
+        Returns:
+            dict: The search results returned from the local search service.
+        """
+        try:
+            with get_tracer().span(SPAN_TOOL_HTTP, queries=len(queries)):
+                response = await self._async_retry_request(f"{self.search_url}retrieve", self._search_payload(queries))
+            return self._search_output(queries, response)
+        except Exception as e:
+            return self._search_error_output(queries, e)
+
+    @staticmethod
+    def _search_payload(queries: list[str]) -> dict:
+        """Build the request payload of the local search service."""
+        return {
+            "queries": queries,
+            "topk": 3,
+            "return_scores": True
+        }
+
+    def _search_output(self, queries: list[str], response: dict) -> dict:
+        """Build the search result from the response of the local search service."""
+        content = self._format_search_response(queries, response["result"])
+        return {"tool_output": content, "query": queries}
+
+    @staticmethod
+    def _search_error_output(queries: list[str], error: Exception) -> dict:
+        """Build the search result of a failed local search."""
+        print(f"Local search failed: {str(error)}")
+        return {
+            "tool_output": "",
+            "query": queries,
+            "error_output": f"ERROR: Local search failed: {str(error)}"
+        }
         
     def _retry_request(self, url, payload, max_retries=5, delay=1):
         """
@@ -252,23 +442,86 @@ class WebSearcherEnvironment(BaseEnv):
                 response = response.json()
                 if response:
                     return response
-                
-                print(f"Empty response received (attempt {attempt + 1}/{max_retries}). Retrying...")
-            
-            except requests.RequestException as e:
-                print(f"Request failed (attempt {attempt + 1}/{max_retries}): {e}, payload:{str(payload)}")
-            except ValueError as e:
-                print(f"Failed to parse JSON response (attempt {attempt + 1}/{max_retries}): {e}")
+                self._log_request_failure(attempt, max_retries, payload)
+            except Exception as e:
+                self._log_request_failure(attempt, max_retries, payload, e)
+            time.sleep(self._retry_delay(url, attempt, max_retries, delay))
+
+        raise Exception(f"All {max_retries} attempts to contact {url} have failed.")
+
+    async def _async_retry_request(self, url, payload, max_retries=5, delay=1):
+        """
+        Asynchronous version of _retry_request, waiting between retries without blocking the event loop.
+
+        Args:
+            url (str): The URL to send the POST request to.
+            payload (dict): The JSON payload to include in the POST request.
+            max_retries (int): Maximum number of retries for the request.
+            delay (int): Delay in seconds between retries.
+
+        Returns:
+            dict: The JSON response from the server.
+
+        Raises:
+            Exception: If all retry attempts fail.
+        """
+        session = self._get_async_session()
+        for attempt in range(max_retries):
+            try:
+                async with session.post(url, json=payload) as response:
+                    response.raise_for_status()
+                    response = await response.json()
+                if response:
+                    return response
+                self._log_request_failure(attempt, max_retries, payload)
             except Exception as e:
-                print(f"Unexpected error (attempt {attempt + 1}/{max_retries}): {e}")
-            if attempt == max_retries - 1:
-                raise Exception(f"All {max_retries} attempts to contact {url} have failed.")
-            
-            sleep_for = delay * (2 ** (attempt - 1)) + random.uniform(0, 0.5)
-            time.sleep(sleep_for)
-            
+                self._log_request_failure(attempt, max_retries, payload, e)
+            await asyncio.sleep(self._retry_delay(url, attempt, max_retries, delay))
+
         raise Exception(f"All {max_retries} attempts to contact {url} have failed.")
 
+    @staticmethod
+    def _retry_delay(url: str, attempt: int, max_retries: int, delay: float) -> float:
+        """
+        Return the wait before the next request attempt, shared by the blocking and async requests.
+
+        Args:
+            url (str): The URL of the request.
+            attempt (int): Index of the attempt that just failed, starting at 0.
+            max_retries (int): Maximum number of attempts.
+            delay (float): Base delay in seconds, doubled after each attempt.
+
+        Returns:
+            float: Seconds to wait before the next attempt, with random jitter.
+
+        Raises:
+            Exception: If the failed attempt was the last one.
+        """
+        if attempt >= max_retries - 1:
+            raise Exception(f"All {max_retries} attempts to contact {url} have failed.")
+        return delay * (2 ** (attempt - 1)) + random.uniform(0, 0.5)
+
+    @staticmethod
+    def _log_request_failure(attempt: int, max_retries: int, payload: dict, error: Exception | None = None) -> None:
+        """
+        Print a failed request attempt, an empty response when error is None.
+
+        Args:
+            attempt (int): Index of the failed attempt, starting at 0.
+            max_retries (int): Maximum number of attempts.
+            payload (dict): The JSON payload of the request.
+            error (Exception | None): Exception raised by the request.
+        """
+        progress = f"attempt {attempt + 1}/{max_retries}"
+        if error is None:
+            print(f"Empty response received ({progress}). Retrying...")
+        elif isinstance(error, (requests.RequestException, aiohttp.ClientError, asyncio.TimeoutError)):
+            print(f"Request failed ({progress}): {error}, payload:{str(payload)}")
+        elif isinstance(error, ValueError):
+            print(f"Failed to parse JSON response ({progress}): {error}")
+        else:
+            print(f"Unexpected error ({progress}): {error}")
+
     def _format_search_response(self, queries: list[str], results: list[list[dict]]) -> str:
         """
         Format the search response into a readable string.
@@ -329,11 +582,12 @@ class WebSearcherEnvironment(BaseEnv):
             reward (float): The calculated reward.
             metadata (dict): Additional metadata related to the reward calculation.
         """
-        reward_output = self.reward_fn(
-            eval_data=data,
-            stage=stage,
-            task_info=self.task or {}
-        )
+        with get_tracer().span(SPAN_REWARD, stage=str(stage)):
+            reward_output = self.reward_fn(
+                eval_data=data,
+                stage=stage,
+                task_info=self.task or {}
+            )
         return reward_output.reward, reward_output.metadata
     
     def _build_info(self, action: dict, metadata: dict) -> dict:
@@ -40,6 +40,9 @@ from rllm.environments.env_utils import compute_mc_return
 from agentic_rl import BaseEngineWrapper, Trajectory as AgenticRlTrajectory
 from examples.agents.agents_mapping import get_agent_by_name
 from examples.rllm.utils.utils import compute_trajectory_reward
+from examples.rllm.utils.tracing import (
+    current_trajectory, get_tracer, SPAN_ENV, SPAN_LLM, SPAN_PACK, SPAN_REWARD, SPAN_TOKENIZE
+)
 
 
 logger = logging.getLogger(__name__)
@@ -149,6 +152,9 @@ class LangGraphEngineWrapper(BaseEngineWrapper):
         """
         agent = self.agents[idx]
         env = self.envs[idx]
+        # Spans recorded by the graph nodes and tools of this trajectory belong to it
+        current_trajectory.set(idx)
+        tracer = get_tracer()
         termination_reason = None
         done = False
         response_token_len = 0
@@ -161,8 +167,12 @@ class LangGraphEngineWrapper(BaseEngineWrapper):
         env_time = 0.0
         reward = 0.0
 
-        loop = asyncio.get_event_loop()
-        observation, info = await loop.run_in_executor(self.executor, env.reset)
+        with tracer.span(SPAN_ENV, op="reset"):
+            if hasattr(env, "async_reset"):
+                observation, info = await env.async_reset()
+            else:
+                loop = asyncio.get_event_loop()
+                observation, info = await loop.run_in_executor(self.executor, env.reset)
         info["max_steps"] = self.max_steps
 
         agent.reset()
@@ -174,13 +184,14 @@ class LangGraphEngineWrapper(BaseEngineWrapper):
         )
 
         messages = agent.chat_completions
-        prompt_tokens, _ = convert_messages_to_tokens_and_masks(
-            messages,
-            tokenizer=self.tokenizer,
-            parser=self.chat_parser,
-            contains_first_msg=True,
-            contains_generation_msg=True,
-        )
+        with tracer.span(SPAN_TOKENIZE):
+            prompt_tokens, _ = convert_messages_to_tokens_and_masks(
+                messages,
+                tokenizer=self.tokenizer,
+                parser=self.chat_parser,
+                contains_first_msg=True,
+                contains_generation_msg=True,
+            )
         prompt_token_len = len(prompt_tokens)
 
         if prompt_token_len > self.max_prompt_length:
@@ -236,25 +247,26 @@ class LangGraphEngineWrapper(BaseEngineWrapper):
             assistant_msg_tokens, assistant_msg_masks = [], []
             env_msg_tokens, env_msg_masks = [], []
 
-            if assistant_message:
-                assistant_msg_tokens, assistant_msg_masks = (
-                    convert_messages_to_tokens_and_masks(
-                        [assistant_message],
+            with tracer.span(SPAN_TOKENIZE, step=env.step_count):
+                if assistant_message:
+                    assistant_msg_tokens, assistant_msg_masks = (
+                        convert_messages_to_tokens_and_masks(
+                            [assistant_message],
+                            tokenizer=self.tokenizer,
+                            parser=self.chat_parser,
+                            contains_first_msg=False,
+                            contains_generation_msg=False,
+                        )
+                    )
+
+                if env_messages:
+                    env_msg_tokens, env_msg_masks = convert_messages_to_tokens_and_masks(
+                        env_messages,
                         tokenizer=self.tokenizer,
                         parser=self.chat_parser,
                         contains_first_msg=False,
-                        contains_generation_msg=False,
+                        contains_generation_msg=True,
                     )
-                )
-
-            if env_messages:
-                env_msg_tokens, env_msg_masks = convert_messages_to_tokens_and_masks(
-                    env_messages,
-                    tokenizer=self.tokenizer,
-                    parser=self.chat_parser,
-                    contains_first_msg=False,
-                    contains_generation_msg=True,
-                )
 
             response_token_len += len(assistant_msg_tokens) + len(env_msg_tokens)
 
@@ -304,28 +316,30 @@ class LangGraphEngineWrapper(BaseEngineWrapper):
                 break
 
         trajectory: Trajectory = agent.trajectory
-        compute_trajectory_reward(trajectory)
-        compute_mc_return(trajectory, gamma=0.2)
+        with tracer.span(SPAN_REWARD):
+            compute_trajectory_reward(trajectory)
+            compute_mc_return(trajectory, gamma=0.2)
         print(
             f"{GREEN}Trajectory {idx} completed due to: {termination_reason}. Reward is {trajectory.reward}. \n{RESET}"
         )
-        token_result = {
-            "prompt_tokens": torch.tensor(prompt_tokens, dtype=torch.long),
-            "response_tokens": torch.tensor(response_tokens, dtype=torch.long),
-            "response_masks": torch.tensor(response_masks, dtype=torch.long),
-            "trajectory_reward": trajectory.reward,
-            "idx": env.idx,
-            "chat_completions": agent.chat_completions,
-            "metrics": {
-                "steps": len(trajectory.steps),
-                "reward_time": reward_time,
-                "env_time": env_time,
-                "llm_time": llm_time,
-                "total_time": total_time,
-                "res_reward": trajectory.res_reward,
-                "toolcall_reward": trajectory.toolcall_reward,
-            },
-        }
+        with tracer.span(SPAN_PACK):
+            token_result = {
+                "prompt_tokens": torch.tensor(prompt_tokens, dtype=torch.long),
+                "response_tokens": torch.tensor(response_tokens, dtype=torch.long),
+                "response_masks": torch.tensor(response_masks, dtype=torch.long),
+                "trajectory_reward": trajectory.reward,
+                "idx": env.idx,
+                "chat_completions": agent.chat_completions,
+                "metrics": {
+                    "steps": len(trajectory.steps),
+                    "reward_time": reward_time,
+                    "env_time": env_time,
+                    "llm_time": llm_time,
+                    "total_time": total_time,
+                    "res_reward": trajectory.res_reward,
+                    "toolcall_reward": trajectory.toolcall_reward,
+                },
+            }
 
         return token_result
 
@@ -373,7 +387,8 @@ class LangGraphEngineWrapper(BaseEngineWrapper):
                     env = state["env"]
                     prompt_messages = agent.chat_completions.copy()
                     start_time = time.time()
-                    response = await llm_model.ainvoke(prompt_messages)
+                    with get_tracer().span(SPAN_LLM, step=env.step_count):
+                        response = await llm_model.ainvoke(prompt_messages)
                     state["llm_time"] = time.time() - start_time
                     try:
                         tool_call = agent.tool_parser.parse(response.content)
@@ -424,17 +439,22 @@ class LangGraphEngineWrapper(BaseEngineWrapper):
 
                 async def wrapped_node(state: Dict[str, Any]) -> Dict[str, Any]:
                     start_time = time.time()
+                    # ToolNode runs all tool calls of the assistant turn concurrently on the
+                    # event loop, the search tool provides a coroutine so no thread is used
                     result = await tool_node.ainvoke(state)
                     state.update(result)
                     env = state["env"]
+                    tool_contents = {
+                        message.tool_call_id: message.content
+                        for message in state["messages"]
+                        if isinstance(message, ToolMessage)
+                    }
                     (
                         state["observation"],
                         state["reward"],
                         state["done"],
                         state["info"],
-                    ) = env.calculate_tool_reward(
-                        state["messages"][0].content, state["tool_calls"]
-                    )
+                    ) = env.calculate_tool_reward(tool_contents, state["tool_calls"])
                     state["env_delta_time"] = time.time() - start_time
                     return state
 
@@ -476,6 +496,13 @@ class LangGraphEngineWrapper(BaseEngineWrapper):
         result = asyncio.run(self._generate_agent_trajectories_async(tasks))
         return result
 
+    async def _close_async_clients(self):
+        """Closes the shared async HTTP clients of the environments before the event loop ends."""
+        for close_name in ("close_async_client", "close_async_session"):
+            close = getattr(self.env_class, close_name, None)
+            if close is not None:
+                await close()
+
     async def _generate_agent_trajectories_async(self, tasks: List[dict]):
         """Internal method to generate trajectories asynchronously using asyncio.
 
@@ -500,18 +527,24 @@ class LangGraphEngineWrapper(BaseEngineWrapper):
         tasks_to_run = [launch_one_trajectory_task(i) for i in range(len(self.envs))]
 
         tasks_completed = 0
-        for future in asyncio.as_completed(tasks_to_run):
-            try:
-                result = await future
-                tasks_completed += 1
-                print(
-                    f"{GREEN}Number of Trajectories {tasks_completed}/{len(self.envs)} completed"
-                )
-                trajectories.append(AgenticRlTrajectory(**result))
-            except Exception as e:
-                logger.error(
-                    f"Trajectory generation failed. {tasks_completed} trajectories have been generated now."
-                )
-                raise e
+        try:
+            for future in asyncio.as_completed(tasks_to_run):
+                try:
+                    result = await future
+                    tasks_completed += 1
+                    print(
+                        f"{GREEN}Number of Trajectories {tasks_completed}/{len(self.envs)} completed"
+                    )
+                    with get_tracer().span(SPAN_PACK, trajectory=result.get("idx")):
+                        trajectories.append(AgenticRlTrajectory(**result))
+                except Exception as e:
+                    logger.error(
+                        f"Trajectory generation failed. {tasks_completed} trajectories have been generated now."
+                    )
+                    raise e
+        finally:
+            await self._close_async_clients()
+            # Export the spans of the batch when tracing is enabled
+            get_tracer().dump("langgraph")
 
         return trajectories
@@ -15,10 +15,19 @@ limitations under the License.
 """
 
 import asyncio
+import bisect
+import multiprocessing
+import os
 import queue
 import re
-from threading import Thread
-from typing import List, Any, Dict
+import sys
+import time
+import threading
+import traceback
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from threading import Lock, Thread
+from typing import List, Any, Dict, Iterator, Tuple
 
 import torch
 from are.simulation.agents.agent_builder import AgentBuilder
@@ -41,8 +50,97 @@ from are.simulation.validation import GraphPerEventJudgeConfig
 from agentic_rl import BaseEngineWrapper
 from agentic_rl.runner import Trajectory
 
+# The wrapper is loaded by file path (agent_engine_wrapper_path), make the AgentSDK examples importable
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from examples.rllm.utils.tracing import (
+    current_trajectory, get_tracer, SPAN_ENV, SPAN_LLM, SPAN_PACK, SPAN_QUEUE, SPAN_REWARD, SPAN_TOKENIZE
+)
+
 DEFAULT_STEP_2_MESSAGE["llm_output"] = "{content}"
 MAX_SCENARIO_DURATION = 1800
+# Number of worker processes running scenarios, 0 runs them on threads of the calling process
+DEFAULT_NUM_PROCESSES = int(os.getenv("ARE_ENGINE_NUM_PROCESSES", "0"))
+
+
+class _EventLoopThread:
+    """
+    Long-lived event loop running in a daemon thread.
+
+    Meta-are calls the LLM engines synchronously from many threads. Their completion coroutines are all
+    submitted to this one loop instead of creating and tearing down a new loop per call with asyncio.run.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = Thread(target=self.loop.run_forever, name="are-completion-loop", daemon=True)
+        self._thread.start()
+
+    def run(self, coro):
+        """Run a coroutine on the loop and block the calling thread until its result."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def stop(self):
+        """Stop the loop and wait for its thread to exit."""
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+
+_loop_thread = None
+_loop_thread_pid = None
+_loop_thread_lock = Lock()
+
+
+def _run_completion(coro):
+    """
+    Run a completion coroutine on the event loop of the current process.
+
+    The loop is created on first use and again after a fork, since the loop thread does not survive it.
+    """
+    global _loop_thread, _loop_thread_pid
+    if _loop_thread is None or _loop_thread_pid != os.getpid():
+        with _loop_thread_lock:
+            if _loop_thread is None or _loop_thread_pid != os.getpid():
+                _loop_thread = _EventLoopThread()
+                _loop_thread_pid = os.getpid()
+    return _loop_thread.run(coro)
+
+
+def _stop_completion_loop():
+    """Stop the completion loop thread of the current process, it is created again on next use."""
+    global _loop_thread, _loop_thread_pid
+    with _loop_thread_lock:
+        if _loop_thread is not None and _loop_thread_pid == os.getpid():
+            _loop_thread.stop()
+        _loop_thread = None
+        _loop_thread_pid = None
+
+
+# State of a scenario worker process, inherited from the parent process when the pool forks
+_process_wrapper = None
+_process_completions = None
+
+
+def _init_process_worker(wrapper, completions):
+    global _process_wrapper, _process_completions
+    _process_wrapper = wrapper
+    _process_completions = completions
+    # Spans recorded by the parent before the fork are exported by the parent
+    get_tracer().drain()
+
+
+def _run_in_process_worker(task, idx, completion_idx, submitted):
+    """
+    Run one scenario in a worker process, the trajectory and the spans recorded for it are pickled back to
+    the parent. submitted is the time.perf_counter() of the submission, which is system-wide on Linux.
+    """
+    tracer = get_tracer()
+    tracer.add_span(SPAN_QUEUE, submitted, time.perf_counter(), trajectory=idx)
+    try:
+        trajectory = _process_wrapper.run(task, idx, _process_completions[completion_idx])
+    finally:
+        events = tracer.drain()
+    return trajectory, events
 
 
 def extract_action(self, llm_output: str, split_token: str) -> AgentAction:
@@ -131,7 +229,9 @@ class _AgentSDKLLMEngine(LLMEngine):
         Args:
             completion: The inference interface provided by AgentSDK.
             tokenizer: Tokenizer will be used to format message from ARE.
-            trajectory_store: History chat messages will be store in trajectory_store.
+            trajectory_store: Every successful step is stored in trajectory_store as a dict with the chat messages
+                including the response ("messages"), the rendered prompt ("prompt") and its token count
+                ("prompt_tokens").
             sampling_params: GRPO algorithm need sample trajectory for better performance.
             max_model_len: Calculate tokens to prevent over lengths.
         """
@@ -160,17 +260,20 @@ class _AgentSDKLLMEngine(LLMEngine):
         """
 
         messages = _transform_messages(messages)
+        tracer = get_tracer()
 
-        prompt = self.tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+        with tracer.span(SPAN_TOKENIZE):
+            prompt = self.tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
 
-        tokens = len(self.tokenizer.encode(prompt))
+            tokens = len(self.tokenizer.encode(prompt))
 
         if tokens >= self.max_model_len:
             raise ValueError(f"Prompt token is {tokens}, exceed max_model_len: {self.max_model_len}")
 
         self.sampling_params["max_tokens"] = self.max_model_len - tokens
 
-        response = asyncio.run(self.completion({"prompt": prompt, **self.sampling_params}))
+        with tracer.span(SPAN_LLM, prompt_tokens=tokens):
+            response = _run_completion(self.completion({"prompt": prompt, **self.sampling_params}))
 
         choices = response.get("choices", [])
         if not choices:
@@ -180,7 +283,8 @@ class _AgentSDKLLMEngine(LLMEngine):
         text = choice.get("text", "")
 
         messages.append({"role": "assistant", "content": text})
-        self.trajectory_store.append(messages)
+        # Keep the prompt and its token count, so the trajectory length can be computed without re-encoding it
+        self.trajectory_store.append({"messages": messages, "prompt": prompt, "prompt_tokens": tokens})
 
         return text, None
 
@@ -219,7 +323,8 @@ class _JudgeLLMEngine(LLMEngine):
 
         prompt = self.tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
 
-        response = asyncio.run(self.completion({"prompt": prompt, **self.sampling_params}))
+        with get_tracer().span(SPAN_LLM, judge=True):
+            response = _run_completion(self.completion({"prompt": prompt, **self.sampling_params}))
 
         choices = response.get("choices", [])
         if not choices:
@@ -245,7 +350,8 @@ class AreEngineWrapper(BaseEngineWrapper):
                  max_prompt_length: int,
                  max_response_length: int,
                  n_parallel_agents: int = 8,
-                 max_steps: int = 10):
+                 max_steps: int = 10,
+                 num_processes: int = DEFAULT_NUM_PROCESSES):
         """
         Initialization.
 
@@ -257,12 +363,23 @@ class AreEngineWrapper(BaseEngineWrapper):
             max_response_length: Max response token length set by AgentSDK.
             n_parallel_agents: How many agents will be running at same time.
             max_steps: How many rounds of chat will be performed during one trajectory.
+            num_processes: Number of worker processes running scenarios, the simulation is CPU-bound Python
+                and threads are serialized by the GIL. 0 runs scenarios on n_parallel_agents threads of the
+                calling process. Defaults to the ARE_ENGINE_NUM_PROCESSES environment variable. The workers
+                are forked on the first batch, see _get_process_pool for the constraints this puts on other
+                threads of the calling process.
         """
 
         super().__init__(agent_name, tokenizer, sampling_params,
                          max_prompt_length, max_response_length, n_parallel_agents, max_steps)
 
+        if not isinstance(num_processes, int) or num_processes < 0:
+            raise ValueError(f"num_processes must be a non-negative integer, got {num_processes}")
+
         self.max_model_len = max_prompt_length + max_response_length
+        self.num_processes = num_processes
+        self._process_pool = None
+        self._process_pool_completions = None
 
     def initialize(self):
         """
@@ -283,7 +400,7 @@ class AreEngineWrapper(BaseEngineWrapper):
         """
         return self.tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=add_generation_prompt)
 
-    def tokenize_and_mask(self, messages):
+    def tokenize_and_mask(self, messages, rendered: str = None):
         """
         Tokenize messages and generate mask.
 
@@ -291,21 +408,107 @@ class AreEngineWrapper(BaseEngineWrapper):
         dialogue is used as response_ids. A response_mask (value = 1) is applied only to assistant tokens so that
         only model-generated responses contribute to the loss, excluding tool call outputs.
 
+        The chat template is rendered once for the whole conversation and tokenized once; the offset mapping of
+        the tokens assigns each token to its message. Tokenizers without offset mappings, or templates that do not
+        reproduce the message contents, fall back to tokenizing every message on its own.
+
         Args:
             messages: message list.
+            rendered: The conversation already rendered with the chat template, rendered here if not given.
 
         Return:
             Tuple[torch.Tensor, torch.Tensor, torch.Tensor]: prompt_ids, response_ids and response_masks.
         """
+        try:
+            first_assistant_idx = next(i for i, msg in enumerate(messages) if msg["role"] == "assistant")
+        except StopIteration:
+            raise RuntimeError("No assistant message found in completions")
+
+        if rendered is None:
+            rendered = self._parse(messages, add_generation_prompt=False)
+        message_ends = self._message_ends(rendered, messages)
+        if message_ends is None or not getattr(self.tokenizer, "is_fast", False):
+            return self._tokenize_and_mask_per_message(messages, first_assistant_idx)
 
+        encoding = self.tokenizer(rendered, add_special_tokens=False, return_offsets_mapping=True)
         prompt_ids = []
         response_ids = []
         response_mask = []
+        last_idx = len(messages) - 1
+        for token_id, (start, _) in zip(encoding["input_ids"], encoding["offset_mapping"]):
+            # Trailing template text after the last message belongs to the last message
+            msg_idx = min(bisect.bisect_right(message_ends, start), last_idx)
+            if msg_idx < first_assistant_idx:
+                prompt_ids.append(token_id)
+            else:
+                response_ids.append(token_id)
+                response_mask.append(1 if messages[msg_idx]["role"] == "assistant" else 0)
 
-        try:
-            first_assistant_idx = next(i for i, msg in enumerate(messages) if msg["role"] == "assistant")
-        except StopIteration:
-            raise RuntimeError("No assistant message found in completions")
+        prompt_ids = torch.tensor(prompt_ids, dtype=torch.long)
+        response_ids = torch.tensor(response_ids, dtype=torch.long)
+        response_mask = torch.tensor(response_mask, dtype=torch.long)
+
+        return prompt_ids, response_ids, response_mask
+
+    def _message_ends(self, rendered: str, messages) -> List[int] | None:
+        """
+        Locate where every message ends in the rendered conversation.
+
+        A message ends after its content and the end-of-turn special token (e.g. eos) that follows it, so the
+        template markup before a message's content, e.g. its role header, belongs to that message.
+
+        Args:
+            rendered: The conversation rendered with the chat template.
+            messages: message list.
+
+        Returns:
+            List[int] | None: Exclusive end offset of every message, None if a content is not found in order.
+        """
+        # End-of-turn markers: eos and special tokens named like one, e.g. <|im_end|> or <|eot_id|>
+        special_tokens = [token for token in getattr(self.tokenizer, "all_special_tokens", [])
+                          if "end" in token or "eot" in token]
+        end_of_turn_tokens = sorted({getattr(self.tokenizer, "eos_token", None) or "", *special_tokens} - {""},
+                                    key=len, reverse=True)
+        message_ends = []
+        cursor = 0
+        for msg in messages:
+            content = msg["content"].strip() if isinstance(msg["content"], str) else ""
+            if not content:
+                # Nothing to anchor on, the markup of an empty message is attributed to the next one
+                message_ends.append(cursor)
+                continue
+
+            # The content must be followed by an end-of-turn marker (or the end of the text), so that
+            # a content equal to template markup, e.g. the role name in a header, is not matched there.
+            start = rendered.find(content, cursor)
+            while start >= 0:
+                end = start + len(content)
+                while end < len(rendered) and rendered[end].isspace():
+                    end += 1
+                end_of_turn = next((token for token in end_of_turn_tokens if rendered.startswith(token, end)), None)
+                if end_of_turn is not None or end == len(rendered):
+                    break
+                start = rendered.find(content, start + 1)
+            if start < 0:
+                return None
+            cursor = end + len(end_of_turn or "")
+            message_ends.append(cursor)
+        return message_ends
+
+    def _tokenize_and_mask_per_message(self, messages, first_assistant_idx):
+        """
+        Tokenize every message on its own, fallback of tokenize_and_mask.
+
+        Args:
+            messages: message list.
+            first_assistant_idx: Index of the first assistant message.
+
+        Return:
+            Tuple[torch.Tensor, torch.Tensor, torch.Tensor]: prompt_ids, response_ids and response_masks.
+        """
+        prompt_ids = []
+        response_ids = []
+        response_mask = []
 
         for i in range(first_assistant_idx):
             parsed_msg = self._parse([messages[i]], add_generation_prompt=False)
@@ -328,25 +531,30 @@ class AreEngineWrapper(BaseEngineWrapper):
 
         return prompt_ids, response_ids, response_mask
 
-    def worker(self, task_queue, result, completion):
+    def worker(self, task_queue, result_queue, completion):
         """
-        Worker sub process, extract task from queue and execute task.
+        Worker thread, extract task from queue and execute task.
 
         Args:
             task_queue: Queue of tasks.
-            result: Result list to store task result
+            result_queue: Queue receiving (task_id, trajectory) as tasks finish, trajectory is None on failure.
             completion: AgentSDK provided completion interface.
         """
 
         while True:
             try:
-                task_id, task = task_queue.get(timeout=10)
+                task_id, task, submitted = task_queue.get(timeout=10)
             except queue.Empty:
                 return
+            get_tracer().add_span(SPAN_QUEUE, submitted, time.perf_counter(), trajectory=task_id)
 
-            r = self.run(task, task_id, completion)
+            try:
+                r = self.run(task, task_id, completion)
+            except Exception:
+                traceback.print_exc()
+                r = None
 
-            result[task_id] = r
+            result_queue.put((task_id, r))
 
     def run(self, task, idx, completion):
         """
@@ -362,6 +570,9 @@ class AreEngineWrapper(BaseEngineWrapper):
                              "datasets_additional_keys.")
 
         scenario_task = task["data"]
+        tracer = get_tracer()
+        # Spans recorded by the LLM engines of this scenario belong to it
+        current_trajectory.set(idx)
 
         trajectory_store = []
 
@@ -379,11 +590,14 @@ class AreEngineWrapper(BaseEngineWrapper):
 
         # select the last (i.e., the longest) step trajectory that meet the length requirement as the valid trajectory
         valid_length_traj = None
-        for chat_completions in trajectory_store:
-            if len(
-                    self.tokenizer.encode(self.tokenizer.apply_chat_template(chat_completions, tokenize=False))
-            ) < self.max_model_len:
-                valid_length_traj = chat_completions
+        valid_length_rendered = None
+        with tracer.span(SPAN_TOKENIZE, op="select"):
+            for snapshot in reversed(trajectory_store):
+                length, rendered = self._snapshot_length(snapshot)
+                if length < self.max_model_len:
+                    valid_length_traj = snapshot["messages"]
+                    valid_length_rendered = rendered
+                    break
 
         if not valid_length_traj:
             raise RuntimeError("No trajectory within valid length")
@@ -407,28 +621,50 @@ class AreEngineWrapper(BaseEngineWrapper):
 
         trajectory_reward = res_reward + toolcall_reward
 
-        prompt_ids, response_ids, response_mask = self.tokenize_and_mask(valid_length_traj)
-
-        trajectory = Trajectory(
-            prompt_tokens=prompt_ids,
-            response_tokens=response_ids,
-            response_masks=response_mask,
-            idx=idx,
-            trajectory_reward=trajectory_reward,
-            chat_completions=valid_length_traj,
-            metrics={
-                "steps": assistant_cnt + 1,
-                "reward_time": None,
-                "env_time": None,
-                "llm_time": None,
-                "total_time": result.duration,
-                "res_reward": res_reward,
-                "toolcall_reward": toolcall_reward,
-            }
-        )
+        with tracer.span(SPAN_TOKENIZE, op="mask"):
+            prompt_ids, response_ids, response_mask = self.tokenize_and_mask(valid_length_traj, valid_length_rendered)
+
+        with tracer.span(SPAN_PACK):
+            trajectory = Trajectory(
+                prompt_tokens=prompt_ids,
+                response_tokens=response_ids,
+                response_masks=response_mask,
+                idx=idx,
+                trajectory_reward=trajectory_reward,
+                chat_completions=valid_length_traj,
+                metrics={
+                    "steps": assistant_cnt + 1,
+                    "reward_time": None,
+                    "env_time": None,
+                    "llm_time": None,
+                    "total_time": result.duration,
+                    "res_reward": res_reward,
+                    "toolcall_reward": toolcall_reward,
+                }
+            )
 
         return trajectory
 
+    def _snapshot_length(self, snapshot: dict) -> Tuple[int, str]:
+        """
+        Count the tokens of a stored step trajectory.
+
+        The prompt of the step was already counted in chat_completion, when the rendered conversation extends the
+        rendered prompt only the remaining response part is encoded.
+
+        Args:
+            snapshot: Step stored by _AgentSDKLLMEngine.chat_completion.
+
+        Returns:
+            Tuple[int, str]: Token count and the rendered conversation.
+        """
+        rendered = self._parse(snapshot["messages"], add_generation_prompt=False)
+        prompt = snapshot["prompt"]
+        if rendered.startswith(prompt):
+            tail = rendered[len(prompt):]
+            return snapshot["prompt_tokens"] + len(self.tokenizer.encode(tail, add_special_tokens=False)), rendered
+        return len(self.tokenizer.encode(rendered)), rendered
+
     def generate_agent_trajectories_async(self, tasks: List[dict]) -> List[Trajectory]:
         """
         Generate several trajectories asynchronously using multiple agents.
@@ -436,25 +672,104 @@ class AreEngineWrapper(BaseEngineWrapper):
         Args:
             tasks: Meta-are scenario data.
         """
+        result = [None] * len(tasks)
+        for idx, trajectory in self.iter_agent_trajectories(tasks):
+            result[idx] = trajectory
+        return result
+
+    def iter_agent_trajectories(self, tasks: List[dict]) -> Iterator[Tuple[int, Trajectory]]:
+        """
+        Generate trajectories and yield them as soon as each one finishes.
+
+        Args:
+            tasks: Meta-are scenario data.
+
+        Yields:
+            Tuple[int, Trajectory]: Index of the task and its trajectory, None if the scenario failed.
+        """
+        if self.num_processes > 0:
+            try:
+                yield from self._iter_process_trajectories(tasks)
+            finally:
+                get_tracer().dump("are")
+            return
+
         completions_size = len(self.completions)
-        num_worker = self.n_parallel_agents
+        num_worker = min(self.n_parallel_agents, len(tasks))
         task_queue = queue.Queue()
-
-        result = [None] * len(tasks)
+        result_queue = queue.Queue()
 
         for idx, task in enumerate(tasks):
-            task_queue.put((idx, task))
+            task_queue.put((idx, task, time.perf_counter()))
 
-        runners = []
         for wid in range(num_worker):
-            p = Thread(target=self.worker, args=(task_queue, result, self.completions[wid % completions_size]))
+            p = Thread(target=self.worker, args=(task_queue, result_queue, self.completions[wid % completions_size]),
+                       daemon=True)
             p.start()
-            runners.append(p)
 
-        for p in runners:
-            p.join()
+        try:
+            for _ in range(len(tasks)):
+                yield result_queue.get()
+        finally:
+            # Export the spans of the batch when tracing is enabled
+            get_tracer().dump("are")
+
+    def _iter_process_trajectories(self, tasks: List[dict]) -> Iterator[Tuple[int, Trajectory]]:
+        """Run scenarios on the worker process pool, yielding trajectories in completion order."""
+        pool = self._get_process_pool()
+        tracer = get_tracer()
+        futures = {
+            pool.submit(_run_in_process_worker, task, idx, idx % len(self.completions), time.perf_counter()): idx
+            for idx, task in enumerate(tasks)
+        }
+        for future in as_completed(futures):
+            try:
+                trajectory, events = future.result()
+                tracer.extend(events)
+            except Exception:
+                traceback.print_exc()
+                trajectory = None
+            yield futures[future], trajectory
+
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        """
+        Return the scenario worker pool, created on first use and kept across iterations.
 
-        return result
+        Workers are forked so that the tokenizer and completion interfaces are inherited instead of pickled,
+        each worker then runs scenarios one at a time with its own completion event loop. spawn and forkserver
+        are not an option: the completion interfaces are closures over the inference clients of the trainer,
+        and this module is loaded by file path, so neither can be pickled to a fresh interpreter.
+
+        A lock held by another thread at fork time stays locked forever in the workers, so all workers are
+        forked here at once, after the completion loop thread of this process is stopped and before the pool
+        starts its own threads. Other threads of the calling process, e.g. of the trainer, must not hold
+        locks the scenarios need at that moment; a warning lists them.
+        """
+        if self._process_pool is not None and self._process_pool_completions is self.completions:
+            return self._process_pool
+
+        self.close()
+        _stop_completion_loop()
+        running = [thread.name for thread in threading.enumerate() if thread is not threading.current_thread()]
+        if running:
+            warnings.warn(f"Forking scenario workers while other threads are running: {running}. A lock held by "
+                          f"one of them at fork time stays locked in the workers.", RuntimeWarning)
+        self._process_pool = ProcessPoolExecutor(max_workers=self.num_processes,
+                                                 mp_context=multiprocessing.get_context("fork"),
+                                                 initializer=_init_process_worker,
+                                                 initargs=(self, self.completions))
+        # With the fork start method the first submission forks every worker before the pool starts its
+        # management thread, do it now instead of in the middle of a batch
+        self._process_pool.submit(os.getpid).result()
+        self._process_pool_completions = self.completions
+        return self._process_pool
+
+    def close(self):
+        """Shut down the scenario worker processes, if any."""
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=True, cancel_futures=True)
+            self._process_pool = None
+            self._process_pool_completions = None
 
     def generate_traj(self,
                       scenario_data: str,
@@ -533,10 +848,12 @@ class AreEngineWrapper(BaseEngineWrapper):
             agent_config=agent_config, env=env
         )
         are_simulation_agent.react_agent.max_iterations = max_steps
-        are_simulation_agent.run_scenario(scenario=scenario, notification_system=env.notification_system)
+        with get_tracer().span(SPAN_ENV, op="run_scenario"):
+            are_simulation_agent.run_scenario(scenario=scenario, notification_system=env.notification_system)
 
         # validate result
-        validate_result = scenario.validate(env)
+        with get_tracer().span(SPAN_REWARD, op="validate"):
+            validate_result = scenario.validate(env)
 
         # clean resources
         env.stop()
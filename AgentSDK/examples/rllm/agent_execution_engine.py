@@ -15,8 +15,10 @@ limitations under the License.
 """
 
 import asyncio
+import contextvars
 import concurrent.futures
 import time
+from collections import OrderedDict, deque
 import torch
 from typing import Any, Dict, List, Optional, Union, Callable
 
@@ -24,53 +26,191 @@ from rllm.engine import AgentExecutionEngine as _AgentExecutionEngine
 from rllm.parser.chat_template import ChatTemplateParser
 from rllm.router.router import Router
 from rllm.agents.agent import Action
-from rllm.agents.utils import (
-    convert_messages_to_tokens_and_masks,
-    get_recent_assistant_user_messages,
-)
+from rllm.agents.utils import get_recent_assistant_user_messages
 from rllm.environments.env_utils import compute_mc_return
 from rllm.misc import colorful_print
 
-from examples.rllm.utils.utils import compute_trajectory_reward
+from examples.rllm.utils.utils import compute_trajectory_reward, IncrementalChatTokenizer
+from examples.rllm.utils.tracing import (
+    current_trajectory, get_tracer, SPAN_ENV, SPAN_LLM, SPAN_PACK, SPAN_QUEUE, SPAN_REWARD, SPAN_TOKENIZE
+)
 
 
-class OpenAIRouter(Router):
+class EndpointStats:
+    """
+    Rolling load and latency statistics of a single completion endpoint.
+
+    Attributes:
+        in_flight (int): Number of requests currently sent to the endpoint.
+        latencies (deque): Durations in seconds of the most recent successful requests.
+        outcomes (deque): Success (False) / failure (True) flags of the most recent requests.
     """
-    Router for OpenAI-compatible API interactions with load balancing.
 
-    Handled address allocation, usage tracking, and API communication with
-    proper resource management and error handling.
+    def __init__(self, window: int) -> None:
+        self.in_flight = 0
+        self.total_requests = 0
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+
+    def record(self, latency: float, failed: bool) -> None:
+        self.total_requests += 1
+        self.outcomes.append(failed)
+        if not failed:
+            self.latencies.append(latency)
+
+    def latency_quantile(self, quantile: float) -> Optional[float]:
+        """Return the given latency quantile over the window, None without samples."""
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(quantile * len(ordered)))]
+
+    @property
+    def error_rate(self) -> float:
+        return sum(self.outcomes) / len(self.outcomes) if self.outcomes else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "total_requests": self.total_requests,
+            "p50_latency": self.latency_quantile(0.5),
+            "p95_latency": self.latency_quantile(0.95),
+            "error_rate": self.error_rate,
+        }
+
+
+class OpenAIRouter(Router):
+    """
+    Router for OpenAI-compatible API interactions with load and latency aware balancing.
+
+    Every completion endpoint keeps its number of in-flight requests and a rolling
+    window of latencies and errors. A request goes to the endpoint with the lowest
+    expected wait, (in_flight + 1) * p50 latency, penalized by its error rate.
+    Applications stick to the endpoint they were last served by so that the
+    server side prefix (KV) cache is reused, unless that endpoint has become
+    noticeably busier than the best one. Optionally a straggling request is
+    hedged: a duplicate is sent to another endpoint and the first answer wins.
     """
     # Defalt parameters
     DEFAULT_SAMPLING_PARAMS = {"n": 1}
     DEFAULT_MAX_RETRY_ATTEMPTS = 3
     DEFAULT_RETRY_DELAY = 1
+    DEFAULT_LATENCY_WINDOW = 100
+    DEFAULT_AFFINITY_SLACK = 2
+    DEFAULT_HEDGE_MIN_DELAY = 1.0
+    # Latency assumed when no endpoint has samples yet, only its ratio to measured latencies matters
+    DEFAULT_UNKNOWN_LATENCY = 1.0
+    # Weight of the error rate in the endpoint score
+    ERROR_PENALTY = 4.0
+    # Maximum number of remembered application to endpoint assignments
+    MAX_AFFINITY_ENTRIES = 65536
 
     def __init__(
         self,
-        completions: List[Callable]
+        completions: List[Callable],
+        latency_window: int = DEFAULT_LATENCY_WINDOW,
+        affinity_slack: int = DEFAULT_AFFINITY_SLACK,
+        hedge_requests: bool = False,
+        hedge_min_delay: float = DEFAULT_HEDGE_MIN_DELAY,
     ) -> None:
         """
         Initialize the OpenAIRouter.
 
         Args:
             completions (List[Callable]): A list of functions, each of which is used to call a remote LLM interface.
+            latency_window (int): Number of recent requests per endpoint used for latency and error statistics.
+            affinity_slack (int): How many more in-flight requests than the best endpoint an application's
+                previous endpoint may have before the application is moved.
+            hedge_requests (bool): Whether to send a duplicate of a straggling request to another endpoint.
+            hedge_min_delay (float): Minimum time in seconds before a request is hedged, the actual delay is the
+                p95 latency of the endpoint when larger.
 
         Raises:
-            ValueError: If no completion functions are provided.
+            ValueError: If no completion functions are provided or a parameter is invalid.
         """
         if not completions:
             raise ValueError("At least one completion function must be provided.")
         
         if not all(callable(comp) for comp in completions):
             raise ValueError("All completion functions must be callable.")
-        
+
+        if not isinstance(latency_window, int) or latency_window <= 0:
+            raise ValueError("latency_window must be a positive integer.")
+        if not isinstance(affinity_slack, int) or affinity_slack < 0:
+            raise ValueError("affinity_slack must be a non-negative integer.")
+        if not isinstance(hedge_requests, bool):
+            raise ValueError("hedge_requests must be a boolean value.")
+        if hedge_min_delay < 0:
+            raise ValueError("hedge_min_delay must be non-negative.")
+
         self.completions = completions
-        self._lock = asyncio.Lock()
-        # Track usage count for each completion function
-        self._usage: Dict[Callable, int] = {comp: 0 for comp in self.completions}
-        # Map application IDs to completion functions
-        self._application_id_to_address: Dict[str, Callable] = {}
+        self.affinity_slack = affinity_slack
+        self.hedge_requests = hedge_requests
+        self.hedge_min_delay = hedge_min_delay
+        self._stats: Dict[Callable, EndpointStats] = {
+            comp: EndpointStats(latency_window) for comp in self.completions
+        }
+        # Map application IDs to the completion function that served them last
+        self._application_id_to_address: "OrderedDict[str, Callable]" = OrderedDict()
+        # Round-robin cursor used to break ties between equally scored endpoints
+        self._next_index = 0
+
+    def _score(self, completion: Callable) -> float:
+        """Expected wait of a new request on an endpoint, lower is better."""
+        stats = self._stats[completion]
+        latency = stats.latency_quantile(0.5)
+        if latency is None:
+            # Unmeasured endpoints are assumed as fast as the fastest known one, so they get explored
+            known = [s.latency_quantile(0.5) for s in self._stats.values() if s.latencies]
+            latency = min(known) if known else self.DEFAULT_UNKNOWN_LATENCY
+        return (stats.in_flight + 1) * latency * (1 + self.ERROR_PENALTY * stats.error_rate)
+
+    def _best_completion(self, exclude: Optional[set] = None) -> Optional[Callable]:
+        candidates = [comp for comp in self.completions if not exclude or comp not in exclude]
+        if not candidates:
+            return None
+        # Rotate the candidate order so that ties are spread round-robin
+        self._next_index = (self._next_index + 1) % len(candidates)
+        rotated = candidates[self._next_index:] + candidates[:self._next_index]
+        return min(rotated, key=self._score)
+
+    async def get_address(self, application_id: str, exclude: Optional[set] = None) -> Callable:
+        """
+        Select the completion function for a request of an application.
+
+        Selection and bookkeeping contain no await, so they are atomic on the event loop
+        and need no lock.
+
+        Args:
+            application_id (str): The unique identifier for the application.
+            exclude (Optional[set]): Completion functions not to use, e.g. ones that just failed.
+
+        Returns:
+            Callable: The selected completion function, its in-flight count already incremented.
+        """
+        best = self._best_completion(exclude)
+        if best is None:
+            best = self._best_completion()
+        completion = self._application_id_to_address.get(application_id)
+        if (completion is None or (exclude and completion in exclude)
+                or self._stats[completion].in_flight > self._stats[best].in_flight + self.affinity_slack
+                or self._stats[completion].error_rate > self._stats[best].error_rate + 0.5):
+            completion = best
+
+        self._application_id_to_address[application_id] = completion
+        self._application_id_to_address.move_to_end(application_id)
+        while len(self._application_id_to_address) > self.MAX_AFFINITY_ENTRIES:
+            self._application_id_to_address.popitem(last=False)
+        self._stats[completion].in_flight += 1
+        return completion
+
+    async def release_address(self, completion: Callable, application_id: str) -> None:
+        """Mark a request on a completion function as finished, the application keeps its affinity."""
+        self._stats[completion].in_flight -= 1
+
+    def get_stats(self) -> List[Dict[str, Any]]:
+        """Return the load and latency statistics of every completion endpoint, in completions order."""
+        return [self._stats[comp].to_dict() for comp in self.completions]
 
     @classmethod
     async def _chat(cls, completion: Callable, **completions_request):
@@ -81,22 +221,52 @@ class OpenAIRouter(Router):
         if "extra_headers" in completions_request:
             completions_request.pop("extra_headers")
 
-        max_retries = cls.DEFAULT_MAX_RETRY_ATTEMPTS        # Maximum number of retries
-        retry_delay = cls.DEFAULT_RETRY_DELAY               # Initial delay between retries in seconds
+        # Call the completion function
+        return await completion(completions_request)
 
-        for retry in range(max_retries):
-            try:
-                # Call the completion function
-                response = await completion(completions_request)
-                return response
-            except Exception as e:
-                import traceback
-                traceback.print_exc()
-                # If this was the last retry, raise the exception
-                if retry == max_retries - 1:
-                    raise e
-                await asyncio.sleep(retry_delay)
-                retry_delay *= 2  # Exponential backoff
+    async def _timed_chat(self, completion: Callable, application_id: str, **request):
+        """Send one request to an already acquired completion function and record its outcome."""
+        start_time = time.monotonic()
+        failed = True
+        try:
+            response = await self._chat(completion, **request)
+            failed = False
+            return response
+        except asyncio.CancelledError:
+            # A cancelled hedge says nothing about the endpoint health
+            failed = None
+            raise
+        finally:
+            if failed is not None:
+                self._stats[completion].record(time.monotonic() - start_time, failed)
+            await self.release_address(completion, application_id)
+
+    async def _hedged_chat(self, completion: Callable, application_id: str, **request):
+        """Send a request, and a duplicate to another endpoint when the first one straggles."""
+        if not self.hedge_requests or len(self.completions) < 2:
+            return await self._timed_chat(completion, application_id, **request)
+
+        primary = asyncio.ensure_future(self._timed_chat(completion, application_id, **request))
+        pending = {primary}
+        try:
+            hedge_delay = max(self.hedge_min_delay, self._stats[completion].latency_quantile(0.95) or 0.0)
+            done, pending = await asyncio.wait(pending, timeout=hedge_delay)
+            if done:
+                return primary.result()
+
+            hedge_completion = self._best_completion(exclude={completion})
+            self._stats[hedge_completion].in_flight += 1
+            pending.add(asyncio.ensure_future(self._timed_chat(hedge_completion, application_id, **request)))
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+            # Both failed, surface the primary error
+            return primary.result()
+        finally:
+            for task in pending:
+                task.cancel()
 
     async def chat(
         self,
@@ -106,7 +276,9 @@ class OpenAIRouter(Router):
         **kwargs
     ) -> Any:
         """
-        Perform chat completion using the least used completion function.
+        Perform chat completion on the best scoring completion function.
+
+        Failed attempts are retried with exponential backoff on another endpoint when possible.
 
         Args:
             prompt (str): The input prompt for the chat completion.
@@ -115,21 +287,27 @@ class OpenAIRouter(Router):
             **kwargs: Additional keyword arguments for the completion function.
 
         Raises:
-            RuntimeError: If no completion functions are available.
+            RuntimeError: If the chat completion fails after all retries.
         """
         default_kwargs = OpenAIRouter.DEFAULT_SAMPLING_PARAMS
         merged_kwargs = {**default_kwargs, **default_sampling, **kwargs}
 
-        # Select the least used completion function
-        completion = await self.get_address(application_id)
-        try:
-            response = await self._chat(completion, prompt=prompt, **merged_kwargs)
-            return self._extract_response_text(response)
-        except Exception as e:
-            print(f"Error during chat completion for application {application_id}: {e}")
-            raise RuntimeError(f"Chat completion failed for application {application_id}") from e
-        finally:
-            await self.release_address(completion, application_id)
+        max_retries = self.DEFAULT_MAX_RETRY_ATTEMPTS       # Maximum number of retries
+        retry_delay = self.DEFAULT_RETRY_DELAY              # Initial delay between retries in seconds
+        failed_completions = set()
+        for retry in range(max_retries):
+            completion = await self.get_address(application_id, exclude=failed_completions)
+            try:
+                response = await self._hedged_chat(completion, application_id, prompt=prompt, **merged_kwargs)
+                return self._extract_response_text(response)
+            except Exception as e:
+                print(f"Error during chat completion for application {application_id}: {e}")
+                # If this was the last retry, raise the exception
+                if retry == max_retries - 1:
+                    raise RuntimeError(f"Chat completion failed for application {application_id}") from e
+                failed_completions.add(completion)
+                await asyncio.sleep(retry_delay)
+                retry_delay *= 2  # Exponential backoff
 
     def _extract_response_text(self, response: Dict[str, Any]) -> str:
         """
@@ -312,6 +490,31 @@ class AgentExecutionEngine(_AgentExecutionEngine):
         )
         return response
 
+    def _run_in_executor(self, span_name: str, func: Callable, *args, **span_args) -> asyncio.Future:
+        """
+        Run func on the executor as a traced span, the time it waits for a free thread is
+        traced as queueing. The caller's context is kept, so spans recorded by func belong
+        to the current trajectory.
+        """
+        loop = asyncio.get_event_loop()
+        tracer = get_tracer()
+        if not tracer.enabled:
+            return loop.run_in_executor(self.executor, func, *args)
+
+        submitted = time.perf_counter()
+
+        def traced_call():
+            tracer.add_span(SPAN_QUEUE, submitted, time.perf_counter())
+            with tracer.span(span_name, **span_args):
+                return func(*args)
+        return loop.run_in_executor(self.executor, contextvars.copy_context().run, traced_call)
+
+    @staticmethod
+    async def _traced(span_name: str, awaitable, **span_args):
+        """Await an awaitable as a traced span."""
+        with get_tracer().span(span_name, **span_args):
+            return await awaitable
+
     @staticmethod
     def _validate_obj_params(param_name, param_value, expected_type, expected_bool=False):
         if not expected_bool:
@@ -334,6 +537,9 @@ class AgentExecutionEngine(_AgentExecutionEngine):
         """Run a single agent's trajectory asynchronously"""
         agent = self.agents[idx]
         env = self.envs[idx]
+        # Spans recorded while running this trajectory, including by the environment, belong to it
+        current_trajectory.set(idx)
+        tracer = get_tracer()
 
         termination_reason = None
         prompt_token_len = 0
@@ -353,9 +559,11 @@ class AgentExecutionEngine(_AgentExecutionEngine):
         # for step perf
         llm_step_times = []
         env_step_times = []
-        # Reset environment with the task using the executor
-        loop = asyncio.get_event_loop()
-        observation, info = await loop.run_in_executor(self.executor, env.reset)
+        # Reset environment with the task, natively async environments do not need an executor thread
+        if hasattr(env, "async_reset"):
+            observation, info = await self._traced(SPAN_ENV, env.async_reset(), op="reset")
+        else:
+            observation, info = await self._run_in_executor(SPAN_ENV, env.reset, op="reset")
         info["max_steps"] = self.max_steps
 
         # Reset agent
@@ -368,9 +576,10 @@ class AgentExecutionEngine(_AgentExecutionEngine):
             info=info,
         )
         messages = agent.chat_completions
-        prompt_tokens, _ = convert_messages_to_tokens_and_masks(messages, tokenizer=self.tokenizer,
-                                                                parser=self.chat_parser, contains_first_msg=True,
-                                                                contains_generation_msg=True)
+        # Keeps the tokens of the history encoded so far, each step only tokenizes new messages
+        chat_tokenizer = IncrementalChatTokenizer(self.tokenizer, self.chat_parser)
+        with tracer.span(SPAN_TOKENIZE):
+            prompt_tokens, _ = chat_tokenizer.tokens_and_masks(messages)
         prompt_token_len = len(prompt_tokens)
         # Note, this should never happen!
         if prompt_token_len > self.max_prompt_length:
@@ -385,44 +594,48 @@ class AgentExecutionEngine(_AgentExecutionEngine):
             prompt_messages = agent.chat_completions.copy() 
             # Max remaining tokens left for the response
             # For enforced max prompt at each step, no need to deduct here
-            curr_step_prompt_length = len(self.tokenizer.encode(
-                self.chat_parser.parse(prompt_messages, add_generation_prompt=True, is_first_msg=True),
-                add_special_tokens=False))
+            with tracer.span(SPAN_TOKENIZE, step=step_idx):
+                curr_step_prompt_length = chat_tokenizer.prompt_length(prompt_messages)
             if not self.enforce_max_prompt_length:
                 max_tokens = max_model_len - curr_step_prompt_length
             else:
                 max_tokens = max_tokens_old
 
                 # since max prompt is enforced, we filter out too long prompts.
-                prompt_str = self.chat_parser.parse(prompt_messages, add_generation_prompt=True, is_first_msg=True)
-                prompt_len = len(self.tokenizer.encode(prompt_str, add_special_tokens=False))
-                if prompt_len > self.max_prompt_length:
+                if curr_step_prompt_length > self.max_prompt_length:
                     termination_reason = "PROMPT_TRUNCATION"
                     break
 
             kwargs["max_tokens"] = max_tokens
 
+            # Parse the prompt once, it is both sent to the model and recorded in the step
+            with tracer.span(SPAN_TOKENIZE, step=step_idx):
+                prompt_text = self.chat_parser.parse(prompt_messages, add_generation_prompt=True, is_first_msg=True)
             start_time = time.time()
-            response = await self.get_model_response(prompt_messages, application_id, **kwargs)           
+            with tracer.span(SPAN_LLM, step=step_idx):
+                response = await self.get_model_response(prompt_text, application_id, **kwargs)
             delta_time = time.time() - start_time
             llm_time += delta_time
             total_time += delta_time
             # Update steps
             prompt_response_pair = {
-                "prompt": self.chat_parser.parse(prompt_messages, add_generation_prompt=True, is_first_msg=True),
+                "prompt": prompt_text,
                 "response": response,
             }
             episode_steps.append(prompt_response_pair)
             # Update agent with model response
             action: Action = agent.update_from_model(response)
             action = action.action
-            # Take step in environment using the executor
+            # Take step in environment, natively or using the executor
             start_time = time.time()
+            if hasattr(env, "async_step"):
+                env_step = self._traced(SPAN_ENV, env.async_step(action), op="step", step=step_idx)
+            else:
+                env_step = self._run_in_executor(SPAN_ENV, env.step, action, op="step", step=step_idx)
 
             try:
                 next_observation, reward, done, info = await asyncio.wait_for(
-                    loop.run_in_executor(self.executor, env.step, action),
-                    timeout=(self.trajectory_timeout - total_time))
+                    env_step, timeout=(self.trajectory_timeout - total_time))
             except asyncio.TimeoutError:
                 termination_reason = "ENV_TIMEOUT"
                 if step_idx == 0:
@@ -462,28 +675,19 @@ class AgentExecutionEngine(_AgentExecutionEngine):
             if mode == "Token" and env_messages is None:
                 raise ValueError("Environment messages is none when accumulating token trajectories which should be conversations. This should not happen.")
             
-            assistant_msg_tokens, assistant_msg_masks = [], []
-            env_msg_tokens, env_msg_masks = [], []
-            if assistant_message:
-                assistant_msg_tokens, assistant_msg_masks = convert_messages_to_tokens_and_masks([assistant_message],
-                                                                                                 tokenizer=self.tokenizer,
-                                                                                                 parser=self.chat_parser,
-                                                                                                 contains_first_msg=False,
-                                                                                                 contains_generation_msg=False)
-            if env_messages:
-                env_msg_tokens, env_msg_masks = convert_messages_to_tokens_and_masks(env_messages,
-                                                                                     tokenizer=self.tokenizer,
-                                                                                     parser=self.chat_parser,
-                                                                                     contains_first_msg=False,
-                                                                                     contains_generation_msg=True)
-
-            # Update repsonse token length
-            response_token_len += len(assistant_msg_tokens) + len(env_msg_tokens)
-
-            # Reached maximum number of tokens for the trajectory
-            curr_step_prompt_length = len(self.tokenizer.encode(
-                self.chat_parser.parse(agent.chat_completions, add_generation_prompt=True, is_first_msg=True),
-                add_special_tokens=False))
+            # The environment messages trail the history, preceded by the assistant message
+            env_start = len(chat_completions_messages) - len(env_messages or [])
+            assistant_start = env_start - 1 if assistant_message else env_start
+            with tracer.span(SPAN_TOKENIZE, step=step_idx):
+                assistant_msg_tokens, assistant_msg_masks = chat_tokenizer.tokens_and_masks(
+                    chat_completions_messages, assistant_start, env_start)
+                env_msg_tokens, env_msg_masks = chat_tokenizer.tokens_and_masks(chat_completions_messages, env_start)
+
+                # Update repsonse token length
+                response_token_len += len(assistant_msg_tokens) + len(env_msg_tokens)
+
+                # Reached maximum number of tokens for the trajectory
+                curr_step_prompt_length = chat_tokenizer.prompt_length(chat_completions_messages)
 
             if not self.enforce_max_prompt_length and curr_step_prompt_length >= max_model_len:
                 # Truncation length
@@ -540,16 +744,17 @@ class AgentExecutionEngine(_AgentExecutionEngine):
         if hasattr(env, "compute_final_reward") and not masked_out:
             cur_step = agent.get_current_state()
             start_time = time.time()
-            reward = await loop.run_in_executor(self.executor, env.compute_final_reward)
+            reward = await self._run_in_executor(SPAN_REWARD, env.compute_final_reward)
             reward_time = time.time() - start_time
             cur_step.reward = reward
         # Closing environment using the executor.
-        await loop.run_in_executor(self.executor, env.close)
+        await self._run_in_executor(SPAN_ENV, env.close, op="close")
 
         trajectory = agent.trajectory
         # Aggregate final trajectory statistics
-        compute_trajectory_reward(trajectory)
-        compute_mc_return(trajectory, gamma=self.gamma)
+        with tracer.span(SPAN_REWARD):
+            compute_trajectory_reward(trajectory)
+            compute_mc_return(trajectory, gamma=self.gamma)
 
         if termination_reason:
             if reward > 0:
@@ -566,28 +771,29 @@ class AgentExecutionEngine(_AgentExecutionEngine):
                 colorful_print(f"Trajectory {idx} is masked out due to overlong filter.", "red")
         
         if mode == "Token":
-            token_result = {
-                "prompt_tokens": torch.tensor(prompt_tokens, dtype=torch.long),
-                "response_tokens": torch.tensor(response_tokens, dtype=torch.long),
-                "response_masks": torch.tensor(response_masks, dtype=torch.long),
-                "trajectory_reward": trajectory.reward,
-                "idx": env.idx,
-                "chat_completions": agent.chat_completions,
-                "metrics": {
-                    # Total number of steps taken in the trajectory
-                    "steps": len(trajectory.steps),
-                    # Time to calculate reward
-                    "reward_time": reward_time,
-                    # Total time spent in environment execution (env.step)
-                    "env_time": env_time,
-                    # Time to calculate response tokens
-                    "llm_time": llm_time,
-                    # Total time spent in the trajectory
-                    "total_time": total_time,
-                    "toolcall_reward": trajectory.toolcall_reward,
-                    "res_reward": trajectory.res_reward,
-                },
-            }
+            with tracer.span(SPAN_PACK):
+                token_result = {
+                    "prompt_tokens": torch.tensor(prompt_tokens, dtype=torch.long),
+                    "response_tokens": torch.tensor(response_tokens, dtype=torch.long),
+                    "response_masks": torch.tensor(response_masks, dtype=torch.long),
+                    "trajectory_reward": trajectory.reward,
+                    "idx": env.idx,
+                    "chat_completions": agent.chat_completions,
+                    "metrics": {
+                        # Total number of steps taken in the trajectory
+                        "steps": len(trajectory.steps),
+                        # Time to calculate reward
+                        "reward_time": reward_time,
+                        # Total time spent in environment execution (env.step)
+                        "env_time": env_time,
+                        # Time to calculate response tokens
+                        "llm_time": llm_time,
+                        # Total time spent in the trajectory
+                        "total_time": total_time,
+                        "toolcall_reward": trajectory.toolcall_reward,
+                        "res_reward": trajectory.res_reward,
+                    },
+                }
             return token_result
         elif mode == "Step":
             from dataclasses import asdict
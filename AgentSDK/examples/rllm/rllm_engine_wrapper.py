@@ -19,8 +19,8 @@ import sys
 import types
 from concurrent.futures import as_completed
 from queue import Queue
-from threading import Thread
-from typing import Any, Dict, List, Optional
+from threading import Event, Thread
+from typing import Any, Dict, Iterator, List, Optional
 from dataclasses import fields
 import torch
 
@@ -40,6 +40,7 @@ sys.modules["verl.utils.torch_functional"] = verl.utils.torch_functional
 
 from examples.rllm.agent_execution_engine import AgentExecutionEngine, OpenAIRouter
 from examples.agents.agents_mapping import get_agent_by_name
+from examples.rllm.utils.tracing import get_tracer, SPAN_PACK
 
 
 def dict_to_step_trajectory(result: Dict[str, Any]) -> StepTrajectory:
@@ -135,6 +136,11 @@ class RllmEngineWrapper(BaseEngineWrapper):
         # Trajectory generation mode
         self.mode = mode
 
+        # Environments and agents kept alive across iterations, reused for the tasks of the next batch.
+        # The pools grow to the largest batch, i.e. the engine's number of parallel agents.
+        self._env_pool: List[Any] = []
+        self._agent_pool: List[Any] = []
+
     def initialize(self):
         """
         Perform necessary initialize procedure for agent engine
@@ -183,9 +189,9 @@ class RllmEngineWrapper(BaseEngineWrapper):
         """
         print(f"Initializing {len(tasks)} environments and agents...")
 
-        # Create environments and agents in parallel
-        envs = self._create_environments_parallel(tasks)
-        agents = self._create_agents_parallel(len(envs))
+        # Reuse pooled environments and agents, create the missing ones in parallel
+        envs = self._acquire_environments(tasks)
+        agents = self._acquire_agents(len(envs))
 
         # Update the engine with the created envs and agents
         try:
@@ -195,86 +201,214 @@ class RllmEngineWrapper(BaseEngineWrapper):
         
         print(f"Successfully initialized {len(envs)} environments and {len(agents)} agents.")
     
-    def generate_agent_trajectories_async(self, tasks: List[dict]) -> List[Trajectory]:
+    def generate_agent_trajectories_async(
+        self,
+        tasks: List[dict],
+        min_finished: Optional[int] = None
+    ) -> List[Trajectory]:
         """
         Generate agent trajectories asynchronously for the given tasks using the agent
         execution engine.
 
-        This method runs the asynchronous trajectory_generator in a separate thread and
-        collects results synchronously through a queue, allowing synchronous training
-        loops to consume asynchronously generated trajectories.
+        Collects the trajectories yielded by iter_agent_trajectories, allowing synchronous
+        training loops to consume asynchronously generated trajectories.
 
         Args:
             tasks (List[dict]): List of task dictionaries containing 'question', 'ground_truth', etc.
+            min_finished (Optional[int]): Partial rollout, return once this many trajectories have
+                finished and cancel the rest. None waits for all of them.
         
         Returns:
-            List[Trajectory]: List of generated agent trajectories.
+            List[Trajectory]: List of generated agent trajectories, in completion order.
 
         Raises:
             RuntimeError: If trajectory generation fails.
         """
+        trajectories = list(self.iter_agent_trajectories(tasks, min_finished=min_finished))
+        print(f"Successfully generated {len(trajectories)} trajectories.")
+        return trajectories
+
+    def iter_agent_trajectories(
+        self,
+        tasks: List[dict],
+        min_finished: Optional[int] = None
+    ) -> Iterator[Trajectory]:
+        """
+        Generate agent trajectories and yield each one as soon as it finishes.
+
+        The asynchronous trajectory_generator runs in a separate thread with its own event
+        loop and hands finished trajectories over through a queue, so the caller can start
+        processing them while stragglers are still running. When the caller stops iterating,
+        or min_finished trajectories have been yielded, the remaining ones are cancelled.
+
+        Args:
+            tasks (List[dict]): List of task dictionaries containing 'question', 'ground_truth', etc.
+            min_finished (Optional[int]): Partial rollout, stop after this many trajectories have
+                finished. None yields all of them.
+
+        Yields:
+            Trajectory: Generated agent trajectories, in completion order.
+
+        Raises:
+            ValueError: If min_finished is invalid.
+            RuntimeError: If trajectory generation fails.
+        """
+        if min_finished is not None and (
+                not isinstance(min_finished, int) or not 0 < min_finished <= len(tasks)):
+            raise ValueError(f"min_finished must be an integer in [1, {len(tasks)}] or None, got {min_finished}")
+        target = len(tasks) if min_finished is None else min_finished
+
         print(f"Generating trajectories asynchronously for {len(tasks)} tasks...")
         try:
             # Initialize environments and agents
             self.init_envs_and_agents(tasks)
+        except Exception as e:
+            print(f"Failed to generate agent trajectories: {e}")
+            raise RuntimeError(f"Failed to generate agent trajectories: {e}") from e
 
-            # Thread-safe queue to communication between threads
-            # Prevent unbounded memory usage with maxsize
-            results_queue: Queue = Queue(maxsize=1000)
-
-            def trajectory_runner() -> None:
-                """
-                Thread target function to run the asynchronous trajectory generator
-                and put results into the queue.
-                """
-                async def consume_trajectories() -> None:
-                    try:
-                        async for trajectory in self.engine.trajectory_generator(mode=self.mode):
-                            results_queue.put(trajectory)
-                        results_queue.put(None)  # Sentinel value to indicate completion
-                    except Exception as e:
-                        print(f"Error in trajectory generation: {e}")
-                        results_queue.put(e)  # Put exception in the queue to indicate failure
+        # Thread-safe queue to communication between threads, holds at most one entry per task.
+        # Unbounded so that the generator thread never blocks once the consumer stopped reading.
+        results_queue: Queue = Queue()
+        stop_event = Event()
+        runner_state: Dict[str, Any] = {}
+
+        def trajectory_runner() -> None:
+            """
+            Thread target function to run the asynchronous trajectory generator
+            and put results into the queue.
+            """
+            async def consume_trajectories() -> None:
+                runner_state["loop"] = asyncio.get_running_loop()
+                runner_state["task"] = asyncio.current_task()
+                if stop_event.is_set():
+                    return
                 try:
-                    asyncio.run(consume_trajectories())
+                    async for trajectory in self.engine.trajectory_generator(mode=self.mode):
+                        results_queue.put(trajectory)
+                    results_queue.put(None)  # Sentinel value to indicate completion
                 except Exception as e:
-                    print(f"Error running trajectory generation: {e}")
+                    print(f"Error in trajectory generation: {e}")
                     results_queue.put(e)  # Put exception in the queue to indicate failure
-            
-            # Start the trajectory runner thread
-            runner_thread = Thread(target=trajectory_runner, daemon=True, name="trajectory-generator-thread")
-            runner_thread.start()
+                finally:
+                    # Shared async HTTP sessions of the environments are bound to this loop
+                    close_session = getattr(self.env_class, "close_async_session", None)
+                    if close_session is not None:
+                        await close_session()
+            try:
+                asyncio.run(consume_trajectories())
+            except asyncio.CancelledError:
+                pass  # Cancelled by the consumer, the remaining trajectories are discarded
+            except Exception as e:
+                print(f"Error running trajectory generation: {e}")
+                results_queue.put(e)  # Put exception in the queue to indicate failure
 
-            # Collect results from the queue synchronously
-            trajectories: List[Trajectory] = []
-            while True:
+        # Start the trajectory runner thread
+        runner_thread = Thread(target=trajectory_runner, daemon=True, name="trajectory-generator-thread")
+        runner_thread.start()
+
+        finished = 0
+        finished_idxs = set()
+        try:
+            while finished < target:
                 try:
                     result = results_queue.get(timeout=1000)  # Timeout to avoid indefinite blocking
-                    if result is None:
-                    # Completion sentinel
-                        break  
-                    elif isinstance(result, Exception):
-                        # Error occurred in the trajectory generation
-                        raise RuntimeError(f"Trajectory generation failed: {result}") from result
-                    else:
-                        # Valid trajectory result
-                        if self.mode == 'Step':
-                            traj = dict_to_step_trajectory(result)
-                            trajectories.append(traj)
-                        elif self.mode == 'Token':
-                            trajectories.append(Trajectory(**result))
-                        else:
-                            raise ValueError(f"mode must be 'Token' or 'Step', got '{self.mode}'")
                 except Exception as e:
                     print(f"Error collecting trajectory from queue: {e}")
                     raise RuntimeError(f"Error collecting trajectory from queue: {e}") from e
-            
-            print(f"Successfully generated {len(trajectories)} trajectories.")
-            return trajectories
-        
-        except Exception as e:
-            print(f"Failed to generate agent trajectories: {e}")
-            raise RuntimeError(f"Failed to generate agent trajectories: {e}") from e
+                if result is None:
+                    # Completion sentinel
+                    break
+                if isinstance(result, Exception):
+                    # Error occurred in the trajectory generation
+                    print(f"Failed to generate agent trajectories: {result}")
+                    raise RuntimeError(f"Trajectory generation failed: {result}") from result
+                finished += 1
+                finished_idxs.add(result.get("idx"))
+                with get_tracer().span(SPAN_PACK, trajectory=result.get("idx")):
+                    trajectory = self._to_trajectory(result)
+                yield trajectory
+        finally:
+            if runner_thread.is_alive() and finished < len(tasks):
+                # Stopped early, cancel the remaining trajectories
+                stop_event.set()
+                loop = runner_state.get("loop")
+                if loop is not None:
+                    try:
+                        loop.call_soon_threadsafe(runner_state["task"].cancel)
+                    except RuntimeError:
+                        pass  # The loop has already finished
+                print(f"Stopped trajectory generation after {finished} of {len(tasks)} trajectories.")
+                self._discard_pooled(len(tasks), finished_idxs)
+            else:
+                # All trajectories finished, let the runner close the async sessions instead of cancelling it
+                runner_thread.join()
+            # Export the spans of the batch when tracing is enabled
+            get_tracer().dump("rllm")
+
+    def _discard_pooled(self, n_used: int, keep_idxs: set) -> None:
+        """
+        Remove the environments and agents of cancelled trajectories from the pools, their
+        steps may still be running on the executor and must not overlap the next batch.
+
+        Args:
+            n_used (int): Number of pooled instances used by the batch.
+            keep_idxs (set): Indices of the trajectories that finished.
+        """
+        self._env_pool = [env for i, env in enumerate(self._env_pool) if i >= n_used or i in keep_idxs]
+        self._agent_pool = [agent for i, agent in enumerate(self._agent_pool) if i >= n_used or i in keep_idxs]
+
+    def _to_trajectory(self, result: Dict[str, Any]) -> Trajectory:
+        """
+        Convert a trajectory result of the execution engine to a Trajectory.
+
+        Raises:
+            ValueError: If the mode is invalid.
+        """
+        # Detach the message history from the agent, which is reused for the next batch
+        result["chat_completions"] = list(result.get("chat_completions", []))
+        if self.mode == 'Step':
+            return dict_to_step_trajectory(result)
+        elif self.mode == 'Token':
+            return Trajectory(**result)
+        raise ValueError(f"mode must be 'Token' or 'Step', got '{self.mode}'")
+
+    def _acquire_environments(self, tasks: List[dict]) -> List[Any]:
+        """
+        Get environments for the given tasks from the pool, creating the missing ones.
+
+        Pooled environments must support set_task to be reused, environment classes without it
+        are recreated for every batch.
+
+        Args:
+            tasks (List[dict]): List of task to get environments for
+
+        Raises:
+            RuntimeError: If environment creation fails.
+        """
+        if not hasattr(self.env_class, "set_task"):
+            return self._create_environments_parallel(tasks)
+
+        n_reused = min(len(tasks), len(self._env_pool))
+        for env, task in zip(self._env_pool, tasks[:n_reused]):
+            env.set_task(task, max_steps=self.max_steps)
+        if n_reused < len(tasks):
+            self._env_pool.extend(self._create_environments_parallel(tasks[n_reused:]))
+        return self._env_pool[:len(tasks)]
+
+    def _acquire_agents(self, n_agents: int) -> List[Any]:
+        """
+        Get agents from the pool, creating the missing ones. Agents are reset by the engine at
+        the start of every trajectory.
+
+        Args:
+            n_agents (int): Number of agents to get
+
+        Raises:
+            RuntimeError: If agent creation fails.
+        """
+        if len(self._agent_pool) < n_agents:
+            self._agent_pool.extend(self._create_agents_parallel(n_agents - len(self._agent_pool)))
+        return self._agent_pool[:n_agents]
 
     def _create_environments_parallel(self, tasks: List[dict]) -> List[Any]:
         """
@@ -0,0 +1,222 @@
+"""
+Copyright 2026 Huawei Technologies Co., Ltd
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import contextvars
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, List, Optional
+
+# Directory receiving trace files, tracing is disabled when it is not set
+TRACE_DIR_ENV = "AGENTSDK_TRACE_DIR"
+
+# Span names shared by the engine wrappers
+SPAN_TOKENIZE = "tokenize"
+SPAN_QUEUE = "queue"
+SPAN_LLM = "llm"
+SPAN_TOOL_HTTP = "tool_http"
+SPAN_ENV = "env"
+SPAN_REWARD = "reward"
+SPAN_PACK = "pack"
+
+# Trajectory the current code runs for, used as the trace row of spans that do not name one
+current_trajectory = contextvars.ContextVar("current_trajectory", default=None)
+
+
+class Tracer:
+    """
+    Records timed spans of agent rollouts.
+
+    Spans are kept in memory until dump() writes them as a Chrome trace (viewable in
+    chrome://tracing or https://ui.perfetto.dev), one row per trajectory, together with
+    per-span latency statistics and histograms. A disabled tracer records nothing and its
+    span() costs one attribute check.
+
+    Attributes:
+        trace_dir (Optional[str]): Directory receiving the dumped files, None disables tracing.
+    """
+
+    def __init__(self, trace_dir: Optional[str] = None) -> None:
+        self.trace_dir = trace_dir
+        self._events: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._dump_count = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.trace_dir is not None
+
+    def span(self, name: str, trajectory: Any = None, **args):
+        """
+        Context manager timing the enclosed block as a span.
+
+        Args:
+            name (str): Span name, e.g. one of the SPAN_* constants.
+            trajectory (Any): Trajectory the span belongs to, defaults to current_trajectory.
+            **args: Extra attributes shown with the span.
+        """
+        if not self.enabled:
+            return nullcontext()
+        return self._span(name, trajectory, args)
+
+    @contextmanager
+    def _span(self, name: str, trajectory: Any, args: Dict[str, Any]):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(name, start, time.perf_counter(), trajectory, **args)
+
+    def add_span(self, name: str, start: float, end: float, trajectory: Any = None, **args) -> None:
+        """
+        Record a span from time.perf_counter() timestamps.
+
+        Args:
+            name (str): Span name.
+            start (float): Start timestamp in seconds.
+            end (float): End timestamp in seconds.
+            trajectory (Any): Trajectory the span belongs to, defaults to current_trajectory.
+            **args: Extra attributes shown with the span.
+        """
+        if not self.enabled:
+            return
+        if trajectory is None:
+            trajectory = current_trajectory.get()
+        event = {
+            "name": name,
+            "cat": "rollout",
+            "ph": "X",
+            "ts": start * 1e6,
+            "dur": (end - start) * 1e6,
+            "pid": os.getpid(),
+            "tid": trajectory if trajectory is not None else threading.get_ident(),
+        }
+        if args:
+            event["args"] = args
+        with self._lock:
+            self._events.append(event)
+
+    def drain(self) -> List[Dict[str, Any]]:
+        """Remove and return the recorded events, e.g. to send them from a worker process."""
+        with self._lock:
+            events, self._events = self._events, []
+        return events
+
+    def extend(self, events: List[Dict[str, Any]]) -> None:
+        """Add events recorded elsewhere, e.g. drained in a worker process."""
+        if self.enabled and events:
+            with self._lock:
+                self._events.extend(events)
+
+    def summary(self, events: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Compute latency statistics per span name.
+
+        Returns:
+            dict: span name -> count, total/mean/p50/p95/p99/max in milliseconds and a histogram
+            mapping power-of-two millisecond upper bounds to counts.
+        """
+        if events is None:
+            with self._lock:
+                events = list(self._events)
+        durations: Dict[str, List[float]] = {}
+        for event in events:
+            durations.setdefault(event["name"], []).append(event["dur"] / 1e3)
+
+        summary = {}
+        for name, values in sorted(durations.items()):
+            values.sort()
+            histogram: Dict[str, int] = {}
+            for value in values:
+                bucket = f"<{2 ** max(0, math.ceil(math.log2(value))) if value > 0 else 1}ms"
+                histogram[bucket] = histogram.get(bucket, 0) + 1
+            summary[name] = {
+                "count": len(values),
+                "total_ms": sum(values),
+                "mean_ms": sum(values) / len(values),
+                "p50_ms": _quantile(values, 0.5),
+                "p95_ms": _quantile(values, 0.95),
+                "p99_ms": _quantile(values, 0.99),
+                "max_ms": values[-1],
+                "histogram": histogram,
+            }
+        return summary
+
+    def dump(self, tag: str = "rollout") -> Optional[str]:
+        """
+        Write the recorded spans as a Chrome trace and a summary file, then clear them.
+
+        Args:
+            tag (str): Prefix of the file names.
+
+        Returns:
+            Optional[str]: Path of the trace file, None if tracing is disabled or nothing was recorded.
+        """
+        if not self.enabled:
+            return None
+        events = self.drain()
+        if not events:
+            return None
+
+        os.makedirs(self.trace_dir, exist_ok=True)
+        self._dump_count += 1
+        base = os.path.join(self.trace_dir, f"{tag}_{os.getpid()}_{self._dump_count}")
+        trace_path = f"{base}.trace.json"
+        with open(trace_path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+        summary = self.summary(events)
+        with open(f"{base}.summary.json", "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        print(format_summary(summary))
+        print(f"Rollout trace written to {trace_path}")
+        return trace_path
+
+
+def _quantile(sorted_values: List[float], quantile: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(quantile * len(sorted_values)))]
+
+
+def format_summary(summary: Dict[str, Dict[str, Any]]) -> str:
+    """Format a Tracer.summary() as a text table."""
+    lines = [f"{'span':<12}{'count':>8}{'total_s':>10}{'mean_ms':>10}{'p50_ms':>10}{'p95_ms':>10}{'max_ms':>10}"]
+    for name, stats in summary.items():
+        lines.append(
+            f"{name:<12}{stats['count']:>8}{stats['total_ms'] / 1e3:>10.2f}{stats['mean_ms']:>10.1f}"
+            f"{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['max_ms']:>10.1f}"
+        )
+    return "\n".join(lines)
+
+
+# Tracer recording nothing, returned by get_tracer() when tracing is disabled
+NOOP_TRACER = Tracer()
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer() -> Tracer:
+    """Return the process-wide tracer, enabled when the AGENTSDK_TRACE_DIR environment variable is set."""
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                trace_dir = os.getenv(TRACE_DIR_ENV)
+                _tracer = Tracer(trace_dir) if trace_dir else NOOP_TRACER
+    return _tracer
@@ -15,6 +15,7 @@ limitations under the License.
 """
 
 import numpy as np
+from rllm.agents.utils import convert_messages_to_tokens_and_masks
 
 def compute_trajectory_reward(trajectory):
     """
@@ -41,4 +42,78 @@ def compute_trajectory_reward(trajectory):
     trajectory.toolcall_reward = toolcall_reward
     trajectory.res_reward = res_reward
     trajectory.reward = toolcall_reward + res_reward
-    return trajectory
\ No newline at end of file
+    return trajectory
+
+
+class IncrementalChatTokenizer:
+    """
+    Per-trajectory tokenization cache over a growing chat history.
+
+    Every message is parsed and tokenized on its own, the same way
+    convert_messages_to_tokens_and_masks does, and kept until the history
+    before it changes. Each step then only tokenizes the newly appended
+    messages instead of the whole conversation.
+
+    A non-assistant message carries the generation prompt when it is the last
+    message or is followed by an assistant message, so the concatenated tokens
+    of a history match the prompt the model is served with, and assistant
+    tokens match what is accumulated into the response.
+    """
+
+    def __init__(self, tokenizer, parser):
+        self.tokenizer = tokenizer
+        self.parser = parser
+        # Snapshots of the cached messages and, per message, {generation_flag: (tokens, masks)}
+        self._messages = []
+        self._encoded = []
+
+    def tokens_and_masks(self, messages, start=0, end=None):
+        """
+        Return the concatenated tokens and masks of messages[start:end].
+
+        Args:
+            messages: The full chat history.
+            start: Index of the first message to include.
+            end: Index after the last message to include, defaults to the end of the history.
+
+        Returns:
+            tuple: (tokens, masks) lists.
+        """
+        self._sync(messages)
+        end = len(messages) if end is None else end
+        tokens, masks = [], []
+        for i in range(start, end):
+            msg_tokens, msg_masks = self._encode(messages, i)
+            tokens.extend(msg_tokens)
+            masks.extend(msg_masks)
+        return tokens, masks
+
+    def prompt_length(self, messages):
+        """Return the number of prompt tokens for the history, generation prompt included."""
+        self._sync(messages)
+        return sum(len(self._encode(messages, i)[0]) for i in range(len(messages)))
+
+    def _sync(self, messages):
+        """Drop cached messages from the first one that differs from the history."""
+        common = 0
+        for cached, msg in zip(self._messages, messages):
+            if cached != msg:
+                break
+            common += 1
+        del self._messages[common:]
+        del self._encoded[common:]
+        for msg in messages[common:]:
+            # Copy, so that in-place edits of the history by the agent are detected.
+            self._messages.append(dict(msg))
+            self._encoded.append({})
+
+    def _encode(self, messages, i):
+        is_last = i == len(messages) - 1
+        generation_msg = messages[i].get("role") != "assistant" and (
+            is_last or messages[i + 1].get("role") == "assistant")
+        entry = self._encoded[i]
+        if generation_msg not in entry:
+            entry[generation_msg] = convert_messages_to_tokens_and_masks(
+                [messages[i]], tokenizer=self.tokenizer, parser=self.parser,
+                contains_first_msg=(i == 0), contains_generation_msg=generation_msg)
+        return entry[generation_msg]
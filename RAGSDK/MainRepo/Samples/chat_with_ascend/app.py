@@ -1,10 +1,14 @@
+import asyncio
 import base64
+import hashlib
 import io
 import json
 import os
 import re
 import shutil
+import time
 
+from concurrent.futures import ThreadPoolExecutor
 from datasets import tqdm
 from pathlib import Path
 import subprocess
@@ -14,7 +18,7 @@ import httpx
 from PIL import Image
 from langchain_openai import ChatOpenAI
 from loguru import logger
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 from paddle.base import libpaddle
 from functools import wraps
 
@@ -46,11 +50,24 @@ from mx_rag.cache import CacheConfig, EvictPolicy, SimilarityCacheConfig, MxRAGC
 
 import streamlit as st
 
+# 样例共用的工具模块位于上级目录
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rag_sample_utils.ingest import (EMBED_MAX_INFLIGHT, get_content_hash, reset_parse_cache,
+                                     load_ingest_manifest, save_ingest_manifest, remove_ingest_manifest,
+                                     create_incremental_embed_func, create_batched_embed_func)
+from rag_sample_utils.retrieval import reciprocal_rank_fusion
+
 user_id = "7d1d04c1-dd5f-43f8-bad5-99795f24bce6"
 # 工作目录
 WORKSPACE_DIR = "/home/HwHiAiUser/workspace"
 # 配置文件路径
 CONFIG_FILE_PATH = WORKSPACE_DIR + "/" + "config.json"
+# 图片描述缓存目录，按图片内容hash保存vlm生成的描述，不同文档中的相同图片只调用一次vlm
+VLM_CACHE_DIR = WORKSPACE_DIR + "/" + "vlm_cache"
+# 同时请求vlm的最大图片数
+VLM_CONCURRENCY = 8
+# 图片读取、缩放和编码的线程数
+IMAGE_ENCODE_WORKERS = 4
 
 key_content = 'content'
 key_type = 'type'
@@ -71,6 +88,7 @@ key_clear_knowledge = 'clear_knowledge'
 key_interleaved_answer = 'interleaved_answer'
 key_interleaved_prompt = 'interleaved_prompt'
 key_similarity_threshold = 'similarity_threshold'
+key_fusion_top_k = 'fusion_top_k'
 key_temperature = 'temperature'
 key_max_length = 'max_length'
 key_top_p = 'top_p'
@@ -177,6 +195,7 @@ def delete_document_in_knowledge(knowledge_name: str):
             shutil.rmtree(os.path.join(ocr_store_dir, name))
             # 删除知识库，向量库中的数据
             knowledge_db.delete_file(file_name)
+            remove_ingest_manifest(get_manifest_dir(knowledge_name), file_name)
 
     except Exception as e:
         logger.error(f"delete file [{file_names}] failed: {e}")
@@ -285,6 +304,8 @@ def clear_knowledge(knowledge_name: str):
     # 删除从文件解析出来的图片
     try:
         shutil.rmtree(upload_file_dir)
+        if os.path.exists(get_manifest_dir(knowledge_name)):
+            shutil.rmtree(get_manifest_dir(knowledge_name))
         if st.session_state.parse_image == STR_TRUE:
             shutil.rmtree(ocr_store_dir)
     except Exception as e:
@@ -324,8 +345,20 @@ def convert_to_pdf(input_file, output_dir=None):
         return None
 
 
+# 向量化请求的线程池，所有上传共享，限制发往embedding服务的总并发
+@st.cache_resource
+def get_embed_executor():
+    return ThreadPoolExecutor(max_workers=EMBED_MAX_INFLIGHT, thread_name_prefix="embed")
+
+
+# 知识库的入库清单目录
+def get_manifest_dir(knowledge_name):
+    return WORKSPACE_DIR + "/" + get_knowledge_name(knowledge_name) + "_manifest"
+
+
+# 解析切分文件，返回入库任务，文件无需入库时返回None
 @catch_errors
-def upload_file(knowledge_name: str, file):
+def prepare_upload_file(knowledge_name: str, file):
     logger.info(f"start to upload file: {file.name}")
 
     upload_file_dir, ocr_store_dir = get_knowledge_dir(knowledge_name)
@@ -337,8 +370,10 @@ def upload_file(knowledge_name: str, file):
     file_path = os.path.join(upload_file_dir, file.name.split("/")[-1])
 
     # Write the file content to disk in binary write mode
+    file_content = file.getbuffer()
+    file_hash = get_content_hash(file_content)
     with open(file_path, "wb") as f:
-        f.write(file.getbuffer())
+        f.write(file_content)
 
     file_obj = Path(file_path)
     
@@ -346,6 +381,8 @@ def upload_file(knowledge_name: str, file):
         if file_obj.suffix in [".docx", ".pptx"]:
             file_obj = convert_to_pdf(file_obj)
         if file_obj.suffix == ".pdf":
+            # 文件内容未变化时复用已有的ocr和vlm解析结果
+            reset_parse_cache(os.path.join(ocr_store_dir, file_obj.stem), file_hash)
             parse_pdf_file(file_obj, ocr_store_dir, server_url=st.session_state["ocr_url"])
             # ocr 处理后，将原始的pdf格式转换为md文件
             file_obj = Path(os.path.join(ocr_store_dir, file_obj.stem, "vlm", f"{file_obj.stem}.md"))
@@ -358,15 +395,16 @@ def upload_file(knowledge_name: str, file):
     # 根据文类型，获取loader类和splitter类信息
     loader_info, splitter_info = get_document_loader_splitter(file_obj.suffix)
 
-    # 获取embedding对象
-    emb = get_embedding()
     # 获取知识库管理对象
     knowledge_db = get_knowledge_db(knowledge_name)[2]
 
-    # 检查当前文件是否已经入过库
-    if knowledge_db.check_document_exist(file_obj.name):
-        logger.warning(f"file {file_obj.name} exists in knowledge db")
-        return
+    # 检查当前文件是否已经入过库，内容未变化时不再重复入库
+    manifest_dir = get_manifest_dir(knowledge_name)
+    old_file_hash, cached_embeddings = load_ingest_manifest(manifest_dir, file_obj.name)
+    document_exist = knowledge_db.check_document_exist(file_obj.name)
+    if document_exist and old_file_hash == file_hash:
+        logger.warning(f"file {file_obj.name} exists in knowledge db and is unchanged")
+        return None
 
     # 创建文件解析器和切分器
     loader = loader_info.loader_class(file_path=file_obj.as_posix(), **loader_info.loader_params)
@@ -395,10 +433,53 @@ def upload_file(knowledge_name: str, file):
                               "source": file_path,
                               "image_path": description.get("image_path")
                               })
-    # 存储到文本、向量数据库中
-    knowledge_db.add_file(file_obj, texts, {"dense": emb.embed_documents}, meta_data)
+    return {
+        "name": file.name,
+        "file_obj": file_obj,
+        "file_hash": file_hash,
+        "texts": texts,
+        "meta_data": meta_data,
+        "knowledge_db": knowledge_db,
+        "manifest_dir": manifest_dir,
+        "document_exist": document_exist,
+        "cached_embeddings": cached_embeddings,
+    }
+
 
-    logger.info(f"upload file {file.name} to knowledge successfully")
+# 计算入库任务中各片段的向量，在后台线程中执行，与下一个文件的解析切分重叠
+def embed_upload_task(task, emb, embed_executor):
+    chunk_embeddings = {}
+    embed_func = create_incremental_embed_func(create_batched_embed_func(emb.embed_documents, embed_executor),
+                                               task["cached_embeddings"], chunk_embeddings)
+    start = time.perf_counter()
+    embed_func(task["texts"])
+    return chunk_embeddings, time.perf_counter() - start
+
+
+# 等待入库任务的向量计算完成后写入文本、向量数据库，返回入库的片段数
+@catch_errors
+def store_upload_task(task, embed_future, emb):
+    chunk_embeddings, embed_time = embed_future.result()
+    file_obj = task["file_obj"]
+    knowledge_db = task["knowledge_db"]
+    if task["document_exist"]:
+        # 文件内容有变化，删除旧的片段后重新入库，内容未变化的片段复用已有向量，不再重新计算
+        knowledge_db.delete_file(file_obj.name)
+
+    # 存储到文本、向量数据库中，向量已经计算完成，直接按片段hash取用
+    start = time.perf_counter()
+    embed_func = create_incremental_embed_func(emb.embed_documents, chunk_embeddings, {})
+    knowledge_db.add_file(file_obj, task["texts"], {"dense": embed_func}, task["meta_data"])
+    store_time = time.perf_counter() - start
+    save_ingest_manifest(task["manifest_dir"], file_obj.name, task["file_hash"], chunk_embeddings)
+
+    cached_embeddings = task["cached_embeddings"]
+    reused = len(cached_embeddings.keys() & chunk_embeddings.keys())
+    logger.info(f"upload file {task['name']} to knowledge successfully, chunks: {len(chunk_embeddings)}, "
+                f"embedded: {len(chunk_embeddings) - reused}, reused: {reused}, "
+                f"removed: {len(cached_embeddings.keys() - chunk_embeddings.keys())}, "
+                f"embed: {embed_time:.2f}s, store: {store_time:.2f}s")
+    return len(task["texts"])
 
 
 @catch_errors
@@ -406,8 +487,25 @@ def file_upload(knowledge_name: str):
     if st.session_state.uploaded_files is None:
         return
 
-    for uploaded_file in st.session_state.uploaded_files:
-        upload_file(knowledge_name, uploaded_file)
+    emb = get_embedding()
+    embed_executor = get_embed_executor()
+    start = time.perf_counter()
+    total_chunks = 0
+    pending = None
+    # 流水线入库：后台线程计算向量的同时，主线程解析切分下一个文件，并将向量已计算完成的上一个文件写入知识库
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="upload_embed") as executor:
+        for uploaded_file in st.session_state.uploaded_files:
+            task = prepare_upload_file(knowledge_name, uploaded_file)
+            current = (task, executor.submit(embed_upload_task, task, emb, embed_executor)) if task else None
+            if pending is not None:
+                total_chunks += store_upload_task(*pending, emb) or 0
+            pending = current
+        if pending is not None:
+            total_chunks += store_upload_task(*pending, emb) or 0
+
+    elapsed = time.perf_counter() - start
+    logger.info(f"upload {len(st.session_state.uploaded_files)} files, {total_chunks} chunks in {elapsed:.2f}s, "
+                f"{total_chunks / elapsed:.1f} chunks/s")
 
     print_history_message()
 
@@ -729,9 +827,15 @@ def get_document_loader_splitter(file_suffix):
     return loader_info, splitter_info
 
 
+# 并行执行多路检索的线程池，streamlit每次交互都会重新执行脚本，用cache_resource在多次执行之间复用
+@st.cache_resource
+def get_retrieval_executor():
+    return ThreadPoolExecutor(max_workers=8, thread_name_prefix="retrieval")
+
+
 # 根据问题从数据库中检索相似片段
 @catch_errors
-def retrieve_similarity_docs(knowledge_name: str, query, top_k, score_threshold):
+def retrieve_similarity_docs(knowledge_name: str, query, top_k, score_threshold, fusion_top_k=0):
     knowledge_name = get_knowledge_name(knowledge_name)
     # 获取embedding对象
     emb = get_embedding()
@@ -747,39 +851,51 @@ def retrieve_similarity_docs(knowledge_name: str, query, top_k, score_threshold)
                                 score_threshold=score_threshold
                                 )
 
-    # 调用检索器从向量数据库中查找出和query最相近的tok个文档chunk
-    dense_res = dense_retriever.invoke(query)
-
     # 配置全文检索器，其实现原理为BM25检索
     full_text_retriever = FullTextRetriever(document_store=chunk_store, k=top_k)
 
-    full_text_res = full_text_retriever.invoke(query)
-
-    # 合并检索结果
-    docs = dense_res + full_text_res
+    # 向量检索和全文检索并行执行
+    dense_future = get_retrieval_executor().submit(dense_retriever.invoke, query)
+    full_text_future = get_retrieval_executor().submit(full_text_retriever.invoke, query)
+    dense_res = dense_future.result()
+    full_text_res = full_text_future.result()
 
-    # 两路检索，可能检索到重复的片段，去重处理
-    contents = set()
-    new_docs = []
-    for doc in docs:
-        if doc.page_content not in contents:
-            new_docs.append(doc)
-            contents.add(doc.page_content)
+    # 两路检索可能检索到相同的片段，按片段id进行RRF融合去重，并可在rerank前截断
+    new_docs = reciprocal_rank_fusion([dense_res, full_text_res], top_n=fusion_top_k)
 
-    logger.info(f"retrieve similarity chunks from knowledge successfully")
+    logger.info(f"retrieve similarity chunks from knowledge successfully, "
+                f"dense: {len(dense_res)}, full text: {len(full_text_res)}, fused: {len(new_docs)}")
     return new_docs
 
 
-# 调用vlm对图片进行多粒度理解
-@catch_errors
-def extract_image_info_by_vlm(image_path):
-    # 将图像转换为 base64 编码的字符串
-    with Image.open(image_path) as img:
+# 图片读取、缩放和编码的线程池
+@st.cache_resource
+def get_image_executor():
+    return ThreadPoolExecutor(max_workers=IMAGE_ENCODE_WORKERS, thread_name_prefix="image_encode")
+
+
+# 缓存的描述与vlm模型和提示词相关，二者变化后重新生成
+def get_vlm_cache_path(image_hash, model_name):
+    prompt_hash = hashlib.sha256(f"{model_name}\n{img_to_text_prompt}".encode()).hexdigest()[:16]
+    return os.path.join(VLM_CACHE_DIR, f"{image_hash}_{prompt_hash}.txt")
+
+
+# 读取图片并计算内容hash，已有缓存描述时直接返回描述，否则将图像转换为 base64 编码的字符串，在线程池中执行
+def prepare_image_for_vlm(image_path, model_name):
+    with open(image_path, "rb") as f:
+        image_bytes = f.read()
+    image_hash = hashlib.sha256(image_bytes).hexdigest()
+    cache_path = get_vlm_cache_path(image_hash, model_name)
+    if os.path.exists(cache_path):
+        with open(cache_path, "r", encoding="utf-8") as f:
+            return image_hash, f.read(), ""
+
+    with Image.open(io.BytesIO(image_bytes)) as img:
         width, height = img.size
         # 如果图片小于256*256，直接返回
         if width < 256 and height < 256:
             logger.warning(f"----------- image:{image_path} size: ({width},{height}) too little, will be discarded")
-            return ""
+            return image_hash, "", ""
 
         buffer = io.BytesIO()
         if Path(image_path).suffix == ".png":
@@ -789,26 +905,54 @@ def extract_image_info_by_vlm(image_path):
             img = img.resize(size=(width // 2, height // 2))
 
         img.save(buffer, format="JPEG")
-        img_str = base64.b64encode(buffer.getvalue()).decode('utf-8')
+        return image_hash, None, base64.b64encode(buffer.getvalue()).decode('utf-8')
+
+
+# 调用vlm对多张图片进行多粒度理解，图片编码在线程池中进行，最多VLM_CONCURRENCY张图片同时请求vlm，所有图片共用一个vlm客户端
+async def extract_images_info_by_vlm_async(image_files, base_url, model_name, temperature):
+    loop = asyncio.get_running_loop()
+    image_executor = get_image_executor()
+    semaphore = asyncio.Semaphore(VLM_CONCURRENCY)
+    os.makedirs(VLM_CACHE_DIR, exist_ok=True)
+    progress = tqdm(total=len(image_files), desc='parse images by vlm')
+
+    async with AsyncOpenAI(base_url=base_url, api_key='sk-1234',
+                           http_client=httpx.AsyncClient(limits=httpx.Limits(max_connections=VLM_CONCURRENCY))) as client:
+        async def extract_one(image_file):
+            try:
+                image_hash, description, img_str = await loop.run_in_executor(
+                    image_executor, prepare_image_for_vlm, image_file, model_name)
+                if description is not None:
+                    return description
+
+                # 构造请求消息
+                messages = [
+                    {
+                        "role": "user",
+                        "content": [
+                            {"type": "text", "text": img_to_text_prompt},
+                            {"type": "image_url", "image_url": {"url": f"data:image;base64,{img_str}"}}
+                        ]
+                    }
+                ]
+                async with semaphore:
+                    response = await client.chat.completions.create(model=model_name, messages=messages,
+                                                                    temperature=temperature)
+                description = response.choices[0].message.content or ""
+                if description:
+                    with open(get_vlm_cache_path(image_hash, model_name), "w", encoding="utf-8") as f:
+                        f.write(description)
+                return description
+            except Exception as e:
+                logger.error(f"call vlm for image {image_file} failed:{e}")
+                return ""
+            finally:
+                progress.update(1)
 
-    # 构造请求消息
-    messages = [
-        {
-            "role": "user",
-            "content": [
-                {"type": "text", "text": img_to_text_prompt},
-                {"type": "image_url", "image_url": {"url": f"data:image;base64,{img_str}"}}
-            ]
-        }
-    ]
-
-    vlm = create_llm_chain(base_url=st.session_state["vlm_url"], model_name=st.session_state["vlm_name"])
-
-    try:
-        return vlm.invoke(messages).content
-    except Exception as e:
-        logger.error(f"call vlm invoke failed:{e}")
-        return ""
+        try:
+            return await asyncio.gather(*(extract_one(image_file) for image_file in image_files))
+        finally:
+            progress.close()
 
 
 # 获取目录下的所有图片文件路径
@@ -837,10 +981,10 @@ def extract_images_info_by_vlm(image_dir, md_file_obj=None):
     logger.info(f"start to extract images info by vlm ...")
 
     image_files = find_images_files(image_dir)
+    descriptions = asyncio.run(extract_images_info_by_vlm_async(
+        image_files, st.session_state["vlm_url"], st.session_state["vlm_name"], st.session_state.temperature))
     info = []
-    for image_file in tqdm(image_files, desc='parse images by vlm'):
-        logger.info(f"start to deal {[image_file]} by vlm")
-        res = extract_image_info_by_vlm(image_file)
+    for image_file, res in zip(image_files, descriptions):
         if res:
             info.append({"image_path": image_file, "image_description": res})
 
@@ -1103,7 +1247,8 @@ def answer_with_knowledge(llm_chain, query):
         logger.debug(f"检索到的相关的文本： {q_docs}")
     else:
         q_docs = retrieve_similarity_docs(st.session_state.knowledge_name, query, st.session_state.top_k,
-                                          st.session_state.similarity_threshold)
+                                          st.session_state.similarity_threshold,
+                                          st.session_state.get(key_fusion_top_k, 0))
 
         text_reranker = TEIReranker(url=st.session_state["reranker_url"], k=st.session_state.rerank_top_k,
                                     client_param=ClientParam(use_http=True))
@@ -1226,6 +1371,7 @@ def init_config():
         "max_length": 1024,
         "top_k": 3,
         "similarity_threshold": 0.5,
+        "fusion_top_k": 0,
         "modify_query": STR_FALSE,
         "history_n": 3,
         "cache_type": "nocache",
@@ -1267,7 +1413,7 @@ def auto_save_config():
         "oghost", "ogport", "ogdatabase", "oguser", "ogpassword", "retrieval_top_k", #"reranker_top_k",
         "similarity_tail_threshold", "subgraph_depth", "batch_size", "knowledge_name", "parse_image",
         "interleaved_answer", "interleaved_prompt", "text_prompt", "temperature", "top_p", "max_length",
-        "top_k", "similarity_threshold", "modify_query", "history_n", "cache_type", "cache_update_strategy",
+        "top_k", "similarity_threshold", "fusion_top_k", "modify_query", "history_n", "cache_type", "cache_update_strategy",
         "cache_size"
     }
 
@@ -1445,6 +1591,10 @@ def set_web():
                               key=key_similarity_threshold,
                               on_change=lambda: [refresh_chat(), auto_save_config()],
                               help="值越大，越相似")
+                    st.slider(key_fusion_top_k, 0, 200, st.session_state[key_fusion_top_k], step=1,
+                              key=key_fusion_top_k,
+                              on_change=lambda: [refresh_chat(), auto_save_config()],
+                              help="向量检索和全文检索结果融合后送入rerank的最大片段数，0表示不截断")
 
         with st.expander("设置大模型对话参数"):
             st.slider(key_temperature, 0.1, 1.0, st.session_state[key_temperature], step=0.1,
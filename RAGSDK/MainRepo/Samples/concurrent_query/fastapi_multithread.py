@@ -1,10 +1,20 @@
 import argparse
+import asyncio
+import contextvars
 import os
+import queue
+import sys
 import threading
+import time
+from collections import deque
 from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from typing import Optional
 from pathlib import Path
+
+import numpy as np
 from fastapi import FastAPI, HTTPException
+from loguru import logger
 from paddle.base import libpaddle
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from mx_rag.chain import SingleText2TextChain
@@ -13,7 +23,6 @@ from mx_rag.document.loader import DocxLoader
 from mx_rag.embedding.local import TextEmbedding
 from mx_rag.embedding.service import TEIEmbedding
 from mx_rag.knowledge import KnowledgeDB
-from mx_rag.knowledge.handler import upload_files
 from mx_rag.knowledge.knowledge import KnowledgeStore
 from mx_rag.llm import Text2TextLLM
 from mx_rag.reranker.local import LocalReranker
@@ -23,6 +32,10 @@ from mx_rag.storage.document_store import SQLiteDocstore
 from mx_rag.storage.vectorstore import MindFAISS
 from mx_rag.utils import ClientParam
 
+# 样例共用的工具模块位于上级目录
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rag_sample_utils.ingest import create_batched_embed_func
+
 
 
 
@@ -37,6 +50,184 @@ class CustomFormatter(argparse.ArgumentDefaultsHelpFormatter):
 text_retriever = any
 llm = any
 reranker = any
+# 问答链池，每个处理中的请求独占一条链，检索器、reranker和大模型客户端在链之间共享
+chain_pool = queue.SimpleQueue()
+# 执行问答链的线程池，线程数即最大并发数
+thread_pool_executor = any
+# 限制同时处理的请求数，超出的请求在事件循环中排队
+query_limiter = any
+max_queue_size = 0
+waiting_requests = 0
+running_requests = 0
+
+# 当前请求各阶段耗时(秒)，在执行问答链的工作线程中设置
+_stage_timings = contextvars.ContextVar("stage_timings", default=None)
+
+
+@contextmanager
+def timed_stage(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = _stage_timings.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+
+class TimedRetriever(Retriever):
+    def invoke(self, *args, **kwargs):
+        with timed_stage("retrieve"):
+            return super().invoke(*args, **kwargs)
+
+
+class TimedRerankMixin:
+    def rerank(self, *args, **kwargs):
+        with timed_stage("rerank"):
+            return super().rerank(*args, **kwargs)
+
+
+class TimedTEIReranker(TimedRerankMixin, TEIReranker):
+    pass
+
+
+class TimedLocalReranker(TimedRerankMixin, LocalReranker):
+    pass
+
+
+class TimedText2TextLLM(Text2TextLLM):
+    def chat(self, *args, **kwargs):
+        with timed_stage("llm"):
+            return super().chat(*args, **kwargs)
+
+
+class StageStats:
+    """各阶段耗时统计，每个阶段保留最近window个请求的耗时"""
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self.samples = {}
+        self.requests = 0
+        self.rejected = 0
+
+    def record(self, timings: dict):
+        self.requests += 1
+        for stage, seconds in timings.items():
+            self.samples.setdefault(stage, deque(maxlen=self.window)).append(seconds)
+
+    def summary(self) -> dict:
+        result = {}
+        for stage, values in self.samples.items():
+            ordered = sorted(values)
+            result[stage] = {
+                "count": len(ordered),
+                "mean_ms": round(sum(ordered) / len(ordered) * 1000, 1),
+                "p50_ms": round(ordered[len(ordered) // 2] * 1000, 1),
+                "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 1),
+                "max_ms": round(ordered[-1] * 1000, 1),
+            }
+        return result
+
+
+stage_stats = StageStats()
+
+
+class IngestStats:
+    """批量入库统计，记录文件数、片段数、各阶段累计耗时和整体吞吐"""
+
+    def __init__(self):
+        self.files = 0
+        self.failed = 0
+        # 入库失败的文件及原因
+        self.errors = {}
+        self.chunks = 0
+        self.stage_seconds = {"load": 0.0, "embed": 0.0, "store": 0.0}
+        self.start = time.perf_counter()
+        self.end = None
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            self.stage_seconds[stage] += seconds
+
+    def summary(self) -> dict:
+        elapsed = (self.end or time.perf_counter()) - self.start
+        return {
+            "files": self.files,
+            "failed": self.failed,
+            "errors": self.errors,
+            "chunks": self.chunks,
+            "elapsed_s": round(elapsed, 2),
+            "chunks_per_sec": round(self.chunks / elapsed, 1) if elapsed > 0 else 0.0,
+            "stage_busy_s": {stage: round(seconds, 2) for stage, seconds in self.stage_seconds.items()},
+        }
+
+
+ingest_stats: Optional[IngestStats] = None
+
+
+# 解析切分一个文件并计算各片段的向量，在入库线程池中执行
+def load_and_embed_file(file_path: str, loader_mng, embed_func, stats: IngestStats) -> tuple:
+    file_obj = Path(file_path)
+    start = time.perf_counter()
+    loader_info = loader_mng.get_loader(file_obj.suffix)
+    splitter_info = loader_mng.get_splitter(file_obj.suffix)
+    loader = loader_info.loader_class(file_path=file_obj.as_posix(), **loader_info.loader_params)
+    splitter = splitter_info.splitter_class(**splitter_info.splitter_params)
+    docs = [doc for doc in loader.load_and_split(splitter) if doc.page_content]
+    texts = [doc.page_content for doc in docs]
+    meta_data = [doc.metadata for doc in docs]
+    stats.add("load", time.perf_counter() - start)
+
+    start = time.perf_counter()
+    embeddings = embed_func(texts) if texts else []
+    stats.add("embed", time.perf_counter() - start)
+    return file_obj, texts, embeddings, meta_data
+
+
+# 等待文件的解析和向量计算完成后写入知识库，写库在调用线程中串行执行
+def store_file(knowledge_db, file_path: str, future, stats: IngestStats):
+    try:
+        file_obj, texts, embeddings, meta_data = future.result()
+        start = time.perf_counter()
+        if knowledge_db.check_document_exist(file_obj.name):
+            knowledge_db.delete_file(file_obj.name)
+        # 向量已经计算完成，写库时按片段内容取用
+        embedding_map = dict(zip(texts, embeddings))
+        knowledge_db.add_file(file_obj, texts,
+                              {"dense": lambda batch: np.stack([embedding_map[text] for text in batch])}, meta_data)
+        stats.add("store", time.perf_counter() - start)
+        stats.files += 1
+        stats.chunks += len(texts)
+    except Exception as e:
+        stats.failed += 1
+        stats.errors[file_path] = str(e)
+        logger.exception(f"upload file {file_path} failed: {e}")
+
+
+def pipeline_upload_files(knowledge_db, files: list, loader_mng, embed_func, ingest_workers: int,
+                          embed_batch_size: int, embed_inflight: int) -> IngestStats:
+    """
+    流水线批量入库：多个文件同时解析切分，片段分批后以多个并发请求计算向量，
+    向量计算完成的文件按顺序写入知识库，写库与后续文件的解析、向量计算重叠进行
+    """
+    global ingest_stats
+    stats = ingest_stats = IngestStats()
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=embed_inflight, thread_name_prefix="embed") as embed_executor, \
+            ThreadPoolExecutor(max_workers=ingest_workers, thread_name_prefix="ingest") as ingest_executor:
+        batched_embed_func = create_batched_embed_func(embed_func, embed_executor, embed_batch_size)
+        for file_path in files:
+            pending.append((file_path, ingest_executor.submit(load_and_embed_file, file_path, loader_mng,
+                                                              batched_embed_func, stats)))
+            # 限制处理中的文件数，避免解析结果和向量在内存中大量堆积
+            while len(pending) > ingest_workers * 2:
+                store_file(knowledge_db, *pending.popleft(), stats)
+        while pending:
+            store_file(knowledge_db, *pending.popleft(), stats)
+    stats.end = time.perf_counter()
+    logger.info(f"upload files finished: {stats.summary()}")
+    return stats
 
 
 def rag_init():
@@ -59,6 +250,13 @@ def rag_init():
     parse.add_argument("--up_files", type=str, nargs='+', default=None, help="要上传的文件路径，需在白名单路径下")
     parse.add_argument("--sql_path", type=str, nargs='+', default="./sql.db", help="关系数据库文件保存路径")
     parse.add_argument("--vector_path", type=str, nargs='+', default="./faiss.index", help="向量数据库文件保存路径")
+    parse.add_argument("--ingest_workers", type=int, default=4, help="上传文档时同时解析切分的文件数")
+    parse.add_argument("--embed_batch_size", type=int, default=32, help="上传文档时每个向量化请求的片段数")
+    parse.add_argument("--embed_inflight", type=int, default=4,
+                       help="上传文档时同时发往TEI embedding服务的最大请求数，使用本地embedding模型时固定为1")
+    parse.add_argument("--max_concurrency", type=int, default=10, help="同时处理的最大请求数")
+    parse.add_argument("--max_queue_size", type=int, default=100,
+                       help="等待处理的最大请求数，超出时新请求直接返回503")
     args = parse.parse_args().__dict__
     embedding_path: str = args.pop('embedding_path')
     embedding_url: str = args.pop('embedding_url')
@@ -73,6 +271,16 @@ def rag_init():
     up_files: list[str] = args.pop('up_files')
     sql_path: str = args.pop('sql_path')
     vector_path: str = args.pop('vector_path')
+    ingest_workers: int = args.pop('ingest_workers')
+    embed_batch_size: int = args.pop('embed_batch_size')
+    embed_inflight: int = args.pop('embed_inflight')
+    max_concurrency: int = args.pop('max_concurrency')
+    global max_queue_size
+    max_queue_size = args.pop('max_queue_size')
+    if max_concurrency < 1 or max_queue_size < 0:
+        raise ValueError("max_concurrency must be at least 1 and max_queue_size must not be negative")
+    if min(ingest_workers, embed_batch_size, embed_inflight) < 1:
+        raise ValueError("ingest_workers, embed_batch_size and embed_inflight must be at least 1")
 
 
     dev = 0
@@ -83,7 +291,7 @@ def rag_init():
     chunk_store = SQLiteDocstore(db_path=sql_path)
     vector_store = MindFAISS(1024, [dev], load_local_index=vector_path)
     global text_retriever
-    text_retriever = Retriever(vector_store=vector_store, document_store=chunk_store,
+    text_retriever = TimedRetriever(vector_store=vector_store, document_store=chunk_store,
                                embed_func=emb.embed_documents, k=1, score_threshold=score_threshold)
 
     # 创建知识管理
@@ -98,40 +306,86 @@ def rag_init():
         loader_mng.register_loader(DocxLoader, [".docx"])
         loader_mng.register_splitter(RecursiveCharacterTextSplitter, [".xlsx", ".docx", ".pdf"],
                                      {"chunk_size": 750, "chunk_overlap": 150, "keep_separator": False})
-        upload_files(knowledge_db, up_files, loader_mng=loader_mng, embed_func=emb.embed_documents, force=True)
+        # 本地embedding模型在同一设备上串行计算，并发请求没有收益，只对TEI服务同时发出多个请求
+        pipeline_upload_files(knowledge_db, up_files, loader_mng, emb.embed_documents, ingest_workers,
+                              embed_batch_size, embed_inflight if tei_emb else 1)
     # 上传文档结束
 
     global reranker
     if tei_reranker:
-        reranker = TEIReranker(url=reranker_url, client_param=ClientParam(use_http=True))
+        reranker = TimedTEIReranker(url=reranker_url, client_param=ClientParam(use_http=True))
     else:
-        reranker = LocalReranker(reranker_path, dev_id=dev)
+        reranker = TimedLocalReranker(reranker_path, dev_id=dev)
     global llm
-    llm = Text2TextLLM(base_url=llm_url, model_name=model_name, client_param=ClientParam(use_http=True))
-
+    llm = TimedText2TextLLM(base_url=llm_url, model_name=model_name, client_param=ClientParam(use_http=True))
 
-app = FastAPI()
+    # 问答链在启动时创建并复用，不再为每个请求重新创建
+    for _ in range(max_concurrency):
+        chain_pool.put(SingleText2TextChain(retriever=text_retriever, llm=llm, reranker=reranker))
+    global thread_pool_executor, query_limiter
+    thread_pool_executor = ThreadPoolExecutor(max_workers=max_concurrency)
+    query_limiter = asyncio.Semaphore(max_concurrency)
 
 
-def fun(input_string: str) -> str:
-    text2text_chain = SingleText2TextChain(retriever=text_retriever, llm=llm, reranker=reranker)
-    res = text2text_chain.query(input_string)
-    return f"{res}"
+app = FastAPI()
 
 
-# 创建一个线程池执行器
-thread_pool_executor = ThreadPoolExecutor(max_workers=10)
+def fun(input_string: str) -> tuple:
+    timings = {}
+    _stage_timings.set(timings)
+    text2text_chain = chain_pool.get()
+    try:
+        with timed_stage("chain"):
+            res = text2text_chain.query(input_string)
+    finally:
+        chain_pool.put(text2text_chain)
+        _stage_timings.set(None)
+    return f"{res}", timings
 
 
 @app.post("/query/")
 async def call_fun(items: dict):
-    # 使用线程池异步调用 fun 函数
-    future = thread_pool_executor.submit(fun, items['question'])
+    global waiting_requests, running_requests
+    # 排队请求数达到上限时直接拒绝，避免请求无限堆积
+    if query_limiter.locked() and waiting_requests >= max_queue_size:
+        stage_stats.rejected += 1
+        raise HTTPException(status_code=503, detail="Too many queued requests")
+
+    start = time.perf_counter()
+    waiting_requests += 1
+    try:
+        await query_limiter.acquire()
+    finally:
+        waiting_requests -= 1
+    queue_time = time.perf_counter() - start
+
+    running_requests += 1
     try:
-        result = future.result()
-        return {"result": result}
+        # 在线程池中执行问答链，等待结果时不阻塞事件循环，其他请求可以同时处理
+        loop = asyncio.get_running_loop()
+        result, timings = await loop.run_in_executor(thread_pool_executor, fun, items['question'])
     except Exception as e:
         raise HTTPException(status_code=500) from e
+    finally:
+        running_requests -= 1
+        query_limiter.release()
+
+    timings["queue"] = queue_time
+    timings["total"] = time.perf_counter() - start
+    stage_stats.record(timings)
+    return {"result": result, "timings": {stage: round(seconds * 1000, 1) for stage, seconds in timings.items()}}
+
+
+@app.get("/stats/")
+async def get_stats():
+    return {
+        "running": running_requests,
+        "waiting": waiting_requests,
+        "requests": stage_stats.requests,
+        "rejected": stage_stats.rejected,
+        "stages": stage_stats.summary(),
+        "ingest": ingest_stats.summary() if ingest_stats else None,
+    }
 
 
 if __name__ == "__main__":
@@ -1,4 +1,5 @@
 import argparse
+import asyncio
 import base64
 import io
 import json
@@ -6,6 +7,8 @@ import os
 import sys
 import re
 import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
 from http import HTTPStatus
 from typing import Optional, List
 from pathlib import Path
@@ -37,6 +40,13 @@ from mx_rag.storage.document_store import MilvusDocstore
 from mx_rag.storage.vectorstore import MilvusDB
 from mx_rag.utils import ClientParam
 
+# 样例共用的工具模块位于上级目录
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rag_sample_utils.ingest import (EMBED_MAX_INFLIGHT, get_content_hash, reset_parse_cache,
+                                     load_ingest_manifest, save_ingest_manifest, remove_ingest_manifest,
+                                     create_incremental_embed_func, create_batched_embed_func)
+from rag_sample_utils.retrieval import reciprocal_rank_fusion
+
 sys.tracebacklimit = 1000
 
 key_ssl_keyfile = 'ssl_keyfile'
@@ -48,6 +58,8 @@ app = FastAPI()
 
 upload_file_dir = os.environ.get("UPLOAD_FILE_DIR", "/home/data")
 images_store_dir = os.environ.get("IMG_STORE_DIR", "/home/images")
+# 入库清单目录，记录已入库文件的内容hash和各片段的向量
+manifest_dir = os.environ.get("MANIFEST_DIR", "/home/manifest")
 os.mkdir(upload_file_dir) if not os.path.exists(upload_file_dir) else None
 
 img_to_text_prompt = '''Given an image containing a table or figure, please provide a structured and detailed
@@ -258,8 +270,12 @@ def get_document_loader_splitter(file_suffix):
     return loader_info, splitter_info
 
 
+# 并行执行多路检索的线程池
+retrieval_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="retrieval")
+
+
 # 根据问题从数据库中检索相似片段
-def retrieve_similarity_docs(query, top_k, score_threshold):
+def retrieve_similarity_docs(query, top_k, score_threshold, fusion_top_k=0):
     # 获取embedding对象
     emb = get_embedding()
     # 获取文本和向量数据库对象
@@ -274,26 +290,20 @@ def retrieve_similarity_docs(query, top_k, score_threshold):
                                 score_threshold=score_threshold
                                 )
 
-    # 调用检索器从向量数据库中查找出和query最相近的tok个文档chunk
-    dense_res = dense_retriever.invoke(query)
-
     # 配置全文检索器，其实现原理为BM25检索
     full_text_retriever = FullTextRetriever(document_store=chunk_store, k=top_k)
 
-    full_text_res = full_text_retriever.invoke(query)
+    # 向量检索和全文检索并行执行
+    dense_future = retrieval_executor.submit(dense_retriever.invoke, query)
+    full_text_future = retrieval_executor.submit(full_text_retriever.invoke, query)
+    dense_res = dense_future.result()
+    full_text_res = full_text_future.result()
 
-    # 合并检索结果
-    docs = dense_res + full_text_res
+    # 两路检索可能检索到相同的片段，按片段id进行RRF融合去重，并可在rerank前截断
+    new_docs = reciprocal_rank_fusion([dense_res, full_text_res], top_n=fusion_top_k)
 
-    # 两路检索，可能检索到重复的片段，去重处理
-    contents = set()
-    new_docs = []
-    for doc in docs:
-        if doc.page_content not in contents:
-            new_docs.append(doc)
-            contents.add(doc.page_content)
-
-    logger.info(f"retrieve similarity chunks from knowledge successfully")
+    logger.info(f"retrieve similarity chunks from knowledge successfully, "
+                f"dense: {len(dense_res)}, full text: {len(full_text_res)}, fused: {len(new_docs)}")
     return new_docs
 
 
@@ -440,6 +450,10 @@ def extract_images_info_by_vlm(image_out_dir, file_name):
     logger.info(f"extract images info successfully")
 
 
+# 向量化请求的线程池，所有上传请求共享，限制发往embedding服务的总并发
+embed_executor = ThreadPoolExecutor(max_workers=EMBED_MAX_INFLIGHT, thread_name_prefix="embed")
+
+
 class RetrievalParam(BaseModel):
     knowledge_id: str
     query: str
@@ -455,7 +469,8 @@ async def retrieve(arg: RetrievalParam):
 
     text_reranker = TEIReranker(url=os.environ.get("reranker_url"), k=top_k, client_param=ClientParam(use_http=True))
 
-    q_docs = retrieve_similarity_docs(arg.query, top_k, score_threshold)
+    q_docs = retrieve_similarity_docs(arg.query, top_k, score_threshold,
+                                      int(arg.retrieval_setting.get("fusion_top_k", 0)))
     if text_reranker is not None and len(q_docs) > 0:
         score = text_reranker.rerank(arg.query, [doc.page_content for doc in q_docs])
         q_docs = text_reranker.rerank_top_k(q_docs, score)
@@ -484,7 +499,8 @@ async def retrieve(arg: QueryParam):
 
     top_k = int(arg.retrieval_setting.get("top_k", 3))
     score_threshold = arg.retrieval_setting.get("score_threshold", 3)
-    q_docs = retrieve_similarity_docs(arg.query, top_k, score_threshold)
+    q_docs = retrieve_similarity_docs(arg.query, top_k, score_threshold,
+                                      int(arg.retrieval_setting.get("fusion_top_k", 0)))
 
     text_reranker = TEIReranker(url=os.environ.get("reranker_url"), k=top_k, client_param=ClientParam(use_http=True))
 
@@ -509,6 +525,7 @@ async def uploadfile(file: UploadFile):
 
     try:
         contents = file.file.read()
+        file_hash = get_content_hash(contents)
         file_path = os.path.join(upload_file_dir, file.filename)
         with open(file_path, 'wb') as f:
             f.write(contents)
@@ -522,6 +539,8 @@ async def uploadfile(file: UploadFile):
     file_obj = Path(file_path)
 
     if os.environ["parse_image"] == 'True':
+        # 文件内容未变化时复用已有的图片和vlm解析结果
+        reset_parse_cache(os.path.join(images_store_dir, file.filename), file_hash)
         if file_obj.suffix == ".docx":
             extract_images_from_docx(images_store_dir, file_path)
         if file_obj.suffix == ".pdf":
@@ -540,9 +559,11 @@ async def uploadfile(file: UploadFile):
 
     file_base_name = os.path.basename(file_path)
 
-    # 检查当前文件是否已经入过库
-    if knowledge_db.check_document_exist(file_base_name):
-        logger.warning(f"file {file_base_name} exists in knowledge db")
+    # 检查当前文件是否已经入过库，内容未变化时不再重复入库
+    old_file_hash, cached_embeddings = load_ingest_manifest(manifest_dir, file_base_name)
+    document_exist = knowledge_db.check_document_exist(file_base_name)
+    if document_exist and old_file_hash == file_hash:
+        logger.warning(f"file {file_base_name} exists in knowledge db and is unchanged")
         return
 
     # 创建文件解析器和切分器
@@ -574,10 +595,31 @@ async def uploadfile(file: UploadFile):
                             "image_path": description.get("image_path")
                             })
 
-    # 存储到文本、向量数据库中
-    knowledge_db.add_file(file_obj, texts, {"dense": emb.embed_documents}, meta_data)
-
-    logger.info(f"upload file {file.filename} to knowledge successfully")
+    # 分批并发计算向量，在线程池中等待，期间事件循环可以继续处理其他上传请求
+    chunk_embeddings = {}
+    embed_func = create_incremental_embed_func(create_batched_embed_func(emb.embed_documents, embed_executor),
+                                               cached_embeddings, chunk_embeddings)
+    start = time.perf_counter()
+    await asyncio.get_running_loop().run_in_executor(None, embed_func, texts)
+    embed_time = time.perf_counter() - start
+
+    if document_exist:
+        # 文件内容有变化，删除旧的片段后重新入库，内容未变化的片段复用已有向量，不再重新计算
+        knowledge_db.delete_file(file_base_name)
+
+    # 存储到文本、向量数据库中，向量已经计算完成，直接按片段hash取用
+    start = time.perf_counter()
+    embed_func = create_incremental_embed_func(emb.embed_documents, chunk_embeddings, {})
+    knowledge_db.add_file(file_obj, texts, {"dense": embed_func}, meta_data)
+    store_time = time.perf_counter() - start
+    save_ingest_manifest(manifest_dir, file_base_name, file_hash, chunk_embeddings)
+
+    reused = len(cached_embeddings.keys() & chunk_embeddings.keys())
+    logger.info(f"upload file {file.filename} to knowledge successfully, chunks: {len(chunk_embeddings)}, "
+                f"embedded: {len(chunk_embeddings) - reused}, reused: {reused}, "
+                f"removed: {len(cached_embeddings.keys() - chunk_embeddings.keys())}, "
+                f"embed: {embed_time:.2f}s, store: {store_time:.2f}s, "
+                f"{len(texts) / max(embed_time + store_time, 1e-6):.1f} chunks/s")
 
     return JSONResponse(content={"info": f"upload file:{file.filename} successfully"})
 
@@ -593,6 +635,7 @@ async def deletefile(file: DeleteFileParam):
         # 删除数据库中的文档信息
         knowledge_db = get_knowledge_db()
         knowledge_db.delete_file(file.file_name)
+        remove_ingest_manifest(manifest_dir, file.file_name)
 
         # 删除web上传时存放的文件
         os.remove(os.path.join(upload_file_dir, file.file_name))
@@ -624,6 +667,8 @@ async def deleteallfiles():
     # 删除从文件解析出来的图片
     try:
         shutil.rmtree(upload_file_dir)
+        if os.path.exists(manifest_dir):
+            shutil.rmtree(manifest_dir)
         if os.environ["parse_image"] == "True":
             shutil.rmtree(images_store_dir)
     except Exception as e:
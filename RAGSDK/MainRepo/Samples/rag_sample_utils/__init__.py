@@ -0,0 +1,3 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) Huawei Technologies Co., Ltd. 2025. All rights reserved.
+"""RAG样例共用的检索融合与文档入库工具"""
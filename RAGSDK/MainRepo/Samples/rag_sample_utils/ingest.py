@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) Huawei Technologies Co., Ltd. 2025. All rights reserved.
+"""文档入库的增量处理：按文件和片段内容hash复用解析结果和向量"""
+
+import hashlib
+import os
+import shutil
+
+import numpy as np
+from loguru import logger
+
+# 向量化的批大小，以及同时发往embedding服务的最大请求数
+EMBED_BATCH_SIZE = 32
+EMBED_MAX_INFLIGHT = 4
+
+
+def get_content_hash(data) -> str:
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+# OCR和VLM的解析结果按源文件hash缓存，文件内容变化时删除旧的解析结果，重新解析
+def reset_parse_cache(parse_dir, file_hash):
+    hash_file = os.path.join(parse_dir, "source.sha256")
+    if os.path.exists(hash_file):
+        with open(hash_file, "r", encoding="utf-8") as f:
+            if f.read().strip() == file_hash:
+                logger.info(f"{parse_dir} is parsed from the same file content, reuse it")
+                return
+    if os.path.exists(parse_dir):
+        shutil.rmtree(parse_dir)
+    os.makedirs(parse_dir)
+    with open(hash_file, "w", encoding="utf-8") as f:
+        f.write(file_hash)
+
+
+# 读取文件的入库清单，返回(文件hash, {片段hash: 向量})，清单不存在时返回(None, {})
+def load_ingest_manifest(manifest_dir, document_name):
+    manifest_path = os.path.join(manifest_dir, f"{document_name}.npz")
+    if not os.path.exists(manifest_path):
+        return None, {}
+    try:
+        with np.load(manifest_path) as manifest:
+            return str(manifest["file_hash"]), dict(zip(manifest["chunk_hashes"].tolist(), manifest["embeddings"]))
+    except Exception as e:
+        logger.warning(f"read ingest manifest {manifest_path} failed: {e}")
+        return None, {}
+
+
+# 保存文件的入库清单，记录文件hash和各片段的向量，供文件再次上传时复用
+def save_ingest_manifest(manifest_dir, document_name, file_hash, chunk_embeddings):
+    os.makedirs(manifest_dir, exist_ok=True)
+    chunk_hashes = list(chunk_embeddings)
+    embeddings = np.stack([chunk_embeddings[chunk_hash] for chunk_hash in chunk_hashes]) if chunk_hashes \
+        else np.empty((0, 0), dtype=np.float32)
+    np.savez(os.path.join(manifest_dir, f"{document_name}.npz"), file_hash=np.array(file_hash),
+             chunk_hashes=np.array(chunk_hashes), embeddings=embeddings)
+
+
+def remove_ingest_manifest(manifest_dir, document_name):
+    manifest_path = os.path.join(manifest_dir, f"{document_name}.npz")
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+
+
+# 创建增量向量计算函数：内容未变化的片段复用cached_embeddings中的向量，只对新增或变化的片段调用embed_func，
+# 本次入库所有片段的向量记录到chunk_embeddings中
+def create_incremental_embed_func(embed_func, cached_embeddings, chunk_embeddings):
+    def embed_documents(texts):
+        if not texts:
+            return embed_func(texts)
+        chunk_hashes = [get_content_hash(text) for text in texts]
+        missing = {}
+        for chunk_hash, text in zip(chunk_hashes, texts):
+            if chunk_hash in cached_embeddings:
+                chunk_embeddings[chunk_hash] = cached_embeddings[chunk_hash]
+            elif chunk_hash not in chunk_embeddings:
+                missing[chunk_hash] = text
+        if missing:
+            embeddings = np.asarray(embed_func(list(missing.values())), dtype=np.float32)
+            chunk_embeddings.update(zip(missing, embeddings))
+        return np.stack([chunk_embeddings[chunk_hash] for chunk_hash in chunk_hashes])
+
+    return embed_documents
+
+
+# 创建分批并发的向量计算函数：片段按batch_size分批，由executor同时发出多个请求，结果按原顺序拼接
+def create_batched_embed_func(embed_func, executor, batch_size=EMBED_BATCH_SIZE):
+    def embed_documents(texts):
+        if len(texts) <= batch_size:
+            return embed_func(texts)
+        batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+        return np.concatenate([np.asarray(embeddings, dtype=np.float32)
+                               for embeddings in executor.map(embed_func, batches)])
+
+    return embed_documents
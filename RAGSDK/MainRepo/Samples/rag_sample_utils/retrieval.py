@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) Huawei Technologies Co., Ltd. 2025. All rights reserved.
+"""多路检索结果融合"""
+
+# RRF融合的平滑常数，排名靠后的片段得分衰减越慢
+RRF_K = 60
+
+
+def get_doc_key(doc):
+    """检索片段的唯一标识，向量检索和全文检索的结果都带有片段内容，以片段内容去重"""
+    return doc.page_content
+
+
+def reciprocal_rank_fusion(result_lists, weights=None, top_n=0):
+    """
+    使用RRF融合多路检索结果，片段得分为各路检索中 weight / (RRF_K + 排名) 之和
+    :param result_lists: 各路检索结果，每路按相关性从高到低排列
+    :param weights: 各路检索的权重，默认均为1
+    :param top_n: 融合后保留的片段数，0表示全部保留
+    :return: 按融合得分从高到低排列的去重片段，得分记录在metadata["rrf_score"]
+    """
+    weights = weights or [1.0] * len(result_lists)
+    scores = {}
+    docs = {}
+    for results, weight in zip(result_lists, weights):
+        for rank, doc in enumerate(results):
+            key = get_doc_key(doc)
+            scores[key] = scores.get(key, 0.0) + weight / (RRF_K + rank + 1)
+            docs.setdefault(key, doc)
+
+    ranked_keys = sorted(scores, key=scores.get, reverse=True)
+    if top_n > 0:
+        ranked_keys = ranked_keys[:top_n]
+    fused_docs = []
+    for key in ranked_keys:
+        docs[key].metadata["rrf_score"] = scores[key]
+        fused_docs.append(docs[key])
+    return fused_docs
@@ -4,14 +4,21 @@
 """混淆和解混淆数据接口"""
 
 import os
-from typing import List
+from itertools import chain
+from typing import List, Union
+
+import numpy as np
+import torch
 
 from .asset_obfuscation import AssetObfuscation
 from ..constants import Constant, ErrorCode
 from ..exception import ObfException
 from ..model import TLSConfig, PskConfig
 from ..utils import log, get_obf_dict_value_by_key, clean_bytearray, \
-    get_de_obf_dict_value_by_key, check_white_list, data_dec_mul, generate_obf_and_de_obf_dict
+    get_de_obf_dict_value_by_key, check_white_list, data_dec_mul, generate_obf_and_de_obf_dict, \
+    export_obf_and_de_obf_table
+
+TokenBatch = Union[List[int], List[List[int]], np.ndarray, torch.Tensor]
 
 
 def _check_local_save_path(is_local_save, seed_ciphertext_dir) -> bool:
@@ -80,59 +87,33 @@ class DataAssetObfuscation(AssetObfuscation):
         clean_bytearray(seed_content_bytes)
         return set_seed_result
 
-    def data_2d_obf(self, tokens: List[List[int]]) -> List[List[int]]:
+    def data_2d_obf(self, tokens: TokenBatch) -> TokenBatch:
         """混淆二维数据
-        参数：tokens:待加混淆的tokens 注意：最内层列表内需为int数
-        返回值：obf_tokens:加混淆后的tokens
+        参数：tokens:待加混淆的tokens，支持二维列表、numpy数组或torch张量 注意：元素需为int数
+        返回值：obf_tokens:加混淆后的tokens，类型与输入一致
         """
-        obf_tokens = []
-        for token_row in tokens:
-            obf_row = []
-            for token in token_row:
-                self.__check_input_item(token)
-                token = get_obf_dict_value_by_key(token)
-                obf_row.append(token)
-            obf_tokens.append(obf_row)
-        return obf_tokens
-
-    def data_1d_obf(self, tokens: List[int]) -> List[int]:
+        return self.__map_tokens(tokens, self.__get_tables()[0], 2)
+
+    def data_1d_obf(self, tokens: TokenBatch) -> TokenBatch:
         """混淆一维数据
-        参数：tokens:待加混淆的tokens 注意：列表内需为int数
-        返回值：obf_tokens:加混淆后的tokens
+        参数：tokens:待加混淆的tokens，支持一维列表、numpy数组或torch张量 注意：元素需为int数
+        返回值：obf_tokens:加混淆后的tokens，类型与输入一致
         """
-        obf_tokens = []
-        for token in tokens:
-            self.__check_input_item(token)
-            token = get_obf_dict_value_by_key(token)
-            obf_tokens.append(token)
-        return obf_tokens
-
-    def data_2d_deobf(self, tokens: List[List[int]]) -> List[List[int]]:
+        return self.__map_tokens(tokens, self.__get_tables()[0], 1)
+
+    def data_2d_deobf(self, tokens: TokenBatch) -> TokenBatch:
         """解混淆二维数据
-        参数：tokens:待解混淆的tokens 注意：最内层列表内需为int数
-        返回值：obf_tokens:解混淆后的tokens
+        参数：tokens:待解混淆的tokens，支持二维列表、numpy数组或torch张量 注意：元素需为int数
+        返回值：obf_tokens:解混淆后的tokens，类型与输入一致
         """
-        deobf_tokens = []
-        for row in tokens:
-            deobf_row = []
-            for token in row:
-                self.__check_input_item(token)
-                token = get_de_obf_dict_value_by_key(token)
-                deobf_row.append(token)
-            deobf_tokens.append(deobf_row)
-        return deobf_tokens
-
-    def data_1d_deobf(self, tokens: List[int]) -> List[int]:
+        return self.__map_tokens(tokens, self.__get_tables()[1], 2)
+
+    def data_1d_deobf(self, tokens: TokenBatch) -> TokenBatch:
         """解混淆一维数据
-        参数：tokens:待解混淆的tokens 注意：列表内需为int数
-        返回值：obf_tokens:解混淆后的tokens
+        参数：tokens:待解混淆的tokens，支持一维列表、numpy数组或torch张量 注意：元素需为int数
+        返回值：obf_tokens:解混淆后的tokens，类型与输入一致
         """
-        deobf_tokens = []
-        for token in tokens:
-            self.__check_input_item(token)
-            token = get_de_obf_dict_value_by_key(token)
-            deobf_tokens.append(token)
-        return deobf_tokens
+        return self.__map_tokens(tokens, self.__get_tables()[1], 1)
 
     def token_obf(self, token: int) -> int:
         """混淆int数据
@@ -148,11 +129,54 @@ class DataAssetObfuscation(AssetObfuscation):
         """解混淆int数据"""
         return get_de_obf_dict_value_by_key(token)
 
-    def __check_input_item(self, item: int):
-        if not isinstance(item, int) or item >= self.vocab_size:
+    def __get_tables(self) -> (np.ndarray, np.ndarray):
+        """获取混淆/解混淆映射表，设置混淆因子后首次使用时从C库一次性导出"""
+        return export_obf_and_de_obf_table(self.vocab_size)
+
+    def __check_input_range(self, min_value: int, max_value: int):
+        if min_value < 0 or max_value >= self.vocab_size:
             log.error("Item type must be int and item must less than vocab_size.")
             raise ObfException(ErrorCode.ITEM_VALIDATE_FAILED.value)
 
+    def __check_input_dtype(self, is_int: bool):
+        if not is_int:
+            log.error("Item type must be int and item must less than vocab_size.")
+            raise ObfException(ErrorCode.ITEM_VALIDATE_FAILED.value)
+
+    def __map_tokens(self, tokens: TokenBatch, table: np.ndarray, ndim: int) -> TokenBatch:
+        """通过映射表一次索引完成整批tokens的混淆/解混淆，校验同样批量完成"""
+        if isinstance(tokens, torch.Tensor):
+            self.__check_input_dtype(not (tokens.is_floating_point() or tokens.is_complex()
+                                          or tokens.dtype == torch.bool) and tokens.dim() == ndim)
+            if tokens.numel() == 0:
+                return tokens.clone()
+            self.__check_input_range(int(tokens.min()), int(tokens.max()))
+            mapped = torch.from_numpy(table).to(tokens.device)[tokens.long()]
+            return mapped.to(tokens.dtype)
+
+        if isinstance(tokens, np.ndarray):
+            self.__check_input_dtype(tokens.dtype.kind in "iu" and tokens.ndim == ndim)
+            if tokens.size == 0:
+                return tokens.copy()
+            self.__check_input_range(int(tokens.min()), int(tokens.max()))
+            return table[tokens].astype(tokens.dtype, copy=False)
+
+        # python列表：二维时各行长度可以不同，先展平为一维批量映射后再按行切分
+        rows = tokens if ndim == 2 else [tokens]
+        try:
+            lengths = [len(row) for row in rows]
+            flat = np.array(list(chain.from_iterable(rows)))
+        except (TypeError, ValueError) as e:
+            log.error("Item type must be int and item must less than vocab_size.")
+            raise ObfException(ErrorCode.ITEM_VALIDATE_FAILED.value) from e
+        if flat.size > 0:
+            self.__check_input_dtype(flat.dtype.kind in "iu" and flat.ndim == 1)
+            self.__check_input_range(int(flat.min()), int(flat.max()))
+        mapped = table[flat.astype(np.int64)].tolist()
+        offsets = np.cumsum([0] + lengths).tolist()
+        mapped_rows = [mapped[offsets[i]:offsets[i + 1]] for i in range(len(lengths))]
+        return mapped_rows if ndim == 2 else mapped_rows[0]
+
     def _set_seed_core(self, seed_content_bytes, seed_type):
         log.info("Start to set seed core.")
         # 使用种子生成随机数，需要将8位数合并成32位数，需要32位数的长度为self.vocab_size，因此需要生成4倍长度的8位数的数组
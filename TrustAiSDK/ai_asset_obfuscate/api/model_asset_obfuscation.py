@@ -17,7 +17,6 @@ from dataclasses import dataclass
 from pathlib import Path
 from typing import List, Optional
 
-import numpy as np
 import torch
 from safetensors import safe_open
 from safetensors.torch import load_file, save_file
@@ -27,7 +26,7 @@ from ..constants import Constant, ErrorCode, ModelType, OpType
 from ..exception import ObfException
 from ..utils import (log, parameter_validation_file, check_device_space, clean_bytearray, thread_pools,
                      check_white_list, data_dec_mul)
-from ..utils.c_utils.obf_api import (create_weight_obfuscator, destroy_weight_obfuscator, apply_weight_obfuscation,
+from ..utils.c_utils.obf_api import (create_weight_obfuscator, destroy_weight_obfuscator, apply_weight_obfuscations,
                                      ObfConfig, ObfOperation, TORCH_TO_NP_DTYPE)
 
 
@@ -640,25 +639,24 @@ class ModelAssetObfuscation(AssetObfuscation):
 
         original_shape = model_weight.shape
         original_dtype = model_weight.dtype
-        weight_tensor = model_weight.cpu().float() if original_dtype == torch.bfloat16 else model_weight.cpu()
         conversion_dtype = TORCH_TO_NP_DTYPE.get(original_dtype)
         if conversion_dtype is None:
             log.error(f"Unsupported dtype for input weight: {original_dtype}")
             raise ObfException(ErrorCode.UNSUPPORTED_DTYPE.value)
-        weight_bytes = weight_tensor.numpy().tobytes()
-        # 对每个操作应用混淆
+        # 校验全部操作格式后一次性提交，C接口直接读取张量的连续内存，避免bytes中转的多次全量拷贝；
+        # 结果写入独立的缓冲区，写回前模型权重及与其共享存储的权重保持不变
+        operations = []
         for obf_op in obf_ops:
-            # 检查操作格式
             self._check_obf_op(obf_op)
-            # 准备ObfOperation结构
-            operation = ObfOperation(obf_op, original_dtype, original_shape)
-            weight_bytes = apply_weight_obfuscation(self.c_obfuscators_map[seed_type], weight_bytes, operation)
-
-        # 使用conversion_dtype来解析bytes（因为可能发生了dtype转换）
-        try:
-            obf_array = np.frombuffer(weight_bytes, dtype=conversion_dtype).copy()
-        except Exception as np_error:
-            raise ObfException(ErrorCode.APPLY_OBFUSCATION_FAILED.value) from np_error
+            operations.append(ObfOperation(obf_op, original_dtype, original_shape))
+        weight_tensor = model_weight.detach().cpu()
+        # bf16权重按C接口约定以float32格式传入
+        weight_tensor = (weight_tensor.float() if original_dtype == torch.bfloat16 else weight_tensor).contiguous()
+        weight_array = weight_tensor.numpy()
+        if weight_array.dtype != conversion_dtype:
+            log.error(f"Unsupported dtype for input weight: {original_dtype}")
+            raise ObfException(ErrorCode.UNSUPPORTED_DTYPE.value)
+        obf_array = apply_weight_obfuscations(self.c_obfuscators_map[seed_type], weight_array, operations)
         obf_tensor = torch.from_numpy(obf_array).reshape(original_shape).to(original_dtype)
         # 写回模型权重
         model_obf_param.set_obf_model_weight(obf_tensor)
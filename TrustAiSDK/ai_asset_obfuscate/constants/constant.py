@@ -48,4 +48,5 @@ class Constant:
     MAX_BASE64_VIDEO_LENGTH = 681
     MAX_BYTES_VIDEO_LENGTH = 512
     VISION_DATA_LEN = 256
-    MAX_THREADS = 32 
\ No newline at end of file
+    MAX_THREADS = 32
+    UINT32_MAX = 0xFFFFFFFF 
\ No newline at end of file
@@ -26,13 +26,14 @@ __all__ = [
     "get_obf_dict_value_by_key",
     "generate_patch_and_channel_permute",
     "get_de_obf_dict_value_by_key",
+    "export_obf_and_de_obf_table",
     "apply_patch_and_channel_permute"
 ]
 
 from .c_utils import (data_enc, data_enc_mul, date_dec, data_dec_mul, call_obf_del_seed, call_obf_reg_seed, \
                       call_obf_query_seed, generate_random_bytes, generate_obf_and_de_obf_dict,
                       get_obf_dict_value_by_key, \
-                      get_de_obf_dict_value_by_key, apply_patch_and_channel_permute, \
+                      get_de_obf_dict_value_by_key, export_obf_and_de_obf_table, apply_patch_and_channel_permute, \
                       lib_secure_c, lib_obf_tool, log, generate_patch_and_channel_permute)
 from .py_utils import check_device_space, check_white_list, clean_bytearray, \
     parameter_validation_file, parameter_validation_path, parameter_validation_str, thread_pools
@@ -17,19 +17,22 @@ __all__ = [
     "generate_obf_and_de_obf_dict",
     "get_obf_dict_value_by_key",
     "get_de_obf_dict_value_by_key",
+    "export_obf_and_de_obf_table",
     "generate_patch_and_channel_permute",
     "generate_random_bytes",
     "apply_patch_and_channel_permute",
     "create_weight_obfuscator",
     "destroy_weight_obfuscator",
-    "apply_weight_obfuscation"
+    "apply_weight_obfuscation",
+    "apply_weight_obfuscations"
 ]
 
 from .c_lib import lib_secure_c, lib_obf_tool
 from .log_util import log
-from .obf_api import create_weight_obfuscator, destroy_weight_obfuscator, apply_weight_obfuscation
+from .obf_api import create_weight_obfuscator, destroy_weight_obfuscator, apply_weight_obfuscation, \
+    apply_weight_obfuscations
 from .obf_tool_util import (data_enc, date_dec, data_enc_mul, data_dec_mul, call_obf_del_seed, call_obf_reg_seed, \
                             call_obf_query_seed)
 from .random_api import generate_random_bytes, generate_obf_and_de_obf_dict, get_obf_dict_value_by_key, \
-    get_de_obf_dict_value_by_key, \
+    get_de_obf_dict_value_by_key, export_obf_and_de_obf_table, \
     generate_patch_and_channel_permute, apply_patch_and_channel_permute
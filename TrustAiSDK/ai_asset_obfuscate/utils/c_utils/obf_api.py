@@ -198,3 +198,52 @@ def apply_weight_obfuscation(obfuscator_ptr, weight_bytes, operation):
     # 转换为 bytes 对象（避免返回 ctypes 数组引用）
     output_bytes = bytes(output_buffer)
     return output_bytes
+
+
+def apply_weight_obfuscations(obfuscator_ptr, weight_array, operations):
+    """
+    对连续内存的权重数组依次应用多个混淆操作，直接传递数组内存指针，不经过bytes中转
+
+    weight_array只作为首个操作的输入，不会被写入，其内存可以是模型权重本身（包括多个权重共享的存储）。
+
+    Args:
+        obfuscator_ptr: 混淆器对象指针(c_void_p)
+        weight_array: C连续的numpy数组
+        operations: ObfOperation结构体列表，按顺序应用
+
+    Returns:
+        np.ndarray: 保存最终结果的新数组，operations为空时返回weight_array本身
+
+    Raises:
+        ObfException: 混淆失败时抛出异常
+    """
+    if not weight_array.flags.c_contiguous:
+        log.error("The weight array must be C contiguous.")
+        raise ObfException(ErrorCode.APPLY_OBFUSCATION_FAILED.value)
+    weight_len = weight_array.nbytes
+    if weight_len > Constant.UINT32_MAX:
+        log.error(f"The weight size {weight_len} exceeds the maximum supported size.")
+        raise ObfException(ErrorCode.APPLY_OBFUSCATION_FAILED.value)
+    if not operations:
+        return weight_array
+
+    # 中间结果在两块私有缓冲区之间交替，任一操作失败时weight_array保持不变
+    buffers = [np.empty_like(weight_array) for _ in range(min(len(operations), 2))]
+    src = weight_array
+    for index, operation in enumerate(operations):
+        dst = buffers[index % 2]
+        try:
+            result = lib_obf_tool.ApplyWeightObfuscation(
+                c_void_p(obfuscator_ptr),
+                src.ctypes.data_as(POINTER(c_uint8)),
+                c_uint32(weight_len),
+                ctypes.byref(operation),
+                dst.ctypes.data_as(POINTER(c_uint8))
+            )
+        except Exception as ctypes_error:
+            raise ObfException(ErrorCode.APPLY_OBFUSCATION_FAILED.value) from ctypes_error
+        if result != 0:
+            log.error(f"Failed to apply weight obfuscation, error code: {result}")
+            raise ObfException(ErrorCode.APPLY_OBFUSCATION_FAILED.value)
+        src = dst
+    return src
@@ -71,6 +71,9 @@ lib_obf_tool.ApplyPatchAndChannelPermute.argtypes = [
 ]
 lib_obf_tool.ApplyPatchAndChannelPermute.restype = ctypes.c_int
 
+# 已导出的混淆/解混淆映射表(obf_table, de_obf_table)，生成新映射表时失效
+_obf_table_cache = None
+
 
 def apply_patch_and_channel_permute(
         input_data: np.ndarray,
@@ -136,6 +139,20 @@ def get_de_obf_dict_value_by_key(key: int) -> int:
     return value
 
 
+def export_obf_and_de_obf_table(vocab_size: int) -> (np.ndarray, np.ndarray):
+    """导出当前混淆/解混淆映射表为numpy数组，下标为原token，值为映射后的token
+    每个key仅调用一次C接口，结果缓存至映射表重新生成，之后批量数据可直接通过数组索引完成映射
+    """
+    global _obf_table_cache
+    if _obf_table_cache is None or len(_obf_table_cache[0]) != vocab_size:
+        obf_table = np.fromiter((get_obf_dict_value_by_key(key) for key in range(vocab_size)),
+                                dtype=np.int64, count=vocab_size)
+        de_obf_table = np.fromiter((get_de_obf_dict_value_by_key(key) for key in range(vocab_size)),
+                                   dtype=np.int64, count=vocab_size)
+        _obf_table_cache = (obf_table, de_obf_table)
+    return _obf_table_cache
+
+
 def generate_obf_and_de_obf_dict(white_set: list, input_seed: bytearray, random_list_len: int,
                                  adin: bytes = None) -> None:
     # 创建输入数据
@@ -152,6 +169,8 @@ def generate_obf_and_de_obf_dict(white_set: list, input_seed: bytearray, random_
         adin_tmp = (ctypes.c_uint8 * adin_length)(*adin)
         adin_data = ObfData(ctypes.cast(adin_tmp, ctypes.POINTER(ctypes.c_uint8)), ctypes.c_uint32(adin_length))
 
+    global _obf_table_cache
+    _obf_table_cache = None
     whitelist_length = len(white_set)
     c_whitelist = (ctypes.c_uint32 * whitelist_length)(*white_set)
     result = lib_obf_tool.GenerateObfAndDeObfDict(ctypes.byref(crypt_data), ctypes.byref(adin_data),
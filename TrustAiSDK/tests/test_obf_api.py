@@ -0,0 +1,70 @@
+#!/usr/bin/python3.11
+# -*- coding: utf-8 -*-
+# Copyright (c) Huawei Technologies Co., Ltd. 2025-2025. All rights reserved.
+"""apply_weight_obfuscations测试：多个混淆操作的中间结果不能写入输入权重"""
+
+from ctypes import c_int
+
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+
+try:
+    from ai_asset_obfuscate.utils.c_utils import obf_api
+except Exception as load_error:  # 依赖的C动态库未编译时跳过
+    pytest.skip(f"obfuscation libraries are not available: {load_error}", allow_module_level=True)
+
+
+class FakeObfLib:
+    """以 dst = src * 2 + op 模拟C混淆接口，op为操作编号"""
+
+    def __init__(self, fail_at=None):
+        self.calls = 0
+        self.fail_at = fail_at
+
+    def ApplyWeightObfuscation(self, obfuscator, src, length, operation, dst):
+        self.calls += 1
+        if self.calls == self.fail_at:
+            return -1
+        count = length.value // np.dtype(np.float32).itemsize
+        src_array = np.ctypeslib.as_array(src, shape=(length.value,)).view(np.float32)[:count]
+        dst_array = np.ctypeslib.as_array(dst, shape=(length.value,)).view(np.float32)[:count]
+        dst_array[:] = src_array * 2 + operation._obj.value
+        return 0
+
+
+def expected_result(weight, op_count):
+    result = weight.copy()
+    for op in range(op_count):
+        result = result * 2 + op
+    return result
+
+
+@pytest.mark.parametrize("op_count", [2, 3])
+def test_apply_weight_obfuscations_keeps_input_unchanged(monkeypatch, op_count):
+    monkeypatch.setattr(obf_api, "lib_obf_tool", FakeObfLib())
+    storage = np.arange(24, dtype=np.float32)
+    weight = storage[:12].reshape(3, 4)
+    # 与weight共享存储的张量（如绑定的embedding与lm_head），以及同一存储中未参与混淆的部分
+    tied_weight = storage[:12].reshape(4, 3)
+    original = storage.copy()
+
+    result = obf_api.apply_weight_obfuscations(0, weight, [c_int(op) for op in range(op_count)])
+
+    np.testing.assert_array_equal(result, expected_result(original[:12].reshape(3, 4), op_count))
+    assert not np.shares_memory(result, weight)
+    np.testing.assert_array_equal(storage, original)
+    np.testing.assert_array_equal(tied_weight, original[:12].reshape(4, 3))
+
+
+@pytest.mark.parametrize("op_count", [2, 3])
+def test_apply_weight_obfuscations_failure_keeps_input_unchanged(monkeypatch, op_count):
+    monkeypatch.setattr(obf_api, "lib_obf_tool", FakeObfLib(fail_at=op_count))
+    weight = np.arange(12, dtype=np.float32).reshape(3, 4)
+    original = weight.copy()
+
+    with pytest.raises(obf_api.ObfException):
+        obf_api.apply_weight_obfuscations(0, weight, [c_int(op) for op in range(op_count)])
+
+    np.testing.assert_array_equal(weight, original)